@@ -0,0 +1,260 @@
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+# Ensure the project root is in sys.path so 'src' and 'benchmarks' are importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+USAGE = """
+Usage:
+  python3 benchmarks/agent_benchmark.py [--sizes 30,365,1095] [--rounds 3] [--concurrency 4]
+                                        [--llm-latency-ms 50] [--db-latency-ms 5] [--search-latency-ms 30]
+                                        [--baseline benchmarks/agent_baseline.json] [--update-baseline]
+
+Runs PersonalAIAgent.process_query and the Chroma ingestion API fully offline, once per history
+size (days of synthetic logs matching DATABASE_SCHEMA.md). The LLM, Supabase and web search are
+replaced by the local stand-ins in benchmarks/fakes.py, with the given latencies, and the vector
+store uses a feature-hashing embedding in a temporary directory.
+
+Each size runs in its own process and reports query latency percentiles (caches off, and with
+the tool cache on), concurrent throughput, API ingest rates and traced memory. The results are
+compared with the stored baseline; the exit status is 1 if any metric regressed by more than
+--tolerance. --update-baseline stores this run as the new baseline instead.
+"""
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_baseline.json")
+USER_ID = "00000000-0000-0000-0000-000000000001"
+# One question per tool path: router-handled, keyword overrides and the LLM planner
+QUERIES = [
+    "how did I sleep this week",
+    "what gym workouts did I do this month",
+    "how much did I spend",
+    "what was my average sleep over the last 3 months",
+    "is my sleep correlated with my bjj performance",
+    "have I written about burnout before",
+    "what are the latest industry trends",
+    "What did I work on for my career in the last 8 weeks, and what should I focus on next according to the latest industry trends?",
+]
+# metric -> True when higher is better; compared against the baseline
+COMPARED_METRICS = {
+    "query_cold_p50_ms": False,
+    "query_cold_p95_ms": False,
+    "query_tool_cached_p95_ms": False,
+    "query_throughput_qps": True,
+    "local_store_sync_s": False,
+    "query_peak_mb": False,
+    "api_batch_records_per_s": True,
+    "api_single_p95_ms": False,
+}
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))] if values else 0.0
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1000
+
+def run_size(args):
+    """Benchmarks one history size in this process. The environment is set up by main()."""
+    from src.db.supabase_client import set_supabase_manager
+    from src.db.embeddings import EmbeddingService, set_embedding_service
+    from src.db.vector_store import get_vector_store, make_document_id
+    from src.db.local_store import get_local_store
+    from src.agent.core import PersonalAIAgent
+    from src.cache import tool_cache, answer_cache, TOOL_CACHE_TTL_SECONDS
+    from benchmarks.fakes import FakeChatModel, StubWebSearch, InMemorySupabase, generate_history, history_documents
+    from benchmarks.retrieval_benchmark import hashing_embedding
+    logging.getLogger().setLevel(logging.WARNING)
+    result = {"days": args.size}
+
+    tracemalloc.start()
+    tables = generate_history(USER_ID, args.size)
+    result["rows"] = sum(len(rows) for rows in tables.values())
+    supabase = InMemorySupabase(tables, latency_ms=args.db_latency_ms)
+    set_supabase_manager(supabase)
+    set_embedding_service(EmbeddingService(model="hashing", embedding_function=hashing_embedding, cache_max_entries=0))
+    store = get_vector_store("my_life_logs")
+    documents, metadatas = history_documents(tables)
+    started = time.perf_counter()
+    for i in range(0, len(documents), 1000):
+        batch_docs, batch_metas = documents[i:i + 1000], metadatas[i:i + 1000]
+        store.upsert_documents(batch_docs, [make_document_id(d, m) for d, m in zip(batch_docs, batch_metas)], batch_metas)
+    result["documents"] = len(documents)
+    result["index_s"] = round(time.perf_counter() - started, 3)
+    started = time.perf_counter()
+    get_local_store().sync(supabase, user_id=USER_ID)
+    result["local_store_sync_s"] = round(time.perf_counter() - started, 3)
+    result["dataset_mb"] = round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 1)
+    tracemalloc.stop()
+
+    llm = FakeChatModel(latency_ms=args.llm_latency_ms)
+    agent = PersonalAIAgent(llm=llm)
+    agent.tools["web_search"] = StubWebSearch(latency_ms=args.search_latency_ms)
+    agent.process_query(QUERIES[0])  # warm up imports and lazily opened stores
+
+    # Cold: every query pays for its tool calls and LLM calls
+    tool_cache.ttl_seconds = answer_cache.ttl_seconds = 0
+    cold = [_timed(agent.process_query, q) for _ in range(args.rounds) for q in QUERIES]
+    result["query_cold_p50_ms"] = round(percentile(cold, 0.5), 1)
+    result["query_cold_p95_ms"] = round(percentile(cold, 0.95), 1)
+
+    # Tool cache on, answer cache off: repeated questions reuse tool results but still synthesize
+    tool_cache.ttl_seconds = TOOL_CACHE_TTL_SECONDS
+    tool_cache.clear()
+    cached = [_timed(agent.process_query, q) for _ in range(args.rounds) for q in QUERIES]
+    result["query_tool_cached_p50_ms"] = round(percentile(cached, 0.5), 1)
+    result["query_tool_cached_p95_ms"] = round(percentile(cached, 0.95), 1)
+
+    tool_cache.ttl_seconds = 0
+    batch = QUERIES * args.rounds
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(agent.process_query, batch))
+    result["query_throughput_qps"] = round(len(batch) / (time.perf_counter() - started), 2)
+
+    tracemalloc.start()
+    for q in QUERIES:
+        agent.process_query(q)
+    result["query_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    tracemalloc.stop()
+    result["llm_calls"] = llm.calls
+    result["supabase_requests"] = supabase.requests
+
+    result.update(run_api(args))
+    return result
+
+def run_api(args):
+    """Drives the ingestion API through Flask's test client: batched and concurrent single writes."""
+    from src.api.chroma_api import app, write_queue
+    from src.db.embeddings import get_embedding_service
+    rng = random.Random(1)
+    # Client vectors from the store's own model are stored as sent, without embedding again
+    model, dim = get_embedding_service().model, get_embedding_service().dimension()
+    records = [{"user_id": USER_ID, "text": f"API benchmark record {i}", "date": "2026-01-01",
+                "embedding": [rng.uniform(-1, 1) for _ in range(dim)]} for i in range(args.api_records)]
+    client = app.test_client()
+    result = {}
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(0, len(records), 100):
+        request_started = time.perf_counter()
+        response = client.post("/add_embeddings", json={"records": records[i:i + 100], "embedding_model": model})
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        assert response.status_code == 200, response.get_json()
+    result["api_batch_records_per_s"] = round(len(records) / (time.perf_counter() - started), 1)
+    result["api_batch_p95_ms"] = round(percentile(latencies, 0.95), 1)
+
+    def post_single(i):
+        record = {**records[i % len(records)], "text": f"API benchmark single {i}", "embedding_model": model}
+        request_started = time.perf_counter()
+        response = app.test_client().post("/add_embedding", json=record)
+        assert response.status_code == 200, response.get_json()
+        return (time.perf_counter() - request_started) * 1000
+
+    with ThreadPoolExecutor(max_workers=args.concurrency * 4) as pool:
+        latencies = list(pool.map(post_single, range(args.api_requests)))
+    result["api_single_p50_ms"] = round(percentile(latencies, 0.5), 1)
+    result["api_single_p95_ms"] = round(percentile(latencies, 0.95), 1)
+    result["api_write_batches"] = write_queue.stats()["batches"]
+    write_queue.close()
+    return result
+
+def compare(results, baseline, tolerance):
+    """Returns a line per regressed metric: worse than the baseline by more than tolerance."""
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get(size)
+        if not base:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"{size} days: {metric} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("--sizes", default="30,365,1095", help="Comma-separated history sizes, in days")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over the query set per measurement")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent queries in the throughput run")
+    parser.add_argument("--llm-latency-ms", type=float, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--search-latency-ms", type=float, default=30)
+    parser.add_argument("--api-records", type=int, default=2000, help="Records sent to /add_embeddings")
+    parser.add_argument("--api-requests", type=int, default=200, help="Concurrent /add_embedding requests")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        # Worker process for one size; stdout is left to the code under test
+        with open(args.output, "w") as f:
+            json.dump(run_size(args), f)
+        return
+
+    results = {}
+    for size in [int(s) for s in args.sizes.split(",")]:
+        workdir = tempfile.mkdtemp(prefix="agent_bench_")
+        env = {
+            **os.environ,
+            "USER_UUID": USER_ID,
+            "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "offline-benchmark"),
+            "VECTOR_BACKEND": "chroma",
+            "CACHE_DIR": os.path.join(workdir, "cache"),
+            "CHROMA_PERSIST_DIRECTORY": os.path.join(workdir, "chroma"),
+            "LOCAL_STORE_PATH": os.path.join(workdir, "life.duckdb"),
+            "TRACE_FILE": "",
+            # The fake model has no account limits; measure the pipeline, not the rate limiter
+            "LLM_RPM_LIMIT": "0",
+            "LLM_TPM_LIMIT": "0",
+        }
+        output = os.path.join(workdir, "result.json")
+        command = [sys.executable, os.path.abspath(__file__), "--size", str(size), "--output", output]
+        for flag in ("rounds", "concurrency", "llm_latency_ms", "db_latency_ms", "search_latency_ms", "api_records", "api_requests"):
+            command += [f"--{flag.replace('_', '-')}", str(getattr(args, flag))]
+        print(f"Benchmarking {size} days of history...")
+        try:
+            subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(output) as f:
+                results[str(size)] = json.load(f)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(json.dumps(results[str(size)], indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("Regressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
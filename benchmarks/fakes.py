@@ -0,0 +1,277 @@
+import re
+import time
+import random
+import threading
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from langchain_core.messages import AIMessage, AIMessageChunk
+from src.cache import invalidate
+from src.db.local_store import TABLE_SCHEMAS
+
+# Local stand-ins for the services the agent calls over the network, so benchmarks are
+# repeatable and run offline. Each one sleeps for a configurable latency to model the
+# round trip; everything else is deterministic.
+
+# Tools the fake planner assigns, by keyword, checked in order
+PLANNER_KEYWORDS = [
+    (("spend", "money", "expense", "budget"), "query_financial_transactions"),
+    (("gym", "lift", "squat", "workout"), "query_gym_logs"),
+    (("average", "total", "count"), "analytics"),
+    (("correlat", "relationship", " after "), "local_analytics"),
+    (("mention", "wrote", "written", "remember", "feel"), "chroma_semantic_search"),
+    (("latest", "trend", "news", "industry"), "web_search"),
+]
+
+EXERCISES = ["squat", "bench press", "deadlift", "overhead press", "pull ups", "barbell row"]
+TECHNIQUES = ["guard passing", "armbar", "triangle", "back takes", "half guard", "leg locks"]
+PARTNERS = ["Sam", "Alex", "Jordan", "Chris", "Taylor"]
+FOODS = ["oats", "eggs", "chicken", "rice", "salad", "pasta", "yoghurt", "salmon"]
+CATEGORIES = ["groceries", "eating_out", "transport", "bills", "entertainment", "shopping"]
+ASSETS = [("Solana", "crypto"), ("Bitcoin", "crypto"), ("VWRL", "etf"), ("Apple", "stock")]
+DAY_NOTES = [
+    "Quiet day at home, read for an hour.", "Felt mentally fresh after a long walk.",
+    "Knee was sore after training, took it easy.", "Busy day, close to burnout with deadlines.",
+    "Good focus in the morning, tired by the evening.", "Coach said my guard retention is improving.",
+]
+WORK_NOTES = [
+    "Shipped the billing migration.", "Long planning meeting, little deep work.",
+    "Paired on a tricky caching bug.", "Wrote the quarterly review.",
+]
+
+class FakeChatModel:
+    def __init__(self, latency_ms=50, tokens_per_second=200, answer_words=120):
+        """
+        A deterministic chat model with the invoke()/stream() interface the agent uses.
+        Planning prompts get a JSON plan chosen by keyword; other prompts get an answer of
+        answer_words words built from the prompt, so the output is the same on every run.
+        Args:
+            latency_ms (float): Time to the first token.
+            tokens_per_second (float): Generation speed after the first token; 0 for instant.
+            answer_words (int): Length of synthesized answers.
+        """
+        self.latency = latency_ms / 1000
+        self.token_delay = 1 / tokens_per_second if tokens_per_second else 0
+        self.answer_words = answer_words
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if "break it into subquestions" in prompt:
+            query = prompt.rsplit("User query:", 1)[-1].strip()
+            tools = [tool for keywords, tool in PLANNER_KEYWORDS if any(k in query.lower() for k in keywords)]
+            tools = tools or ["query_daily_logs"]
+            return '{"subquestions": %s, "tool_choices": %s}' % (
+                str([query] * len(tools)).replace("'", '"'), str(tools).replace("'", '"'))
+        words = re.findall(r"[A-Za-z]+", prompt)
+        return " ".join(words[i % len(words)] for i in range(self.answer_words)) if words else "No data."
+
+    def _usage(self, prompt, content):
+        return {"token_usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content.split())}}
+
+    def invoke(self, prompt):
+        content = self._respond(prompt)
+        time.sleep(self.latency + self.token_delay * len(content.split()))
+        return AIMessage(content=content, response_metadata=self._usage(prompt, content))
+
+    def stream(self, prompt):
+        content = self._respond(prompt)
+        time.sleep(self.latency)
+        for i, word in enumerate(content.split(" ")):
+            time.sleep(self.token_delay)
+            yield AIMessageChunk(content=word if i == 0 else " " + word)
+
+class StubWebSearch:
+    def __init__(self, latency_ms=30):
+        """Replaces the DuckDuckGo tool: returns a fixed snippet per query after latency_ms."""
+        self.latency = latency_ms / 1000
+
+    def __call__(self, query):
+        time.sleep(self.latency)
+        return f"Web results for '{query}': industry reports highlight observability, evaluation and cost control."
+
+def _created_at(day, seq):
+    # Unique, sortable timestamps in the format PostgREST returns
+    moment = datetime(day.year, day.month, day.day, 8, tzinfo=timezone.utc) + timedelta(seconds=seq)
+    return moment.isoformat()
+
+def generate_history(user_id, days, today=None, seed=0):
+    """
+    Synthetic rows for every table in DATABASE_SCHEMA.md, for days of history ending today.
+    Args:
+        user_id (str): Owner of the rows.
+        days (int): Length of the history.
+        today (date, optional): Last day of the history. Defaults to today (UTC).
+        seed (int): Random seed; the same arguments always give the same rows.
+    Returns:
+        dict: table -> list of row dicts with the columns of TABLE_SCHEMAS plus updated_at.
+    """
+    rng = random.Random(seed)
+    today = today or datetime.utcnow().date()
+    tables = {table: [] for table in TABLE_SCHEMAS}
+    seq = 0
+
+    def add(table, day, **values):
+        nonlocal seq
+        seq += 1
+        row = {"id": f"{table}-{seq}", "user_id": user_id, "date": day.isoformat(), "created_at": _created_at(day, seq), **values}
+        tables[table].append({**{column: row.get(column) for column in TABLE_SCHEMAS[table]}, "updated_at": row["created_at"]})
+
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        sleep = round(rng.uniform(5, 9), 1)
+        add("daily_logs", day, free_text=rng.choice(DAY_NOTES), mood_score=rng.randint(3, 9),
+            energy_level=rng.randint(3, 9), stress_level=rng.randint(2, 8), sleep_hours=sleep,
+            sleep_quality=rng.randint(3, 9))
+        if rng.random() < 0.5:
+            for exercise in rng.sample(EXERCISES, 3):
+                add("gym_logs", day, exercise_name=exercise, sets=rng.randint(3, 5), reps=rng.randint(5, 10),
+                    weight=float(rng.randint(40, 160)), duration_minutes=rng.randint(45, 90), notes=None)
+        if rng.random() < 0.4:
+            add("jiujitsu_logs", day, session_type=rng.choice(["gi", "nogi", "open mat"]),
+                techniques_trained=rng.sample(TECHNIQUES, 2), rolls_count=rng.randint(3, 8),
+                roll_partners=rng.sample(PARTNERS, 2), performance_rating=rng.randint(4, 9),
+                notes=rng.choice(DAY_NOTES))
+        for meal in ("breakfast", "lunch", "dinner"):
+            add("nutrition_logs", day, meal_type=meal, meal_time=None, foods=rng.sample(FOODS, 2),
+                calories=rng.randint(300, 900), protein_grams=float(rng.randint(15, 60)),
+                carbs_grams=float(rng.randint(20, 100)), fat_grams=float(rng.randint(5, 40)), notes=None)
+        if day.weekday() < 5:
+            add("career_logs", day, work_hours=round(rng.uniform(6, 10), 1), productivity_rating=rng.randint(4, 9),
+                tasks_completed=["code review", "feature work"], achievements=[], challenges=[], goals=[],
+                notes=rng.choice(WORK_NOTES))
+        for _ in range(rng.randint(1, 3)):
+            add("financial_transactions", day, amount=-float(rng.randint(3, 120)), currency="GBP",
+                category=rng.choice(CATEGORIES), description="Card payment", source="monzo",
+                transaction_type="debit", balance_after=None, monzo_transaction_id=None)
+        if rng.random() < 0.05:
+            asset, kind = rng.choice(ASSETS)
+            quantity, price = round(rng.uniform(0.1, 5), 3), float(rng.randint(20, 500))
+            add("investment_logs", day, asset_name=asset, asset_type=kind, transaction_type="buy",
+                quantity=quantity, price_per_unit=price, total_amount=round(quantity * price, 2),
+                currency="GBP", platform="broker", notes=None)
+    return tables
+
+def history_documents(tables):
+    """The free-text fields of the history as (documents, metadatas) for the vector store."""
+    documents, metadatas = [], []
+    for table, field, source in (("daily_logs", "free_text", "daily_log"), ("jiujitsu_logs", "notes", "jiujitsu_log"),
+                                 ("career_logs", "notes", "career_log")):
+        for row in tables[table]:
+            if row[field]:
+                documents.append(row[field])
+                metadatas.append({"user_id": row["user_id"], "date": row["date"], "source": source, "log_id": row["id"]})
+    return documents, metadatas
+
+class InMemorySupabase:
+    def __init__(self, tables, latency_ms=5):
+        """
+        Stands in for SupabaseManager over in-memory rows: the select, paging, insert and
+        analytics-function methods the agent and the local store call, with each request
+        taking latency_ms. custom SQL is not supported and raises like a failed RPC would.
+        Args:
+            tables (dict): table -> list of row dicts, e.g. from generate_history().
+            latency_ms (float): Simulated round trip per request.
+        """
+        self.tables = {table: list(rows) for table, rows in tables.items()}
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+
+    def _rows(self, table_name, columns="*", filters=None, gte=None, lte=None):
+        rows = self.tables.get(table_name, [])
+        for column, value in (filters or {}).items():
+            rows = [r for r in rows if r.get(column) == value]
+        for bounds, keep in ((gte, lambda a, b: a >= b), (lte, lambda a, b: a <= b)):
+            for column, value in (bounds or {}).items():
+                rows = [r for r in rows if r.get(column) is not None and keep(str(r[column]), str(value))]
+        if columns != "*":
+            names = [c.strip() for c in columns.split(",")]
+            rows = [{c: r.get(c) for c in names} for r in rows]
+        return rows
+
+    def select_data(self, table_name, columns="*", filters=None, gte=None, lte=None,
+                    order_by=None, descending=False, limit=None, offset=None):
+        self._round_trip()
+        rows = self._rows(table_name, columns, filters, gte, lte)
+        if order_by:
+            rows = sorted(rows, key=lambda r: (r.get(order_by) is None, r.get(order_by)), reverse=descending)
+        start = offset or 0
+        return SimpleNamespace(data=rows[start:start + limit] if limit is not None else rows[start:])
+
+    def select_pages(self, table_name, columns="*", filters=None, gte=None, lte=None,
+                     cursor_columns=("updated_at", "id"), cursor=None, page_size=500):
+        if columns != "*":
+            selected = [c.strip() for c in columns.split(",")]
+            columns = ",".join(selected + [c for c in cursor_columns if c not in selected])
+        key = lambda r: tuple(str(r[c]) for c in cursor_columns)
+        rows = sorted(self._rows(table_name, columns, filters, gte, lte), key=key)
+        if cursor is not None:
+            rows = [r for r in rows if key(r) > tuple(str(v) for v in cursor)]
+        for start in range(0, len(rows), page_size):
+            self._round_trip()
+            yield rows[start:start + page_size]
+
+    def insert_data(self, table_name, data, upsert=False):
+        """Like Postgres with the updated_at trigger: created_at defaults to now, updated_at is always now."""
+        self._round_trip()
+        now = datetime.now(timezone.utc).isoformat()
+        rows = data if isinstance(data, list) else [data]
+        table = self.tables.setdefault(table_name, [])
+        existing = {row.get("id"): row for row in table} if upsert else {}
+        written = []
+        for row in rows:
+            previous = existing.get(row.get("id"), {})
+            written.append({"created_at": previous.get("created_at", now), **previous, **row, "updated_at": now})
+        if upsert:
+            ids = {row.get("id") for row in rows}
+            table[:] = [row for row in table if row.get("id") not in ids]
+        table.extend(written)
+        invalidate(table_name, "supabase")
+        return SimpleNamespace(data=written)
+
+    def call_function(self, function_name, params=None):
+        """Runs the analytics functions the benchmark queries use; others return no rows."""
+        self._round_trip()
+        params = params or {}
+        bounds = ({"date": params.get("p_since")}, {"date": params.get("p_until")})
+        rows_for = lambda table: self._rows(table, "*", {"user_id": params.get("p_user_id")}, *bounds)
+        if function_name == "analytics_spend_summary":
+            amounts = [abs(r["amount"]) for r in rows_for("financial_transactions")
+                       if r["amount"] < 0 or r.get("transaction_type") == "debit"]
+            if not amounts:
+                return SimpleNamespace(data=[])
+            return SimpleNamespace(data=[{"transactions": len(amounts), "total": sum(amounts), "average": round(sum(amounts) / len(amounts), 2),
+                                          "smallest": min(amounts), "largest": max(amounts)}])
+        if function_name == "analytics_gym_summary":
+            rows = rows_for("gym_logs")
+            if not rows:
+                return SimpleNamespace(data=[])
+            return SimpleNamespace(data=[{
+                "sessions": len({r["date"] for r in rows}), "exercises": len({r["exercise_name"] for r in rows}),
+                "total_sets": sum(r["sets"] for r in rows), "total_reps": sum(r["sets"] * r["reps"] for r in rows),
+                "total_volume": sum(r["sets"] * r["reps"] * r["weight"] for r in rows),
+                "average_duration_minutes": round(sum(r["duration_minutes"] for r in rows) / len(rows), 1),
+            }])
+        if function_name == "analytics_daily_summary":
+            rows = rows_for("daily_logs")
+            if not rows:
+                return SimpleNamespace(data=[])
+            average = lambda key: round(sum(r[key] for r in rows) / len(rows), 2)
+            return SimpleNamespace(data=[{
+                "days": len(rows), "mood_avg": average("mood_score"), "energy_avg": average("energy_level"),
+                "stress_avg": average("stress_level"), "sleep_hours_avg": average("sleep_hours"),
+                "sleep_quality_avg": average("sleep_quality"), "sleep_hours_min": min(r["sleep_hours"] for r in rows),
+                "sleep_hours_max": max(r["sleep_hours"] for r in rows),
+            }])
+        return SimpleNamespace(data=[])
+
+    def execute_sql(self, sql):
+        self._round_trip()
+        raise RuntimeError("execute_sql is not available in the in-memory stand-in")
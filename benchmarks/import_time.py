@@ -0,0 +1,85 @@
+import sys
+import os
+import argparse
+import subprocess
+# Ensure the project root is in sys.path so 'src' is importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+USAGE = """
+Usage:
+  python3 benchmarks/import_time.py [--runs 5] [--scale 1.0] [module ...]
+
+Imports each entry-point module in a fresh interpreter under `python -X importtime` and
+checks the cumulative import time (best of --runs) against its budget, and that none of the
+heavy libraries the module should load lazily were imported. The exit status is 1 if any
+module is over budget or imports a deferred library. --scale multiplies every budget, for
+slower machines. Checks every module in BUDGETS when none are given.
+"""
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Cumulative import time budget per module, in milliseconds
+BUDGETS = {
+    "src.agent.core": 250,
+    "src.agent.retrieval": 250,
+    "src.db.supabase_client": 200,
+    "src.db.vector_store": 250,
+    "src.db.local_store": 150,
+    "src.ingest.worker": 300,
+    "src.telegram_bot": 700,
+}
+# Libraries loaded on first use (agent construction, first query or first client); importing
+# any of these modules must not pull them in
+DEFERRED = ["langgraph", "langchain", "langchain_core", "langchain_community", "openai", "supabase",
+            "postgrest", "chromadb", "duckdb", "qdrant_client", "duckduckgo_search"]
+
+def measure(module):
+    """
+    Imports module in a fresh interpreter with -X importtime.
+    Returns:
+        tuple: (cumulative import time in ms, set of top-level packages imported)
+    """
+    env = {**os.environ, "PYTHONPATH": PROJECT_ROOT}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    total, packages = None, set()
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        packages.add(name.split(".")[0])
+        if name == module:
+            total = int(cumulative) / 1000
+    return total, packages
+
+def main():
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("modules", nargs="*", help="Modules to check (default: every module in BUDGETS)")
+    parser.add_argument("--runs", type=int, default=5, help="Imports per module; the fastest counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for every budget")
+    args = parser.parse_args()
+
+    unknown = [m for m in args.modules if m not in BUDGETS]
+    if unknown:
+        print(USAGE)
+        print(f"No budget for: {', '.join(unknown)}. Known modules: {', '.join(BUDGETS)}")
+        sys.exit(1)
+    failed = False
+    for module in args.modules or BUDGETS:
+        budget = BUDGETS[module] * args.scale
+        runs = [measure(module) for _ in range(max(1, args.runs))]
+        best = min(total for total, _ in runs)
+        loaded = sorted(set(DEFERRED) & set().union(*(packages for _, packages in runs)))
+        status = "ok"
+        if best > budget:
+            status, failed = "OVER BUDGET", True
+        if loaded:
+            status, failed = f"loads {', '.join(loaded)}", True
+        print(f"{module:<26} {best:7.1f} ms  (budget {budget:.0f} ms)  {status}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
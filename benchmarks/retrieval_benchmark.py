@@ -0,0 +1,160 @@
+import sys
+import os
+import re
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+from datetime import date, timedelta
+import numpy as np
+# Ensure the project root is in sys.path so 'src' is importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.db.embeddings import EmbeddingService
+from src.db.vector_store import ChromaDBManager
+from src.agent.retrieval import HybridRetriever, load_reranker
+
+USAGE = """
+Usage:
+  python3 benchmarks/retrieval_benchmark.py [--years 3] [--users 2] [--queries 60] [--k 5] [--model hashing]
+
+Builds a synthetic multi-year log corpus in a temporary Chroma store and reports recall@k and
+latency for the old unfiltered vector search, vector search with metadata prefilters, hybrid
+(vector + BM25) search, and hybrid search with the RETRIEVAL_RERANKER model when one is set.
+--model hashing (default) uses a feature-hashing embedding so the benchmark runs offline;
+any other value is passed to the embedding service (e.g. "default").
+"""
+
+ROUTINE = [
+    ("daily_log", "Slept {sleep} hours, mood was {mood}. Quiet day at home."),
+    ("daily_log", "Felt {mood} today, energy {energy}/10 after {sleep} hours of sleep."),
+    ("gym_log", "Gym session: squats and bench press, felt {mood}."),
+    ("jiujitsu_log", "BJJ class, drilled guard passing and rolled {rolls} rounds."),
+    ("career_log", "Long work day, {energy}/10 focus, shipped a small feature."),
+    ("finance_log", "Spent {amount} pounds on groceries and coffee."),
+]
+# Rare events the queries look for; each has a question and the text written on the day
+EVENTS = [
+    ("knee", "jiujitsu_log", "when did I mention my knee hurting", "Tweaked my left knee during a scramble, knee is swollen."),
+    ("burnout", "career_log", "have I written about burnout", "Feeling close to burnout, too many deadlines at work."),
+    ("coach", "jiujitsu_log", "what did coach Marco say", "Coach Marco said my guard retention is improving."),
+    ("fresh", "daily_log", "when did I feel mentally fresh", "Woke up mentally fresh and clear-headed after a lazy weekend."),
+    ("solana", "finance_log", "what happened with my Solana investment", "Bought more Solana, the position is up this month."),
+    ("deadlift", "gym_log", "when did I hit a deadlift PR", "New deadlift PR today, pulled 180kg for a single."),
+]
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+def hashing_embedding(texts, dim=384):
+    """Bag-of-words feature hashing: a fast, deterministic stand-in for a neural embedding model."""
+    vectors = []
+    for text in texts:
+        vector = np.zeros(dim, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        vectors.append(vector / norm if norm else vector)
+    return vectors
+
+def build_corpus(years, users, today, rng):
+    """Returns (documents, metadatas, ids, events), where events maps (user, event, year, month) -> ids."""
+    documents, metadatas, ids, events = [], [], [], {}
+    start = today - timedelta(days=365 * years)
+    for u in range(users):
+        user_id = f"user-{u}"
+        day = start
+        while day <= today:
+            for _ in range(rng.randint(1, 3)):
+                source, template = rng.choice(ROUTINE)
+                text = template.format(
+                    sleep=rng.choice([5, 6, 7, 8, 9]), mood=rng.choice(["good", "flat", "tired", "great"]),
+                    energy=rng.randint(3, 9), rolls=rng.randint(3, 8), amount=rng.randint(5, 80),
+                )
+                doc_id = f"{user_id}-{len(ids)}"
+                documents.append(text)
+                metadatas.append({"user_id": user_id, "date": day.isoformat(), "source": source})
+                ids.append(doc_id)
+            if rng.random() < 0.08:
+                name, source, _, text = rng.choice(EVENTS)
+                doc_id = f"{user_id}-{len(ids)}"
+                documents.append(text)
+                metadatas.append({"user_id": user_id, "date": day.isoformat(), "source": source})
+                ids.append(doc_id)
+                events.setdefault((user_id, name, day.year, day.month), []).append(doc_id)
+            day += timedelta(days=1)
+    return documents, metadatas, ids, events
+
+def build_queries(events, count, rng):
+    """Questions about one event in one month, with the ids that answer them."""
+    questions = {name: question for name, _, question, _ in EVENTS}
+    keys = rng.sample(sorted(events), min(count, len(events)))
+    return [
+        (user_id, f"{questions[name]} in {MONTH_NAMES[month - 1]} {year}", set(events[(user_id, name, year, month)]))
+        for user_id, name, year, month in keys
+    ]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def run(name, search, queries, k):
+    recalls, latencies = [], []
+    for user_id, question, relevant in queries:
+        started = time.perf_counter()
+        found = search(question, user_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(relevant & set(found[:k])) / min(len(relevant), k))
+    print(f"{name:<22} recall@{k}={sum(recalls) / len(recalls):.3f}  "
+          f"p50={percentile(latencies, 50):.1f}ms  p95={percentile(latencies, 95):.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--queries", type=int, default=60)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--model", default="hashing")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    today = date(2026, 6, 30)
+    documents, metadatas, ids, events = build_corpus(args.years, args.users, today, rng)
+    queries = build_queries(events, args.queries, rng)
+    print(f"Corpus: {len(documents)} documents, {args.users} users, {args.years} years; {len(queries)} queries")
+
+    workdir = tempfile.mkdtemp(prefix="retrieval_bench_")
+    try:
+        if args.model == "hashing":
+            embeddings = EmbeddingService(model="hashing", embedding_function=hashing_embedding, cache_max_entries=0)
+        else:
+            embeddings = EmbeddingService(model=args.model, cache_dir=os.path.join(workdir, "embeddings"))
+        chroma = ChromaDBManager(persist_directory=os.path.join(workdir, "chroma"), collection_name="bench_logs", embedding_service=embeddings)
+        started = time.perf_counter()
+        for i in range(0, len(documents), 1000):
+            chroma.upsert_documents(documents[i:i + 1000], ids[i:i + 1000], metadatas=metadatas[i:i + 1000])
+        print(f"Indexed in {time.perf_counter() - started:.1f}s")
+
+        def unfiltered(question, user_id):
+            return chroma.query_collection(query_texts=[question], n_results=args.k)["ids"][0]
+
+        def retriever_search(retriever):
+            if retriever.use_keywords:
+                # Build the keyword indexes outside the timed loop
+                for user_id in {q[0] for q in queries}:
+                    retriever.keyword_index(user_id)
+            return lambda question, user_id: [h["id"] for h in retriever.retrieve(question, user_id, k=args.k, today=today)["hits"]]
+
+        run("vector (unfiltered)", unfiltered, queries, args.k)
+        run("vector + prefilters", retriever_search(HybridRetriever(chroma, reranker=False, use_keywords=False)), queries, args.k)
+        run("hybrid (vector + BM25)", retriever_search(HybridRetriever(chroma, reranker=False)), queries, args.k)
+        reranker = load_reranker()
+        if reranker:
+            run("hybrid + rerank", retriever_search(HybridRetriever(chroma, reranker=reranker)), queries, args.k)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import sys
+import os
+import time
+import argparse
+from datetime import datetime, timedelta
+# Ensure the project root is in sys.path so 'src' is importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.db.local_store import get_local_store
+from src.db.supabase_client import get_supabase_manager
+from src.db.vector_store import get_vector_store
+from src.db.rollups import compute_rollups, PERIOD_TYPES, ROLLUP_TABLES, DIGEST_COLLECTION
+
+USAGE = """
+Usage:
+  python3 scripts/build_digests.py [--periods day,week,month] [--days 40] [--full] [--batch-size 500]
+
+Syncs the local analytics store from Supabase, then computes daily, weekly and monthly rollups
+and one-line digests per domain (gym, bjj, sleep_mood, spend) and upserts them into the
+period_rollups table and the "digests" vector collection. Periods overlapping the last --days
+days are recomputed (the default covers the current and previous month); --full rebuilds
+the whole history. Rows are keyed by period, so reruns overwrite rather than duplicate, and
+digests whose text is unchanged are not re-embedded.
+
+Run nightly from cron, e.g.:
+  15 3 * * * cd /path/to/life-agent && python3 scripts/build_digests.py
+"""
+
+def first_logged_date(store, user_id):
+    sql = " UNION ALL ".join(f"SELECT min(date) AS first FROM {table} WHERE user_id = ?" for table in ROLLUP_TABLES.values())
+    dates = [row["first"] for row in store.query(sql, [user_id] * len(ROLLUP_TABLES)) if row["first"]]
+    return min(dates) if dates else None
+
+def main():
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("--periods", default=",".join(PERIOD_TYPES), help="Comma-separated period types")
+    parser.add_argument("--days", type=int, default=40, help="Recompute periods overlapping this many past days")
+    parser.add_argument("--full", action="store_true", help="Recompute the whole history")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per Supabase upsert and vector store write")
+    args = parser.parse_args()
+
+    user_id = os.getenv("USER_UUID")
+    periods = [p.strip() for p in args.periods.split(",") if p.strip()]
+    if not user_id or any(p not in PERIOD_TYPES for p in periods):
+        print(USAGE)
+        print("USER_UUID must be set" if not user_id else f"Known periods: {', '.join(PERIOD_TYPES)}")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    store = get_local_store()
+    supabase = get_supabase_manager()
+    store.sync(supabase, user_id=user_id)
+    today = datetime.utcnow().date()
+    since = first_logged_date(store, user_id) if args.full else today - timedelta(days=args.days)
+    if since is None:
+        print("No logs to summarise yet.")
+        return
+
+    digests = get_vector_store(DIGEST_COLLECTION)
+    for period_type in periods:
+        rows = compute_rollups(store, user_id, period_type, since, today=today)
+        for i in range(0, len(rows), args.batch_size):
+            batch = rows[i:i + args.batch_size]
+            supabase.insert_data("period_rollups", batch, upsert=True)
+            digests.upsert_documents(
+                documents=[row["digest"] for row in batch],
+                ids=[row["id"] for row in batch],
+                metadatas=[{
+                    "user_id": user_id, "domain": row["domain"], "period_type": row["period_type"],
+                    "period_start": row["period_start"], "period_end": row["period_end"],
+                    "date": row["period_start"], "source": "digest",
+                } for row in batch],
+            )
+        print(f"{period_type}: {len(rows)} rollups since {since}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
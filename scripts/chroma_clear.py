@@ -1,30 +1,61 @@
 import sys
 import os
+import argparse
 # Ensure the project root is in sys.path so 'src' is importable
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from src.db.vector_store import ChromaDBManager
+from src.db.vector_store import get_vector_store, DELETE_BATCH_SIZE
 
 USAGE = """
 Usage:
   python3 scripts/chroma_clear.py --all
   python3 scripts/chroma_clear.py --date YYYY-MM-DD
+  python3 scripts/chroma_clear.py --from YYYY-MM-DD --to YYYY-MM-DD [--user USER_ID] [--source SOURCE] [--dry-run]
+  python3 scripts/chroma_clear.py --user USER_ID [--dry-run]
 """
 
 def main():
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("--all", action="store_true", help="Delete every document in the collection")
+    parser.add_argument("--date", help="Delete documents for one date")
+    parser.add_argument("--from", dest="date_from", help="First date of a range to delete (inclusive)")
+    parser.add_argument("--to", dest="date_to", help="Last date of a range to delete (inclusive)")
+    parser.add_argument("--user", help="Only delete this user's documents")
+    parser.add_argument("--source", help="Only delete documents with this source")
+    parser.add_argument("--dry-run", action="store_true", help="Count matching documents without deleting")
+    parser.add_argument("--batch-size", type=int, default=DELETE_BATCH_SIZE, help="Documents deleted per batch")
+    parser.add_argument("--collection", default="my_life_logs", help="Collection name")
+    parser.add_argument("--backend", help="Vector backend (chroma or qdrant); defaults to VECTOR_BACKEND")
+    args = parser.parse_args()
+
+    filtered = args.date or args.date_from or args.date_to or args.user or args.source
+    if args.all == bool(filtered) or (args.date and (args.date_from or args.date_to)):
+        print(USAGE)
+        sys.exit(1)
+    if bool(args.date_from) != bool(args.date_to):
         print(USAGE)
+        print("--from and --to must be given together; use --date for a single day.")
         sys.exit(1)
 
-    chroma = ChromaDBManager(collection_name="my_life_logs")
+    chroma = get_vector_store(args.collection, backend=args.backend)
 
-    if sys.argv[1] == "--all":
-        chroma.delete_all_data()
-    elif sys.argv[1] == "--date" and len(sys.argv) == 3:
-        date_str = sys.argv[2]
-        chroma.delete_data_by_date(date_str)
-    else:
-        print(USAGE)
+    if args.all:
+        if args.dry_run:
+            print(f"Would delete all {chroma.count()} documents from '{args.collection}'.")
+        else:
+            chroma.delete_all_data()
+        return
+    try:
+        chroma.delete_by_metadata(
+            date_from=args.date or args.date_from,
+            date_to=args.date or args.date_to,
+            user_id=args.user,
+            source=args.source,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,36 @@
+import sys
+import os
+import argparse
+# Ensure the project root is in sys.path so 'src' is importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.ingest.queue import get_ingest_queue
+
+USAGE = """
+Usage:
+  python3 scripts/ingest_queue.py [--dead] [--retry-dead] [--purge-days 7]
+
+Shows the state of the log ingest queue. --dead lists dead-lettered entries with their last
+error, --retry-dead puts them back on the queue (the bot's worker picks them up), and
+--purge-days deletes completed jobs older than that many days.
+"""
+
+def main():
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("--dead", action="store_true", help="List dead-lettered entries")
+    parser.add_argument("--retry-dead", action="store_true", help="Requeue dead-lettered entries")
+    parser.add_argument("--purge-days", type=float, help="Delete completed jobs older than this many days")
+    args = parser.parse_args()
+
+    queue = get_ingest_queue()
+    if args.dead:
+        for job in queue.dead_letters():
+            print(f"#{job['id']} {job['key']} ({job['attempts']} attempts): {job['payload']['text'][:80]}")
+            print(f"    {job['last_error']}")
+    if args.retry_dead:
+        print(f"Requeued {queue.retry_dead()} dead-lettered entries.")
+    if args.purge_days is not None:
+        print(f"Deleted {queue.purge_done(args.purge_days * 24 * 3600)} completed jobs.")
+    print(f"Queue: {queue.stats()}")
+
+if __name__ == "__main__":
+    main()
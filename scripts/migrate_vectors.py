@@ -0,0 +1,55 @@
+import sys
+import os
+import time
+import argparse
+# Ensure the project root is in sys.path so 'src' is importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.db.vector_store import get_vector_store
+
+USAGE = """
+Usage:
+  python3 scripts/migrate_vectors.py --from chroma --to qdrant [--collection my_life_logs] [--batch-size 500]
+
+Streams documents, metadata and stored embeddings from one vector backend to another in
+batches, without re-embedding. Writes are idempotent upserts, so an interrupted migration
+can simply be run again; documents already copied are skipped.
+"""
+
+def main():
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("--from", dest="source", required=True, choices=["chroma", "qdrant"], help="Backend to read from")
+    parser.add_argument("--to", dest="target", required=True, choices=["chroma", "qdrant"], help="Backend to write to")
+    parser.add_argument("--collection", default="my_life_logs", help="Collection to copy")
+    parser.add_argument("--target-collection", help="Collection name in the target (defaults to --collection)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents read and written per batch")
+    args = parser.parse_args()
+
+    target_collection = args.target_collection or args.collection
+    if args.source == args.target and target_collection == args.collection:
+        print("Source and target are the same collection.")
+        sys.exit(1)
+
+    source = get_vector_store(args.collection, backend=args.source)
+    target = get_vector_store(target_collection, backend=args.target)
+    total = source.count()
+    print(f"Copying {total} documents from {args.source}:{args.collection} to {args.target}:{target_collection}")
+
+    started = time.perf_counter()
+    copied = 0
+    counts = {"written": 0, "metadata_updated": 0, "skipped": 0}
+    for page in source.iter_documents(batch_size=args.batch_size, include=("documents", "metadatas", "embeddings")):
+        result = target.upsert_documents(
+            documents=page["documents"],
+            ids=page["ids"],
+            metadatas=page["metadatas"],
+            embeddings=[list(e) for e in page["embeddings"]],
+        )
+        for key in counts:
+            counts[key] += result[key]
+        copied += len(page["ids"])
+        rate = copied / max(time.perf_counter() - started, 1e-9)
+        print(f"{copied}/{total} documents ({rate:.0f}/s)")
+    print(f"Done: {counts}; target now holds {target.count()} documents.")
+
+if __name__ == "__main__":
+    main()
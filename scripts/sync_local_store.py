@@ -0,0 +1,29 @@
+import sys
+import os
+# Ensure the project root is in sys.path so 'src' is importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.db.local_store import LocalAnalyticsStore, LOCAL_STORE_PATH, TABLE_SCHEMAS
+from src.db.supabase_client import get_supabase_manager
+
+USAGE = """
+Usage:
+  python3 scripts/sync_local_store.py [table ...]
+
+Copies rows created since the last sync from Supabase into the local DuckDB store
+(LOCAL_STORE_PATH, default ./data/life.duckdb). Syncs every table when none are given.
+Safe to run from cron; each run only fetches new rows.
+"""
+
+def main():
+    tables = sys.argv[1:] or None
+    if tables and any(t not in TABLE_SCHEMAS for t in tables):
+        print(USAGE)
+        print(f"Known tables: {', '.join(TABLE_SCHEMAS)}")
+        sys.exit(1)
+    store = LocalAnalyticsStore(LOCAL_STORE_PATH)
+    copied = store.sync(get_supabase_manager(), tables=tables, user_id=os.getenv("USER_UUID"))
+    for table, count in copied.items():
+        print(f"{table}: {count} new rows")
+
+if __name__ == "__main__":
+    main()
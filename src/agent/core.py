@@ -1,13 +1,21 @@
 import os
-from langgraph.graph import StateGraph, END
-from langchain_community.chat_models import ChatOpenAI
-from langchain.tools import tool
-from langchain_community.tools import DuckDuckGoSearchRun
+import re
+import json
+import asyncio
+import hashlib
 from dotenv import load_dotenv
-from datetime import datetime, timedelta
-from src.db.supabase_client import SupabaseManager
-from src.db.vector_store import ChromaDBManager
+from datetime import datetime
+from src.db.analytics import query_for_text
+from src.agent.router import TfidfIntentRouter, latest_user_message
+from src.agent.llm_gateway import LLMGateway, INTERACTIVE
+from src.agent.tracing import tracer, span, current_span, traced, record_llm_usage
+from src.cache import tool_cache, answer_cache, normalize_text
+from src.agent.formatting import EmptyResult, count_tokens
 from typing import TypedDict, List
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+import threading
+import contextvars
+import time
 import logging
 
 load_dotenv()
@@ -15,6 +23,12 @@ load_dotenv()
 # Set up basic logging
 logging.basicConfig(level=logging.INFO)
 
+# Tool fan-out settings: how many tools may run at once and how long a single tool
+# may run before the agent answers without it. The limit covers every chat sharing the
+# agent (the Telegram bot runs all chats on one), so size it for concurrent chats x tools per query.
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "16"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+
 # Define the state schema for LangGraph
 class AgentState(TypedDict):
     input: str
@@ -22,104 +36,69 @@ class AgentState(TypedDict):
     tool_choices: List[str]
     tool_results: List[str]
     output: str
+    route: str  # "rule" when the query router picked the tool, "llm" when the planner did
+
+# Data each tool reads, used to invalidate its cached results when that data is written
+TOOL_CACHE_TAGS = {
+    "query_daily_logs": ["daily_logs"],
+    "query_gym_logs": ["gym_logs"],
+    "query_financial_transactions": ["financial_transactions"],
+    "custom_sql": ["supabase"],
+    "analytics": ["supabase"],
+    "local_analytics": ["local_store"],
+    "chroma_semantic_search": ["chroma"],
+    "web_search": [],
+    "query_digests": ["period_rollups"],
+}
+# Tool tried when another tool returns an EmptyResult: digests are only a shortcut over the raw data
+TOOL_FALLBACKS = {"query_digests": "analytics"}
+# Tools whose result depends only on the user and the date, not on the subquestion text
+ARGUMENT_FREE_TOOLS = {"query_daily_logs", "query_gym_logs", "query_financial_transactions"}
+
+_graph = None
+_graph_lock = threading.Lock()
 
-# Tool: Query daily logs from Supabase
-@tool
-def query_daily_logs_tool(query: str) -> str:
-    """Fetch the last 7 days of daily logs for the user."""
-    user_id = os.getenv("USER_UUID")
-    if not user_id:
-        return "[QueryDailyLogs] USER_UUID not set in environment."
-    today = datetime.utcnow().date()
-    week_ago = today - timedelta(days=7)
-    supabase = SupabaseManager()
-    filters = {"user_id": user_id}
-    response = supabase.select_data(
-        table_name="daily_logs",
-        columns="*",
-        filters=filters
-    )
-    if not response or not response.data:
-        return "No daily logs found."
-    logs = [log for log in response.data if log.get("date") and week_ago <= datetime.strptime(log["date"], "%Y-%m-%d").date() <= today]
-    if not logs:
-        return "No daily logs found in the last 7 days."
-    return f"Daily logs for the last 7 days: {logs}"
-
-# Tool: Query gym logs from Supabase
-@tool
-def query_gym_logs_tool(query: str) -> str:
-    """Fetch recent gym logs for the user."""
-    user_id = os.getenv("USER_UUID")
-    if not user_id:
-        return "[QueryGymLogs] USER_UUID not set in environment."
-    supabase = SupabaseManager()
-    filters = {"user_id": user_id}
-    response = supabase.select_data(
-        table_name="gym_logs",
-        columns="*",
-        filters=filters
-    )
-    if not response or not response.data:
-        return "No gym logs found."
-    return f"Gym logs: {response.data}"
-
-# Tool: Query financial transactions from Supabase
-@tool
-def query_financial_transactions_tool(query: str) -> str:
-    """Fetch recent financial transactions for the user."""
-    user_id = os.getenv("USER_UUID")
-    if not user_id:
-        return "[QueryFinancialTransactions] USER_UUID not set in environment."
-    supabase = SupabaseManager()
-    filters = {"user_id": user_id}
-    response = supabase.select_data(
-        table_name="financial_transactions",
-        columns="*",
-        filters=filters
-    )
-    if not response or not response.data:
-        return "No financial transactions found."
-    return f"Financial transactions: {response.data}"
-
-# Tool: Custom SQL query
-@tool
-def custom_sql_tool(sql: str) -> str:
-    """Run a custom SQL query on Supabase. Use for advanced calculations or joins."""
-    supabase = SupabaseManager()
-    try:
-        result = supabase.execute_sql(sql)
-        return f"SQL result: {result.data}"
-    except Exception as e:
-        return f"[SQL Error]: {e}"
-
-# Tool: Semantic search in ChromaDB
-@tool
-def chroma_semantic_search_tool(query: str) -> str:
-    """Perform a semantic search in ChromaDB for similar personal logs."""
-    chroma = ChromaDBManager(collection_name="my_life_logs")
-    results = chroma.query_collection(query_text=query, n_results=3)
-    return f"Chroma semantic search results: {results}"
-
-# Tool: Web search using DuckDuckGo
-@tool
-def web_search_tool(query: str) -> str:
-    """Search the web for up-to-date information using DuckDuckGo."""
-    search = DuckDuckGoSearchRun()
-    return search.run(query)
+def _dispatch(node_name):
+    # Graph nodes call the agent passed in the run config, so one compiled graph serves every agent
+    def node(state: AgentState, config) -> AgentState:
+        return getattr(config["configurable"]["agent"], node_name)(state, config)
+    return node
+
+def get_graph():
+    """Returns the process-wide compiled agent graph, building it on first use."""
+    global _graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                # Imported here so importing this module doesn't load LangGraph
+                from langgraph.graph import StateGraph, END
+                workflow = StateGraph(AgentState)
+                workflow.add_node("decompose", _dispatch("_decompose_node"))
+                workflow.add_node("tool_loop", _dispatch("_tool_loop_node"))
+                workflow.add_node("synthesis", _dispatch("_synthesis_node"))
+                workflow.add_edge("decompose", "tool_loop")
+                workflow.add_edge("tool_loop", "synthesis")
+                workflow.add_edge("synthesis", END)
+                workflow.set_entry_point("decompose")
+                _graph = workflow.compile()
+    return _graph
 
 class PersonalAIAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(temperature=0, model_name="gpt-4")
-        self.tools = {
-            "query_daily_logs": query_daily_logs_tool,
-            "query_gym_logs": query_gym_logs_tool,
-            "query_financial_transactions": query_financial_transactions_tool,
-            "custom_sql": custom_sql_tool,
-            "chroma_semantic_search": chroma_semantic_search_tool,
-            "web_search": web_search_tool
-        }
-        self.graph = self._setup_graph()
+    def __init__(self, tool_concurrency=TOOL_MAX_CONCURRENCY, tool_timeout=TOOL_TIMEOUT_SECONDS, router=None, llm=None):
+        # Any chat model with invoke() and stream(); the benchmarks pass a local fake.
+        # Defaults to GPT-4, created on first use
+        self._llm = llm
+        self._gateway = None
+        self._gateway_lock = threading.Lock()
+        # Answers common single-intent questions without the LLM planning call
+        self.router = router if router is not None else TfidfIntentRouter()
+        self.tool_timeout = tool_timeout
+        self.tool_concurrency = max(1, tool_concurrency)
+        self._tool_executor = self._new_tool_executor()
+        self._tool_executor_lock = threading.Lock()
+        # Imported here so importing this module doesn't load LangChain and the database clients
+        from src.agent.tools import TOOLS
+        self.tools = dict(TOOLS)
         # Load persistent user context
         try:
             with open("about_me.txt", "r") as f:
@@ -127,113 +106,361 @@ class PersonalAIAgent:
         except Exception:
             self.about_me = ""
 
-    def _decompose_node(self, state: AgentState) -> AgentState:
+    @property
+    def llm(self):
+        """The chat model behind an LLMGateway: shared in-flight requests, rate limits and 429 retries."""
+        if self._gateway is None:
+            with self._gateway_lock:
+                if self._gateway is None:
+                    llm = self._llm
+                    if llm is None:
+                        from langchain_community.chat_models import ChatOpenAI
+                        llm = ChatOpenAI(temperature=0, model_name="gpt-4", max_retries=0)
+                    self._gateway = LLMGateway(llm, priority=INTERACTIVE)
+        return self._gateway
+
+    @property
+    def graph(self):
+        return get_graph()
+
+    def _run_config(self, **configurable):
+        return {"configurable": {"agent": self, **configurable}}
+
+    @staticmethod
+    def _emit(config, event):
+        # Progress events go to the on_event callback passed by astream_query, if any
+        on_event = ((config or {}).get("configurable") or {}).get("on_event")
+        if on_event:
+            on_event(event)
+
+    @traced("node.decompose")
+    def _decompose_node(self, state: AgentState, config=None) -> AgentState:
+        self._emit(config, {"type": "stage", "stage": "decompose"})
+        question = latest_user_message(state["input"])
+        decision = self.router.route(question) if self.router else None
+        if decision:
+            state["subquestions"] = [question]
+            state["tool_choices"] = [decision["tool"]]
+            state["route"] = decision["path"]
+            logging.info(f"[Agent] Routed by {decision['path']} to {decision['tool']} (confidence {decision['confidence']})")
+        else:
+            self._plan_with_llm(state)
+            state["route"] = "llm"
+            logging.info("[Agent] Routed by llm planner")
+        self._apply_keyword_overrides(state)
+        current_span().set(route=state["route"], tools=list(state["tool_choices"]))
+        state["tool_results"] = []
+        self._emit(config, {"type": "stage", "stage": "tools", "tools": list(state["tool_choices"])})
+        return state
+
+    def _plan_with_llm(self, state: AgentState):
         # Use LLM to break the input into subquestions and assign tools
         prompt = (
             "You are an assistant with access to these tools and data sources: "
-            "1. Supabase tools (query_daily_logs, query_gym_logs, query_financial_transactions, custom_sql) for all structured user data (logs, gym, finance, etc.). "
+            "1. Supabase tools (query_daily_logs, query_gym_logs, query_financial_transactions, analytics, custom_sql) for all structured user data (logs, gym, finance, etc.). "
+            "Use analytics for totals, averages, counts, weekly volume or trends; its subquestion may be plain language. "
+            "Use local_analytics for correlations between two metrics over months (e.g. sleep vs BJJ performance, spend after training weeks). "
+            "Use query_digests first for retrospective questions about a day, week or month of training, BJJ, sleep/mood or spending; it reads precomputed summaries. "
             "2. chroma_semantic_search for semantic memory and unstructured logs. "
             "3. web_search for up-to-date internet info. "
             "You MUST always use the available Supabase tools to answer any question about the user's data, logs, or history. Do NOT answer from your own knowledge if a tool is available. "
             "Given the user query, break it into subquestions. "
-            "For each subquestion, decide which tool to use: 'query_daily_logs', 'query_gym_logs', 'query_financial_transactions', 'custom_sql', 'chroma_semantic_search', or 'web_search'. "
+            "For each subquestion, decide which tool to use: 'query_daily_logs', 'query_gym_logs', 'query_financial_transactions', 'analytics', 'local_analytics', 'query_digests', 'custom_sql', 'chroma_semantic_search', or 'web_search'. "
             "Return a JSON list of subquestions and a parallel list of tool names. "
             "User query: {query}"
         )
-        llm_response = self.llm.invoke(prompt.format(query=state["input"]))
-        import json
+        prompt = prompt.format(query=state["input"])
+        with span("llm.plan") as s:
+            llm_response = self.llm.invoke(prompt)
+            content = llm_response.content if hasattr(llm_response, "content") else str(llm_response)
+            record_llm_usage(s, prompt, content, llm_response)
         try:
-            parsed = json.loads(llm_response.content if hasattr(llm_response, "content") else str(llm_response))
+            parsed = json.loads(content)
             state["subquestions"] = parsed["subquestions"]
             state["tool_choices"] = parsed["tool_choices"]
         except Exception as e:
             state["subquestions"] = [state["input"]]
             state["tool_choices"] = ["query_daily_logs"]
-        # Calculation keywords and table mapping
+
+    def _apply_keyword_overrides(self, state: AgentState):
+        # Calculation questions go to a named analytics query with typed parameters
         calc_keywords = ["average", "avg", "sum", "total", "count", "min", "max"]
-        table_keywords = {
-            "transaction": "financial_transactions",
-            "finance": "financial_transactions",
-            "gym": "gym_logs",
-            "log": "daily_logs",
-            "bjj": "jiujitsu_logs"
-        }
-        user_id = os.getenv("USER_UUID")
         for i, (subq, tool) in enumerate(zip(state["subquestions"], state["tool_choices"])):
             subq_lower = subq.lower()
-            # If calculation keyword and table keyword present, force custom_sql_tool
             if any(kw in subq_lower for kw in calc_keywords):
-                for tkw, table in table_keywords.items():
-                    if tkw in subq_lower:
-                        # Generate SQL for common calculations
-                        if "average" in subq_lower or "avg" in subq_lower:
-                            sql = f"SELECT AVG(transaction_amount) FROM {table} WHERE user_id = '{user_id}' AND transaction_date >= CURRENT_DATE - INTERVAL '7 days';"
-                        elif "sum" in subq_lower or "total" in subq_lower:
-                            sql = f"SELECT SUM(transaction_amount) FROM {table} WHERE user_id = '{user_id}' AND transaction_date >= CURRENT_DATE - INTERVAL '7 days';"
-                        elif "count" in subq_lower:
-                            sql = f"SELECT COUNT(*) FROM {table} WHERE user_id = '{user_id}' AND transaction_date >= CURRENT_DATE - INTERVAL '7 days';"
-                        elif "min" in subq_lower:
-                            sql = f"SELECT MIN(transaction_amount) FROM {table} WHERE user_id = '{user_id}' AND transaction_date >= CURRENT_DATE - INTERVAL '7 days';"
-                        elif "max" in subq_lower:
-                            sql = f"SELECT MAX(transaction_amount) FROM {table} WHERE user_id = '{user_id}' AND transaction_date >= CURRENT_DATE - INTERVAL '7 days';"
-                        else:
-                            sql = f"SELECT * FROM {table} WHERE user_id = '{user_id}' AND transaction_date >= CURRENT_DATE - INTERVAL '7 days';"
-                        state["subquestions"][i] = sql
-                        state["tool_choices"][i] = "custom_sql"
-                        logging.info(f"[Agent] Detected calculation query. Forcing custom_sql_tool with SQL: {sql}")
+                name, params = query_for_text(subq)
+                if name:
+                    spec = json.dumps({"name": name, "params": params})
+                    state["subquestions"][i] = spec
+                    state["tool_choices"][i] = "analytics"
+                    logging.info(f"[Agent] Detected calculation query. Using analytics query: {spec}")
+                    continue
             # Fallback: if the query is about spending/expenses/finance but the tool is not financial, add it
             finance_keywords = ["spending", "expense", "expenses", "finance", "financial", "money", "transaction", "transactions", "cost", "budget"]
             if any(word in subq_lower for word in finance_keywords):
-                if state["tool_choices"][i] != "query_financial_transactions" and not any(kw in subq_lower for kw in calc_keywords):
+                if state["tool_choices"][i] not in ("query_financial_transactions", "query_digests") and not any(kw in subq_lower for kw in calc_keywords):
                     state["tool_choices"][i] = "query_financial_transactions"
-        state["tool_results"] = []
-        return state
 
-    def _tool_loop_node(self, state: AgentState) -> AgentState:
-        # For each subquestion, call the assigned tool and collect results
+    def _call_tool(self, tool_name: str, subq: str) -> str:
+        if tool_name not in self.tools:
+            tool_name = "query_daily_logs"
+        with span(f"tool.{tool_name}") as s:
+            result = self._call_tool_cached(tool_name, subq)
+            fallback = TOOL_FALLBACKS.get(tool_name)
+            if fallback and isinstance(result, EmptyResult):
+                logging.info(f"[Agent] {tool_name} found nothing, falling back to {fallback}")
+                s.set(fallback=fallback)
+                result = self._call_tool_cached(fallback, subq)
+            s.set(payload_bytes=len(result.encode("utf-8")), result_tokens=count_tokens(result))
+            return result
+
+    def _call_tool_cached(self, tool_name: str, subq: str) -> str:
+        tool_func = self.tools[tool_name]
+        args_key = "" if tool_name in ARGUMENT_FREE_TOOLS else normalize_text(subq)
+        cache_key = (tool_name, args_key, datetime.utcnow().date().isoformat())
+        cached = tool_cache.get(cache_key)
+        current_span().set(cache_hit=cached is not None)
+        if cached is not None:
+            logging.info(f"[Agent] Cache hit for tool: {tool_name}")
+            return cached
+        generations = tool_cache.snapshot(TOOL_CACHE_TAGS.get(tool_name, []))
+        try:
+            logging.info(f"[Agent] Using tool: {tool_name} for subquestion: {subq}")
+            result = tool_func(subq)
+            # Log the size only; full results can be large
+            logging.info(f"[Agent] {tool_name} returned {len(result)} chars")
+        except Exception as e:
+            result = f"[Error calling {tool_name}]: {e}"
+            logging.error(result)
+            current_span().set(error=str(e))
+            return result
+        # Bracketed results are errors or configuration problems; don't keep them
+        if not result.startswith("["):
+            tool_cache.set(cache_key, result, generations)
+        return result
+
+    def _new_tool_executor(self):
+        return ThreadPoolExecutor(max_workers=self.tool_concurrency, thread_name_prefix="agent-tool")
+
+    def _retire_tool_executor(self, executor):
+        # A timed-out tool keeps its worker thread until it returns. Leave that executor to
+        # finish what it holds and send later calls to a fresh one, so hung tools cannot
+        # starve the other chats; the hung threads exit when their tools do.
+        with self._tool_executor_lock:
+            if self._tool_executor is executor:
+                executor.shutdown(wait=False)
+                self._tool_executor = self._new_tool_executor()
+                logging.warning("[Agent] Tool timed out; moved later tool calls to a new executor")
+
+    def _run_tool_calls(self, subquestions: List[str], tool_choices: List[str], on_result=None) -> List[str]:
+        """
+        Runs the tool calls concurrently on the agent's executor, which is shared by every
+        query and limited to tool_concurrency calls at once.
+        Each tool gets TOOL_TIMEOUT_SECONDS from the moment it starts (time spent queued
+        behind the concurrency limit is bounded by the same amount). A tool that does not
+        finish in time is reported as a timeout and the others are still returned; its
+        executor is retired, so the stuck worker does not hold back later queries.
+        Args:
+            on_result (callable, optional): Called with (tool_name, result) as each result is collected.
+        Returns:
+            list of str: One result per subquestion, in subquestion order.
+        """
+        calls = list(zip(subquestions, tool_choices))
+        started = [threading.Event() for _ in calls]
+        started_at = [0.0] * len(calls)
+
+        def run(i, subq, tool_name):
+            started_at[i] = time.monotonic()
+            started[i].set()
+            return self._call_tool(tool_name, subq)
+
+        # Run each tool in a copy of this context, so its span is a child of the current one
+        with self._tool_executor_lock:
+            executor = self._tool_executor
+            futures = [
+                executor.submit(contextvars.copy_context().run, run, i, subq, tool_name)
+                for i, (subq, tool_name) in enumerate(calls)
+            ]
         results = []
-        for subq, tool_name in zip(state["subquestions"], state["tool_choices"]):
-            tool_func = self.tools.get(tool_name, query_daily_logs_tool)
+        for i, (future, (subq, tool_name)) in enumerate(zip(futures, calls)):
             try:
-                logging.info(f"[Agent] Using tool: {tool_name} for subquestion: {subq}")
-                result = tool_func(subq)
-                logging.info(f"[Agent] Tool result: {result}")
-            except Exception as e:
-                result = f"[Error calling {tool_name}]: {e}"
-                logging.error(result)
+                if not started[i].wait(self.tool_timeout):
+                    raise FuturesTimeoutError()
+                remaining = started_at[i] + self.tool_timeout - time.monotonic()
+                result = future.result(timeout=max(remaining, 0))
+            except FuturesTimeoutError:
+                future.cancel()
+                self._retire_tool_executor(executor)
+                result = f"[Timeout calling {tool_name}]: no result after {self.tool_timeout:g}s for subquestion: {subq}"
+                logging.warning(result)
+                node_span = current_span()
+                if node_span:
+                    node_span.set(timeouts=node_span.attributes.get("timeouts", 0) + 1)
             results.append(result)
-        state["tool_results"] = results
+            if on_result:
+                on_result(tool_name, result)
+        return results
+
+    @traced("node.tool_loop")
+    def _tool_loop_node(self, state: AgentState, config=None) -> AgentState:
+        # Call the assigned tool for every subquestion concurrently and collect results in order
+        state["tool_results"] = self._run_tool_calls(
+            state["subquestions"],
+            state["tool_choices"],
+            on_result=lambda tool_name, result: self._emit(config, {"type": "tool_done", "tool": tool_name}),
+        )
         return state
 
-    def _synthesis_node(self, state: AgentState) -> AgentState:
+    @traced("node.synthesis")
+    def _synthesis_node(self, state: AgentState, config=None) -> AgentState:
         # Use LLM to combine all tool results into a final answer
         # If any tool result is not empty or error, only synthesize from tool results
-        if any(r and not r.startswith("[Error") and "No " not in r for r in state["tool_results"]):
+        if any(r and not r.startswith(("[Error", "[Timeout")) and "No " not in r for r in state["tool_results"]):
             prompt = (
                 f"About the user (persistent context):\n{self.about_me}\n\n"
                 "You are a helpful assistant. The user asked: {query}\n"
                 "Here are the results from various tools (personal data, semantic search, web):\n"
                 "{results}\n"
+                "Some tools may have timed out; if so, say which data was unavailable.\n"
                 "Please combine these into a single, helpful answer. Limit your response to 300 words."
             )
-            llm_response = self.llm.invoke(prompt.format(query=state["input"], results="\n".join(state["tool_results"])))
-            state["output"] = llm_response.content if hasattr(llm_response, "content") else str(llm_response)
+            # A routed answer is cached under the latest message alone (see _answer_key),
+            # so it must not be written from the rest of this chat
+            query = latest_user_message(state["input"]) if state.get("route") == "rule" else state["input"]
+            prompt = prompt.format(query=query, results="\n".join(state["tool_results"]))
+            configurable = (config or {}).get("configurable") or {}
+            with span("llm.synthesis", streamed=bool(configurable.get("on_event"))) as s:
+                llm_response = None
+                if configurable.get("on_event"):
+                    state["output"] = self._stream_answer(prompt, config, configurable.get("max_words"))
+                else:
+                    llm_response = self.llm.invoke(prompt)
+                    state["output"] = llm_response.content if hasattr(llm_response, "content") else str(llm_response)
+                record_llm_usage(s, prompt, state["output"], llm_response)
         else:
             # If all tool results are empty or errors, fallback to a generic message
             state["output"] = "No relevant data found in your Supabase or ChromaDB tables for this query."
         return state
 
-    def _setup_graph(self):
-        workflow = StateGraph(AgentState)
-        workflow.add_node("decompose", self._decompose_node)
-        workflow.add_node("tool_loop", self._tool_loop_node)
-        workflow.add_node("synthesis", self._synthesis_node)
-        workflow.add_edge("decompose", "tool_loop")
-        workflow.add_edge("tool_loop", "synthesis")
-        workflow.add_edge("synthesis", END)
-        workflow.set_entry_point("decompose")
-        return workflow.compile()
+    def _stream_answer(self, prompt, config, max_words=None):
+        """
+        Streams the synthesis completion, emitting each chunk as a token event.
+        Generation stops once max_words words have been produced.
+        """
+        self._emit(config, {"type": "stage", "stage": "synthesis"})
+        text = ""
+        started = time.perf_counter()
+        for chunk in self.llm.stream(prompt):
+            piece = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not text and piece:
+                current_span().set(time_to_first_token_ms=round((time.perf_counter() - started) * 1000, 1))
+            streamed, text = text, text + piece
+            if max_words and len(text.split()) > max_words:
+                cut = [m.end() for m in re.finditer(r"\S+", text)][max_words - 1]
+                self._emit(config, {"type": "token", "text": text[len(streamed):cut] + "..."})
+                return text[:cut] + "..."
+            self._emit(config, {"type": "token", "text": piece})
+        return text
+
+    def _answer_key(self, query: str):
+        """
+        Answer cache key: the latest user message plus a digest of the conversation before it.
+        A question the router resolves on its own (tool and tool input come from the latest
+        message alone) gets an empty digest, so it hits whatever was said earlier in the chat;
+        its answer is synthesized from that message alone too.
+        """
+        question = latest_user_message(query)
+        if self.router and self.router.route(question):
+            return normalize_text(question), ""
+        context = query.rsplit("\nUser: ", 1)[0] if "\nUser: " in query else ""
+        return normalize_text(question), hashlib.sha256(normalize_text(context).encode("utf-8")).hexdigest()[:16]
+
+    def _cached_answer(self, query: str, root=None):
+        key = self._answer_key(query)
+        answer = answer_cache.get(key)
+        if answer is not None:
+            logging.info("[Agent] Answer cache hit")
+        if root is not None:
+            root.set(cache_hit=answer is not None)
+        return key, answer
+
+    def _store_answer(self, key, result, generations):
+        # Only keep answers built from complete tool results
+        if not any(r.startswith(("[Error", "[Timeout")) for r in result.get("tool_results", [])):
+            answer_cache.set(key, result.get("output", str(result)), generations)
 
     def process_query(self, query: str) -> str:
-        result = self.graph.invoke({"input": query})
-        return result.get("output", str(result)) 
\ No newline at end of file
+        with span("query", entry="process_query") as root:
+            key, answer = self._cached_answer(query, root)
+            if answer is not None:
+                return answer
+            generations = answer_cache.snapshot(["supabase", "chroma"])
+            result = self.graph.invoke({"input": query}, config=self._run_config())
+            self._store_answer(key, result, generations)
+            return result.get("output", str(result))
+
+    async def _ainvoke_traced(self, root, inputs, config=None):
+        # Runs in its own task, so activating the root span here doesn't leak into the caller
+        with tracer.activate(root):
+            return await self.graph.ainvoke(inputs, config=config or self._run_config())
+
+    async def aprocess_query(self, query: str) -> str:
+        root = tracer.start_span("query", entry="aprocess_query")
+        try:
+            key, answer = self._cached_answer(query, root)
+            if answer is not None:
+                return answer
+            generations = answer_cache.snapshot(["supabase", "chroma"])
+            # LangGraph runs the synchronous nodes in worker threads under ainvoke,
+            # so the caller's event loop stays free while the pipeline runs
+            result = await asyncio.ensure_future(self._ainvoke_traced(root, {"input": query}))
+            self._store_answer(key, result, generations)
+            return result.get("output", str(result))
+        except Exception as e:
+            root.end(error=e)
+            raise
+        finally:
+            root.end()
+
+    async def astream_query(self, query: str, max_words=None):
+        """
+        Runs the pipeline and yields progress events as they happen:
+        {"type": "stage", "stage": "decompose" | "tools" | "synthesis"}, {"type": "tool_done", "tool": name},
+        {"type": "token", "text": chunk} while the answer is written, and finally {"type": "done", "output": answer}.
+        Args:
+            query (str): The user query.
+            max_words (int, optional): Stop generating the answer after this many words.
+        """
+        root = tracer.start_span("query", entry="astream_query")
+        key, answer = self._cached_answer(query, root)
+        if answer is not None:
+            root.end()
+            yield {"type": "done", "output": answer}
+            return
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def on_event(event):
+            # Nodes run in worker threads; hand events back to the event loop
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        generations = answer_cache.snapshot(["supabase", "chroma"])
+        config = self._run_config(on_event=on_event, max_words=max_words)
+        task = asyncio.ensure_future(self._ainvoke_traced(root, {"input": query}, config=config))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+            result = task.result()
+        except Exception as e:
+            root.end(error=e)
+            raise
+        finally:
+            if not task.done():
+                task.cancel()
+            root.end()
+        self._store_answer(key, result, generations)
+        yield {"type": "done", "output": result.get("output", str(result))}
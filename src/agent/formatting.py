@@ -0,0 +1,157 @@
+import os
+import logging
+from collections import defaultdict
+
+# Per-tool cap on the size of a result handed to the synthesis prompt
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "600"))
+# Longest value rendered in a table cell before it is cut
+MAX_CELL_CHARS = 120
+
+_encoding = None
+_encoding_failed = False
+
+class EmptyResult(str):
+    """
+    A tool result saying the tool had nothing to return (no rows, or nothing it could look up).
+    It reads like any other result, but lets the agent fall back to another tool without
+    parsing the message.
+    """
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with the GPT-4 tokenizer (tiktoken cl100k_base).
+    Falls back to a 4-characters-per-token estimate if the tokenizer cannot be loaded.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_failed = True
+            logging.warning(f"[Formatting] tiktoken unavailable, estimating token counts: {e}")
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+def _cell(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(v) for v in value)
+    if isinstance(value, float):
+        value = f"{value:g}"
+    text = " ".join(str(value).split())
+    if len(text) > MAX_CELL_CHARS:
+        text = text[:MAX_CELL_CHARS - 3] + "..."
+    return text
+
+def render_table(rows, columns):
+    """Renders rows as pipe-separated lines: one header line, then one line per row."""
+    lines = [" | ".join(columns)]
+    for row in rows:
+        lines.append(" | ".join(_cell(row.get(c)) for c in columns))
+    return lines
+
+def fit_lines(lines, budget=TOOL_RESULT_TOKEN_BUDGET, keep=1):
+    """
+    Joins lines, dropping trailing lines once the token budget is spent.
+    Args:
+        lines (list of str): Lines in priority order.
+        budget (int): Maximum tokens for the joined text.
+        keep (int): Number of leading lines always kept (e.g. a table header).
+    Returns:
+        str: The joined text, with a note saying how many lines were omitted.
+    """
+    used = 0
+    kept = []
+    for i, line in enumerate(lines):
+        cost = count_tokens(line) + 1
+        if i >= keep and used + cost > budget:
+            kept.append(f"... ({len(lines) - i} more rows omitted)")
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+def truncate_to_budget(text: str, budget=TOOL_RESULT_TOKEN_BUDGET) -> str:
+    """Cuts free text (SQL results, search output) to the token budget."""
+    if count_tokens(text) <= budget:
+        return text
+    # Shrink proportionally, then trim until it fits
+    cut = int(len(text) * budget / count_tokens(text))
+    while cut > 0 and count_tokens(text[:cut]) > budget:
+        cut = int(cut * 0.9)
+    return text[:cut] + " ... (truncated)"
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+def summarize_daily_logs(rows):
+    """Averages of the daily wellbeing scores across the rows."""
+    fields = ["mood_score", "energy_level", "stress_level", "sleep_hours", "sleep_quality"]
+    averages = {f: _mean([_number(r.get(f)) for r in rows]) for f in fields}
+    parts = [f"{f}={v:g}" for f, v in averages.items() if v is not None]
+    return [f"{len(rows)} days; averages: " + (", ".join(parts) if parts else "n/a")]
+
+def summarize_gym_logs(rows):
+    """Per-exercise progression: sessions, total sets, first and latest weight, best weight."""
+    by_exercise = defaultdict(list)
+    for row in rows:
+        by_exercise[row.get("exercise_name") or "unknown"].append(row)
+    lines = ["exercise | sessions | sets | first_weight | latest_weight | best_weight | last_date"]
+    for exercise, entries in sorted(by_exercise.items(), key=lambda kv: -len(kv[1])):
+        entries.sort(key=lambda r: r.get("date") or "")
+        weights = [_number(r.get("weight")) for r in entries if _number(r.get("weight")) is not None]
+        sets = sum(int(r.get("sets") or 0) for r in entries)
+        lines.append(" | ".join([
+            _cell(exercise), str(len(entries)), str(sets),
+            _cell(weights[0] if weights else None),
+            _cell(weights[-1] if weights else None),
+            _cell(max(weights) if weights else None),
+            _cell(entries[-1].get("date")),
+        ]))
+    return lines
+
+def summarize_spend(rows):
+    """Per-category totals (transactions, total, average), largest first."""
+    by_category = defaultdict(list)
+    for row in rows:
+        amount = _number(row.get("amount"))
+        if amount is not None:
+            by_category[row.get("category") or "uncategorised"].append(amount)
+    total = sum(sum(v) for v in by_category.values())
+    lines = [f"{len(rows)} transactions, total {total:.2f}", "category | count | total | average"]
+    for category, amounts in sorted(by_category.items(), key=lambda kv: -abs(sum(kv[1]))):
+        lines.append(f"{_cell(category)} | {len(amounts)} | {sum(amounts):.2f} | {sum(amounts) / len(amounts):.2f}")
+    return lines
+
+def format_rows(title, rows, columns, summary=None, budget=TOOL_RESULT_TOKEN_BUDGET):
+    """
+    Formats query rows for the synthesis prompt: a title, an optional aggregate summary,
+    then a compact table of the rows, all within the token budget. The summary is
+    given priority; the table fills whatever budget remains.
+    Args:
+        title (str): First line of the result, e.g. "Gym logs for the last 30 days".
+        rows (list of dict): The rows to render, most relevant first.
+        columns (list of str): Columns to keep; all others are dropped.
+        summary (callable, optional): Maps rows to summary lines.
+        budget (int): Token budget for the whole result.
+    Returns:
+        str: The formatted result.
+    """
+    head = [f"{title} ({len(rows)} rows):"]
+    if summary:
+        head += summary(rows)
+    head_text = fit_lines(head, budget)
+    remaining = budget - count_tokens(head_text)
+    if remaining <= 0:
+        return head_text
+    return head_text + "\n" + fit_lines(render_table(rows, columns), remaining)
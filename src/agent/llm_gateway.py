@@ -0,0 +1,278 @@
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+import logging
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from src.agent.tracing import current_span
+from src.agent.formatting import count_tokens
+
+load_dotenv()
+
+# The OpenAI account's rate limits for the model; 0 disables a limit
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "30000"))
+# Completion tokens reserved per request until the response reports its actual usage
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "500"))
+# Retries after a 429, with exponential backoff and jitter (or the server's Retry-After)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "1"))
+
+# Request priorities: lower is served first
+INTERACTIVE, BACKGROUND = 0, 10
+
+class _TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount (capped at the capacity) is available."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount):
+        if self.capacity:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        # Negative levels are allowed: a request that used more than reserved delays the next ones
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+class RateLimiter:
+    def __init__(self, rpm=LLM_RPM_LIMIT, tpm=LLM_TPM_LIMIT):
+        """
+        Requests-per-minute and tokens-per-minute token buckets shared by every LLM caller in
+        the process. Waiting requests are admitted in priority order (then arrival order), so
+        interactive queries go ahead of queued background work.
+        Args:
+            rpm (int): Requests per minute; 0 for no limit.
+            tpm (int): Tokens per minute; 0 for no limit.
+        """
+        self._requests = _TokenBucket(rpm)
+        self._tokens = _TokenBucket(tpm)
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence) tickets
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.rate_limited = 0
+
+    def acquire(self, tokens, priority=INTERACTIVE):
+        """
+        Blocks until a request of the given size fits both budgets and is first in line.
+        Args:
+            tokens (int): Estimated prompt plus completion tokens.
+            priority (int): INTERACTIVE, BACKGROUND or any int; lower goes first.
+        Returns:
+            float: Seconds spent waiting.
+        """
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiting[0] != ticket:
+                        self._cond.wait()
+                        continue
+                    wait = max(self._paused_until - now, self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+                    if wait <= 0:
+                        self._requests.take(1)
+                        self._tokens.take(tokens)
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_seconds += waited
+        return waited
+
+    def settle(self, reserved, used):
+        """Returns unused reserved tokens to the budget (or charges the overrun) once usage is known."""
+        with self._cond:
+            self._tokens.adjust(reserved - used)
+            self._cond.notify_all()
+
+    def pause(self, seconds):
+        """Holds every caller back, e.g. after a 429, so they don't all retry into the same limit."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.rate_limited += 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"waiting": len(self._waiting), "waits": self.waits, "wait_seconds": round(self.wait_seconds, 1),
+                    "rate_limited": self.rate_limited}
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+def get_llm_limiter():
+    """Returns the process-wide RateLimiter for LLM_RPM_LIMIT and LLM_TPM_LIMIT."""
+    global _shared_limiter
+    if _shared_limiter is None:
+        with _shared_limiter_lock:
+            if _shared_limiter is None:
+                _shared_limiter = RateLimiter()
+    return _shared_limiter
+
+def _is_rate_limited(error):
+    # openai.RateLimitError, or any HTTP error carrying a 429; an exhausted quota won't recover by retrying
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if getattr(error, "code", None) == "insufficient_quota":
+        return False
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _total_tokens(response):
+    usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+class LLMGateway:
+    def __init__(self, llm, limiter=None, priority=INTERACTIVE, max_retries=LLM_MAX_RETRIES,
+                 backoff_seconds=LLM_RETRY_BACKOFF_SECONDS):
+        """
+        Wraps a chat model with invoke() and stream(). Identical prompts that are in flight at
+        the same time share one request, every request waits for the shared rate limiter, and
+        429 responses are retried with jittered backoff while all callers hold off.
+        Args:
+            llm: The chat model, e.g. ChatOpenAI (created with max_retries=0, so retries happen here).
+            limiter (RateLimiter, optional): Defaults to the shared limiter.
+            priority (int): Default priority of this gateway's requests.
+            max_retries (int): Retries after a 429.
+            backoff_seconds (float): Delay before the first retry; doubles with each attempt.
+        """
+        self.llm = llm
+        self._limiter = limiter
+        self.priority = priority
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._lock = threading.Lock()
+        self._in_flight = {}  # prompt -> Future of the leader's response
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    @property
+    def limiter(self):
+        return self._limiter or get_llm_limiter()
+
+    def _should_retry(self, error, attempt):
+        """Backs off after a 429 and returns True if the request should be sent again."""
+        if attempt >= self.max_retries or not _is_rate_limited(error):
+            return False
+        delay = max(_retry_after(error), self.backoff_seconds * 2 ** attempt) * random.uniform(0.5, 1.5)
+        logging.warning(f"[LLM] Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+        self.limiter.pause(delay)
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def _send(self, prompt, priority):
+        estimate = count_tokens(prompt) + LLM_EXPECTED_COMPLETION_TOKENS
+        for attempt in itertools.count():
+            waited = self.limiter.acquire(estimate, priority)
+            if waited > 0.001 and current_span() is not None:
+                current_span().set(queued_ms=round(waited * 1000, 1))
+            with self._lock:
+                self.requests += 1
+            try:
+                response = self.llm.invoke(prompt)
+            except Exception as e:
+                if self._should_retry(e, attempt):
+                    continue
+                raise
+            used = _total_tokens(response)
+            if used is not None:
+                self.limiter.settle(estimate, used)
+            return response
+
+    def invoke(self, prompt, priority=None):
+        """
+        Like the model's invoke(). If the same prompt is already in flight, waits for that
+        request and returns its response instead of sending another.
+        Args:
+            prompt (str): The prompt.
+            priority (int, optional): Defaults to the gateway's priority.
+        """
+        with self._lock:
+            future = self._in_flight.get(prompt)
+            leader = future is None
+            if leader:
+                future = self._in_flight[prompt] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            if current_span() is not None:
+                current_span().set(coalesced=True)
+            return future.result()
+        try:
+            response = self._send(prompt, self.priority if priority is None else priority)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[prompt]
+
+    def stream(self, prompt, priority=None):
+        """
+        Like the model's stream(). Streams are not shared; a 429 before the first chunk is retried.
+        """
+        prompt_tokens = count_tokens(prompt)
+        estimate = prompt_tokens + LLM_EXPECTED_COMPLETION_TOKENS
+        for attempt in itertools.count():
+            self.limiter.acquire(estimate, self.priority if priority is None else priority)
+            with self._lock:
+                self.requests += 1
+            started = False
+            completion = []
+            try:
+                for chunk in self.llm.stream(prompt):
+                    started = True
+                    content = getattr(chunk, "content", None)
+                    if isinstance(content, str):
+                        completion.append(content)
+                    yield chunk
+                return
+            except Exception as e:
+                if not started and self._should_retry(e, attempt):
+                    continue
+                raise
+            finally:
+                # Streamed responses carry no usage, so settle with the tokens counted here,
+                # also when the stream fails or the caller stops reading early
+                self.limiter.settle(estimate, prompt_tokens + count_tokens("".join(completion)))
+
+    def stats(self):
+        with self._lock:
+            stats = {"requests": self.requests, "coalesced": self.coalesced, "retries": self.retries}
+        return {**stats, **self.limiter.stats()}
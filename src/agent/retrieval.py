@@ -0,0 +1,350 @@
+import os
+import re
+import math
+import time
+import threading
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+from src.cache import generation
+from src.db.vector_store import get_vector_store, build_where_clauses, DELETES_TAG
+from src.agent.router import tokenize
+
+load_dotenv()
+
+# Candidates taken from each of the vector and keyword rankings before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "20"))
+# Reciprocal rank fusion constant; larger values flatten the difference between ranks
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+# Optional cross-encoder (sentence-transformers model name) that reranks the fused top results
+RETRIEVAL_RERANKER = os.getenv("RETRIEVAL_RERANKER", "")
+RETRIEVAL_RERANK_TOP_N = int(os.getenv("RETRIEVAL_RERANK_TOP_N", "10"))
+KEYWORD_INDEX_PAGE_SIZE = 1000
+# Documents indexed this long before the last keyword index refresh are read again, so a write
+# that was in flight (or stamped by a process with a slightly different clock) is not missed
+KEYWORD_INDEX_OVERLAP_SECONDS = float(os.getenv("KEYWORD_INDEX_OVERLAP_SECONDS", "60"))
+
+_MONTHS = {
+    name: i + 1 for i, name in enumerate(
+        ["january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"]
+    )
+}
+_MONTHS.update({name[:3]: number for name, number in list(_MONTHS.items())})
+_MONTH_PATTERN = "|".join(sorted(_MONTHS, key=len, reverse=True))
+
+# Question keywords -> the 'source' metadata of the matching documents
+SOURCE_KEYWORDS = {
+    "jiujitsu_log": ("bjj", "jiu", "jitsu", "rolling", "sparring"),
+    "gym_log": ("gym", "lift", "workout", "squat", "bench", "deadlift"),
+    "finance_log": ("spend", "spent", "money", "invest", "crypto", "solana", "bitcoin"),
+    "nutrition_log": ("ate", "meal", "food", "calorie", "protein", "diet"),
+    "career_log": ("work", "job", "career", "project", "meeting"),
+}
+
+def _month_range(year, month):
+    start = date(year, month, 1)
+    end = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return start, end
+
+def extract_date_range(text, today=None):
+    """
+    Reads the period a question is about, e.g. "last 3 weeks", "in March 2023", "yesterday",
+    "since June", "in 2022" or explicit YYYY-MM-DD dates.
+    Args:
+        text (str): The question.
+        today (date, optional): Reference date for relative periods. Defaults to today (UTC).
+    Returns:
+        tuple: (date_from, date_to) as YYYY-MM-DD strings, or (None, None) if no period is mentioned.
+    """
+    today = today or datetime.utcnow().date()
+    text = text.lower()
+    explicit = re.findall(r"\b(\d{4}-\d{2}-\d{2})\b", text)
+    if explicit:
+        return min(explicit), max(explicit)
+    start = end = None
+    match = re.search(r"\b(?:last|past)\s+(\d+)\s+(day|week|month|year)s?\b", text)
+    if match:
+        days = int(match.group(1)) * {"day": 1, "week": 7, "month": 30, "year": 365}[match.group(2)]
+        start, end = today - timedelta(days=days), today
+    elif "yesterday" in text:
+        start = end = today - timedelta(days=1)
+    elif "today" in text:
+        start = end = today
+    elif re.search(r"\b(?:last|past) week\b", text):
+        start, end = today - timedelta(days=7), today
+    elif "this week" in text:
+        start, end = today - timedelta(days=today.weekday()), today
+    elif re.search(r"\b(?:last|past) month\b", text):
+        start, end = today - timedelta(days=30), today
+    elif "this month" in text:
+        start, end = today.replace(day=1), today
+    elif re.search(r"\b(?:last|past) year\b", text):
+        start, end = today - timedelta(days=365), today
+    elif "this year" in text:
+        start, end = today.replace(month=1, day=1), today
+    else:
+        month = re.search(rf"\b({_MONTH_PATTERN})\b(?:\s+(\d{{4}}))?", text)
+        year = re.search(r"\b((?:19|20)\d{2})\b", text)
+        if month and not (month.group(1) == "may" and not month.group(2)):
+            number = _MONTHS[month.group(1)]
+            if month.group(2):
+                month_year = int(month.group(2))
+            elif year:
+                month_year = int(year.group(1))
+            else:
+                # A bare month means its most recent occurrence
+                month_year = today.year if number <= today.month else today.year - 1
+            start, end = _month_range(month_year, number)
+        elif year:
+            start, end = date(int(year.group(1)), 1, 1), date(int(year.group(1)), 12, 31)
+        if start and re.search(rf"\bsince\s+(?:{_MONTH_PATTERN}|(?:19|20)\d{{2}})", text):
+            end = today
+    if start is None:
+        return None, None
+    return start.isoformat(), min(end, today).isoformat()
+
+def extract_source(text):
+    """Returns the 'source' metadata value a question is about, or None."""
+    words = set(re.findall(r"[a-z]+", text.lower()))
+    for source, keywords in SOURCE_KEYWORDS.items():
+        if any(kw in words for kw in keywords):
+            return source
+    return None
+
+class BM25Index:
+    def __init__(self, documents=(), k1=1.5, b=0.75):
+        """
+        Okapi BM25 over documents, using the router's tokenizer. Documents can be added or
+        replaced by id later, so the index follows new writes without being rebuilt.
+        Args:
+            documents (list of tuple): (id, text, metadata) triples.
+        """
+        self.k1 = k1
+        self.b = b
+        self.documents = {}  # id -> (text, metadata)
+        self.term_freqs = {}  # id -> Counter of terms
+        self.lengths = {}  # id -> number of terms
+        self.total_length = 0
+        self.doc_freq = Counter()
+        self.postings = {}  # term -> {id: None}, in insertion order
+        self._lock = threading.Lock()
+        self.upsert(documents)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def upsert(self, documents):
+        """Adds (id, text, metadata) triples, replacing documents already indexed under the same id."""
+        with self._lock:
+            for doc_id, text, metadata in documents:
+                self._remove(doc_id)
+                tf = Counter(tokenize(text))
+                self.documents[doc_id] = (text, metadata)
+                self.term_freqs[doc_id] = tf
+                self.lengths[doc_id] = sum(tf.values())
+                self.total_length += self.lengths[doc_id]
+                for term in tf:
+                    self.doc_freq[term] += 1
+                    self.postings.setdefault(term, {})[doc_id] = None
+
+    def _remove(self, doc_id):
+        tf = self.term_freqs.pop(doc_id, None)
+        if tf is None:
+            return
+        del self.documents[doc_id]
+        self.total_length -= self.lengths.pop(doc_id)
+        for term in tf:
+            self.doc_freq[term] -= 1
+            del self.postings[term][doc_id]
+            if not self.doc_freq[term]:
+                del self.doc_freq[term]
+                del self.postings[term]
+
+    def search(self, query, top_n, predicate=None):
+        """
+        Returns up to top_n (score, id, text, metadata) tuples, best first.
+        Args:
+            predicate (callable, optional): Called with a document's metadata; False excludes it.
+        """
+        with self._lock:
+            n = len(self.documents)
+            avg_length = self.total_length / n if n else 0
+            scores = Counter()
+            for term in set(tokenize(query)):
+                df = self.doc_freq.get(term)
+                if not df:
+                    continue
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for doc_id in self.postings[term]:
+                    tf = self.term_freqs[doc_id][term]
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            results = []
+            for doc_id, score in scores.most_common():
+                text, metadata = self.documents[doc_id]
+                if predicate is None or predicate(metadata):
+                    results.append((score, doc_id, text, metadata))
+                    if len(results) == top_n:
+                        break
+            return results
+
+def load_reranker(model=RETRIEVAL_RERANKER):
+    """
+    Loads a cross-encoder reranker, or returns None if none is configured or
+    sentence-transformers is not installed.
+    Returns:
+        callable: (query, list of texts) -> list of relevance scores.
+    """
+    if not model:
+        return None
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError:
+        logging.warning("[Retrieval] RETRIEVAL_RERANKER is set but sentence-transformers is not installed")
+        return None
+    encoder = CrossEncoder(model)
+    return lambda query, texts: [float(s) for s in encoder.predict([(query, text) for text in texts])]
+
+class HybridRetriever:
+    def __init__(self, vector_store=None, collection_name="my_life_logs", reranker=None,
+                 candidates=RETRIEVAL_CANDIDATES, rrf_k=RETRIEVAL_RRF_K, rerank_top_n=RETRIEVAL_RERANK_TOP_N,
+                 use_filters=True, use_keywords=True):
+        """
+        Semantic search over the log collection: metadata prefilters from the question,
+        vector and BM25 keyword rankings fused with reciprocal rank fusion, and an optional rerank.
+        Args:
+            vector_store (VectorStore, optional): Defaults to the shared store for collection_name.
+            collection_name (str): The collection to search.
+            reranker (callable, optional): (query, texts) -> scores. Defaults to load_reranker().
+            candidates (int): Results taken from each ranking before fusion.
+            rrf_k (int): Reciprocal rank fusion constant.
+            rerank_top_n (int): Fused results passed to the reranker.
+            use_filters (bool): Apply date and source filters read from the question.
+            use_keywords (bool): Fuse in the BM25 keyword ranking.
+        """
+        self.store = vector_store or get_vector_store(collection_name)
+        self.collection_name = self.store.collection_name
+        self.reranker = reranker if reranker is not None else load_reranker()
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.rerank_top_n = rerank_top_n
+        self.use_filters = use_filters
+        self.use_keywords = use_keywords
+        self._indexes = {}  # user_id -> (chroma generation, deletes generation, refreshed at, BM25Index)
+        self._lock = threading.Lock()
+
+    def keyword_index(self, user_id=None):
+        """
+        Returns the BM25 index over a user's documents. It is built from the whole collection
+        once; after later writes only the documents indexed since the last refresh (by their
+        'indexed_at' metadata) are read and merged in. A delete means a full rebuild.
+        """
+        current, deletes = generation("chroma"), generation(DELETES_TAG)
+        with self._lock:
+            cached = self._indexes.get(user_id)
+            if cached and cached[0] == current:
+                return cached[3]
+            refreshed_at = time.time()
+            conditions = [{"user_id": user_id}] if user_id else []
+            incremental = bool(cached) and cached[1] == deletes
+            if incremental:
+                index = cached[3]
+                conditions.append({"indexed_at": {"$gt": cached[2] - KEYWORD_INDEX_OVERLAP_SECONDS}})
+            else:
+                index = BM25Index()
+            where = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else None)
+            added = 0
+            for page in self.store.iter_documents(where=where, batch_size=KEYWORD_INDEX_PAGE_SIZE):
+                index.upsert(zip(page["ids"], page["documents"], [m or {} for m in page["metadatas"]]))
+                added += len(page["ids"])
+            self._indexes[user_id] = (current, deletes, refreshed_at, index)
+        logging.info(f"[Retrieval] {'Updated' if incremental else 'Built'} keyword index with {added} documents ({len(index)} indexed)")
+        return index
+
+    def _vector_search(self, question, user_id, date_from, date_to, source):
+        wheres = build_where_clauses(date_from, date_to, user_id, source, chunk_days=None)
+        results = self.store.query_collection(
+            query_texts=[question],
+            n_results=self.candidates,
+            where=wheres[0] if wheres else None,
+        )
+        return list(zip(results["ids"][0], results["documents"][0], results["metadatas"][0]))
+
+    def _keyword_search(self, question, user_id, date_from, date_to, source):
+        def predicate(metadata):
+            if source and metadata.get("source") != source:
+                return False
+            if date_from and not (date_from <= str(metadata.get("date", "")) <= date_to):
+                return False
+            return True
+        hits = self.keyword_index(user_id).search(question, self.candidates, predicate)
+        return [(doc_id, text, metadata) for _, doc_id, text, metadata in hits]
+
+    def retrieve(self, question, user_id=None, k=3, today=None):
+        """
+        Finds the documents that best answer a question.
+        Args:
+            question (str): The question.
+            user_id (str, optional): Only search this user's documents.
+            k (int): Number of results.
+            today (date, optional): Reference date for relative periods like "last month".
+        Returns:
+            dict: "hits" (list of dicts with id, document, metadata, score, vector_rank and
+                keyword_rank), "filters" applied and "timings_ms" per stage.
+        """
+        timings = {}
+        started = time.perf_counter()
+        date_from, date_to = extract_date_range(question, today) if self.use_filters else (None, None)
+        source = extract_source(question) if self.use_filters else None
+
+        rankings = {}
+        for name, search, enabled in (("vector", self._vector_search, True), ("keyword", self._keyword_search, self.use_keywords)):
+            if not enabled:
+                continue
+            stage_started = time.perf_counter()
+            ranking = search(question, user_id, date_from, date_to, source)
+            if source and len(ranking) < k:
+                # Not every document carries a 'source'; fall back to the date/user filters only
+                ranking = search(question, user_id, date_from, date_to, None)
+            rankings[name] = ranking
+            timings[name] = (time.perf_counter() - stage_started) * 1000
+
+        fused = {}
+        for name, ranking in rankings.items():
+            for rank, (doc_id, text, metadata) in enumerate(ranking, start=1):
+                hit = fused.setdefault(doc_id, {
+                    "id": doc_id, "document": text, "metadata": metadata, "score": 0.0,
+                    "vector_rank": None, "keyword_rank": None,
+                })
+                hit[f"{name}_rank"] = rank
+                hit["score"] += 1.0 / (self.rrf_k + rank)
+        hits = sorted(fused.values(), key=lambda h: h["score"], reverse=True)
+
+        if self.reranker and hits:
+            stage_started = time.perf_counter()
+            head = hits[:self.rerank_top_n]
+            for hit, score in zip(head, self.reranker(question, [h["document"] for h in head])):
+                hit["score"] = score
+            hits = sorted(head, key=lambda h: h["score"], reverse=True) + hits[self.rerank_top_n:]
+            timings["rerank"] = (time.perf_counter() - stage_started) * 1000
+
+        timings["total"] = (time.perf_counter() - started) * 1000
+        return {
+            "hits": hits[:k],
+            "filters": {"user_id": user_id, "date_from": date_from, "date_to": date_to, "source": source},
+            "timings_ms": timings,
+        }
+
+_shared_retriever = None
+_shared_retriever_lock = threading.Lock()
+
+def get_retriever():
+    """Returns the process-wide HybridRetriever for the 'my_life_logs' collection on VECTOR_BACKEND."""
+    global _shared_retriever
+    if _shared_retriever is None:
+        with _shared_retriever_lock:
+            if _shared_retriever is None:
+                _shared_retriever = HybridRetriever()
+    return _shared_retriever
@@ -0,0 +1,183 @@
+import os
+import re
+import math
+from abc import ABC, abstractmethod
+from collections import Counter
+
+# A routed query goes straight to its tool only if the best intent scores at least
+# ROUTER_MIN_CONFIDENCE and beats the runner-up by ROUTER_MIN_MARGIN
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.35"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.12"))
+
+# Labelled example questions per tool, covering the common single-intent Telegram traffic
+INTENT_EXAMPLES = {
+    "query_daily_logs": [
+        "how did I sleep this week",
+        "how was my week",
+        "how has my mood been lately",
+        "what was my energy level recently",
+        "how stressed have I been",
+        "what did I write in my daily logs",
+        "how many hours of sleep did I get",
+        "how was my sleep quality",
+        "how have I been feeling",
+    ],
+    "query_gym_logs": [
+        "what did I lift at the gym",
+        "how is my squat progressing",
+        "show my bench press progress",
+        "what gym workouts did I do this month",
+        "how many sets and reps did I do",
+        "what is my deadlift weight",
+        "how often did I train at the gym",
+        "what exercises did I do in my last workout",
+    ],
+    "query_financial_transactions": [
+        "how much did I spend",
+        "what are my recent expenses",
+        "how much money did I spend on food",
+        "show my recent transactions",
+        "what did I buy last week",
+        "how is my budget looking",
+        "what are my biggest purchases",
+        "how much did I pay for groceries",
+    ],
+    "local_analytics": [
+        "is my sleep correlated with my bjj performance",
+        "does my mood affect my spending",
+        "am I overspending after intense weeks of training",
+        "relationship between sleep and mood",
+        "does training volume correlate with energy",
+        "how does stress relate to productivity",
+    ],
+    "query_digests": [
+        "give me a summary of the month",
+        "recap my week",
+        "summarize my training this month",
+        "weekly recap of my bjj",
+        "monthly overview of my spending",
+        "compare this period to the previous one",
+        "digest of my sleep and mood",
+    ],
+    "chroma_semantic_search": [
+        "when did I last feel mentally fresh",
+        "find entries where I mentioned my knee",
+        "have I written about burnout before",
+        "what did I say about my coach",
+        "remember when I felt frustrated",
+        "when did I mention feeling tired",
+    ],
+    "web_search": [
+        "what are the latest industry trends",
+        "what is the price of bitcoin today",
+        "what is the latest news",
+        "what is the weather forecast",
+        "look up current best practices online",
+        "search the web for",
+    ],
+}
+
+_STOPWORDS = {
+    "a", "an", "the", "i", "my", "me", "is", "was", "were", "be", "been", "do", "did", "does",
+    "have", "has", "had", "what", "how", "when", "of", "on", "in", "at", "to", "for", "and",
+    "or", "this", "that", "it", "are", "with", "about", "can", "you", "show", "tell",
+}
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, with a light suffix stemmer."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(word) > len(suffix) + 2 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        tokens.append(word)
+    return tokens
+
+def latest_user_message(text):
+    """
+    The bot prefixes queries with conversation history ending in "User: <message>".
+    Routing looks only at that last message.
+    """
+    marker = "\nUser: "
+    if marker in text:
+        return text.rsplit(marker, 1)[1].strip()
+    return text.strip()
+
+# Where a multi-part question splits: punctuation, or "and" followed by a new question
+_CLAUSE_BREAK = re.compile(
+    r"[,;?]|\band\s+(?=(?:what|how|when|where|which|who|why|did|do|does|is|was|are|were|have|has|show|list|give|tell)\b)",
+    re.IGNORECASE,
+)
+
+class QueryRouter(ABC):
+    """
+    Decides which tool answers a query without calling the LLM.
+    route() returns {"tool": name, "confidence": float, "path": label} for a confident
+    single-intent match, or None to fall back to the LLM planner.
+    """
+    @abstractmethod
+    def route(self, query):
+        """Returns the routing decision for a query, or None."""
+
+class TfidfIntentRouter(QueryRouter):
+    def __init__(self, intent_examples=None, min_confidence=ROUTER_MIN_CONFIDENCE, min_margin=ROUTER_MIN_MARGIN):
+        """
+        Nearest-centroid TF-IDF classifier over labelled example questions.
+        Args:
+            intent_examples (dict, optional): Tool name -> list of example questions.
+            min_confidence (float): Minimum cosine similarity to the best intent.
+            min_margin (float): Minimum lead of the best intent over the second best.
+        """
+        self.intent_examples = intent_examples or INTENT_EXAMPLES
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        documents = [tokenize(ex) for examples in self.intent_examples.values() for ex in examples]
+        doc_freq = Counter(token for doc in documents for token in set(doc))
+        self.idf = {t: math.log((1 + len(documents)) / (1 + df)) + 1 for t, df in doc_freq.items()}
+        self.centroids = {}
+        for intent, examples in self.intent_examples.items():
+            centroid = Counter()
+            for ex in examples:
+                for token, weight in self._vector(ex).items():
+                    centroid[token] += weight
+            self.centroids[intent] = self._normalize(centroid)
+
+    def _vector(self, text):
+        counts = Counter(t for t in tokenize(text) if t in self.idf)
+        return self._normalize({t: c * self.idf[t] for t, c in counts.items()})
+
+    @staticmethod
+    def _normalize(vector):
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {t: w / norm for t, w in vector.items()} if norm else {}
+
+    def scores(self, query):
+        vector = self._vector(query)
+        return {
+            intent: sum(w * centroid.get(t, 0.0) for t, w in vector.items())
+            for intent, centroid in self.centroids.items()
+        }
+
+    def _classify(self, text):
+        ranked = sorted(self.scores(text).items(), key=lambda kv: -kv[1])
+        if not ranked:
+            return None, 0.0
+        # With a single intent there is no runner-up, so the margin is the score itself
+        (best, best_score), second_score = ranked[0], ranked[1][1] if len(ranked) > 1 else 0.0
+        if best_score < self.min_confidence or best_score - second_score < self.min_margin:
+            return None, best_score
+        return best, best_score
+
+    def route(self, query):
+        # Multi-part questions ("X, and Y?") are only routed if every part agrees on one tool.
+        # "and" only separates parts when a new question follows it, so "sleep and mood" stays whole
+        clauses = [c for c in _CLAUSE_BREAK.split(query) if tokenize(c)] or [query]
+        decisions = [self._classify(c) for c in clauses]
+        tools = {tool for tool, _ in decisions}
+        if None in tools or len(tools) != 1:
+            return None
+        confidence = min(score for _, score in decisions)
+        return {"tool": tools.pop(), "confidence": round(confidence, 3), "path": "rule"}
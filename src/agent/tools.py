@@ -0,0 +1,271 @@
+import os
+import re
+import json
+from datetime import datetime, timedelta
+from langchain.tools import tool
+from dotenv import load_dotenv
+from src.db.supabase_client import get_supabase_manager
+from src.db.local_store import get_local_store, LOCAL_STORE_SYNC_INTERVAL_SECONDS
+from src.db.analytics import ANALYTICS_QUERIES, build_params, query_for_text
+from src.db.vector_store import get_vector_store
+from src.db.rollups import DIGEST_COLLECTION, period_starts
+from src.agent.retrieval import get_retriever, extract_date_range
+from src.agent.formatting import EmptyResult, format_rows, fit_lines, truncate_to_budget, summarize_daily_logs, summarize_gym_logs, summarize_spend
+
+load_dotenv()
+
+# Look-back windows and row caps for the log tools
+GYM_LOGS_WINDOW_DAYS = int(os.getenv("GYM_LOGS_WINDOW_DAYS", "30"))
+FINANCE_WINDOW_DAYS = int(os.getenv("FINANCE_WINDOW_DAYS", "30"))
+TOOL_MAX_ROWS = int(os.getenv("TOOL_MAX_ROWS", "200"))
+SEMANTIC_SEARCH_RESULTS = int(os.getenv("SEMANTIC_SEARCH_RESULTS", "5"))
+DIGEST_MAX_PERIODS = int(os.getenv("DIGEST_MAX_PERIODS", "12"))
+
+DAILY_LOG_COLUMNS = "date,free_text,mood_score,energy_level,stress_level,sleep_hours,sleep_quality"
+GYM_LOG_COLUMNS = "date,exercise_name,sets,reps,weight,duration_minutes,notes"
+FINANCE_COLUMNS = "date,amount,currency,category,description,transaction_type"
+
+def _select_recent(table_name, columns, days):
+    """Fetches the user's rows from the last `days` days, newest first, filtered by Postgres."""
+    today = datetime.utcnow().date()
+    return get_supabase_manager().select_data(
+        table_name=table_name,
+        columns=columns,
+        filters={"user_id": os.getenv("USER_UUID")},
+        gte={"date": (today - timedelta(days=days)).isoformat()},
+        lte={"date": today.isoformat()},
+        order_by="date",
+        descending=True,
+        limit=TOOL_MAX_ROWS,
+    )
+
+# Tool: Query daily logs from Supabase
+@tool
+def query_daily_logs_tool(query: str) -> str:
+    """Fetch the last 7 days of daily logs for the user."""
+    if not os.getenv("USER_UUID"):
+        return "[QueryDailyLogs] USER_UUID not set in environment."
+    response = _select_recent("daily_logs", DAILY_LOG_COLUMNS, 7)
+    if not response or not response.data:
+        return "No daily logs found in the last 7 days."
+    return format_rows("Daily logs for the last 7 days", response.data, DAILY_LOG_COLUMNS.split(","), summarize_daily_logs)
+
+# Tool: Query gym logs from Supabase
+@tool
+def query_gym_logs_tool(query: str) -> str:
+    """Fetch recent gym logs for the user."""
+    if not os.getenv("USER_UUID"):
+        return "[QueryGymLogs] USER_UUID not set in environment."
+    response = _select_recent("gym_logs", GYM_LOG_COLUMNS, GYM_LOGS_WINDOW_DAYS)
+    if not response or not response.data:
+        return "No gym logs found."
+    return format_rows(f"Gym logs for the last {GYM_LOGS_WINDOW_DAYS} days", response.data, GYM_LOG_COLUMNS.split(","), summarize_gym_logs)
+
+# Tool: Query financial transactions from Supabase
+@tool
+def query_financial_transactions_tool(query: str) -> str:
+    """Fetch recent financial transactions for the user."""
+    if not os.getenv("USER_UUID"):
+        return "[QueryFinancialTransactions] USER_UUID not set in environment."
+    response = _select_recent("financial_transactions", FINANCE_COLUMNS, FINANCE_WINDOW_DAYS)
+    if not response or not response.data:
+        return "No financial transactions found."
+    return format_rows(f"Financial transactions for the last {FINANCE_WINDOW_DAYS} days", response.data, FINANCE_COLUMNS.split(","), summarize_spend)
+
+# Tool: Custom SQL query
+@tool
+def custom_sql_tool(sql: str) -> str:
+    """Run a custom SQL query on Supabase. Use for advanced calculations or joins."""
+    supabase = get_supabase_manager()
+    try:
+        result = supabase.execute_sql(sql)
+        return truncate_to_budget(f"SQL result: {result.data}")
+    except Exception as e:
+        return f"[SQL Error]: {e}"
+
+# Tool: Named analytics query
+@tool
+def analytics_query_tool(spec: str) -> str:
+    """Run a named, parameterized aggregate query (totals, averages, weekly volume, rolling trends).
+    Accepts a JSON spec {"name": ..., "params": {...}} or a plain-language question."""
+    user_id = os.getenv("USER_UUID")
+    if not user_id:
+        return "[Analytics] USER_UUID not set in environment."
+    try:
+        parsed = json.loads(spec)
+        name, params = parsed["name"], parsed.get("params", {})
+    except (ValueError, TypeError, KeyError):
+        name, params = query_for_text(spec)
+        if name is None:
+            return f"[Analytics] No analytics query matches: {spec}"
+    try:
+        function, rpc_params = build_params(name, user_id, params)
+    except ValueError as e:
+        return f"[Analytics] {e}"
+    response = get_supabase_manager().call_function(function, rpc_params)
+    rows = response.data or []
+    if not rows:
+        return f"No data for analytics query {name}."
+    title = f"{ANALYTICS_QUERIES[name][1]} from {rpc_params['p_since']} to {rpc_params['p_until']}"
+    return format_rows(title, rows, list(rows[0].keys()))
+
+# Words that name a metric in the local analytics store, checked longest first
+METRIC_KEYWORDS = [
+    ("sleep quality", "sleep_quality"), ("performance", "bjj_performance"), ("bjj", "bjj_performance"),
+    ("jiu", "bjj_performance"), ("rolls", "bjj_rolls"), ("training volume", "training_volume"),
+    ("training", "training_volume"), ("gym", "training_volume"), ("lifting", "training_volume"),
+    ("overspend", "spend"), ("spend", "spend"), ("money", "spend"), ("calorie", "calories"),
+    ("diet", "calories"), ("productiv", "productivity"), ("work", "work_hours"), ("sleep", "sleep_hours"),
+    ("mood", "mood"), ("energy", "energy"), ("stress", "stress"),
+]
+
+# Tool: Correlations over the local analytics store
+@tool
+def local_analytics_tool(query: str) -> str:
+    """Correlate two metrics (sleep, mood, BJJ performance, training volume, spend, ...) over months of history."""
+    user_id = os.getenv("USER_UUID")
+    if not user_id:
+        return "[LocalAnalytics] USER_UUID not set in environment."
+    query_lower = query.lower()
+    found = {}
+    for keyword, metric in METRIC_KEYWORDS:
+        pos = query_lower.find(keyword)
+        if pos >= 0 and metric not in found and pos not in found.values():
+            found[metric] = pos
+    metrics = sorted(found, key=found.get)
+    if len(metrics) < 2:
+        return f"[LocalAnalytics] Could not find two metrics to compare in: {query}"
+    metric_a, metric_b = metrics[:2]
+    lag = 0
+    after = query_lower.find(" after ")
+    if after >= 0 and found[metric_a] < after < found[metric_b]:
+        # "X after Y": Y comes first, X in the following period
+        metric_a, metric_b, lag = metric_b, metric_a, 1
+    granularity = "week" if "week" in query_lower else "day"
+    store = get_local_store()
+    age = store.last_synced(user_id)
+    if age is None or age > LOCAL_STORE_SYNC_INTERVAL_SECONDS:
+        store.sync(get_supabase_manager(), user_id=user_id)
+    result = store.correlate(metric_a, metric_b, user_id, granularity=granularity, lag=lag)
+    if not result["buckets"]:
+        return f"No overlapping {metric_a} and {metric_b} data in the local store."
+    correlation = "n/a" if result["correlation"] is None else f"{result['correlation']:.2f}"
+    lag_text = f", {metric_b} taken one {granularity} later" if lag else ""
+    return (
+        f"Correlation of {metric_a} vs {metric_b} per {granularity} since {result['since']}{lag_text}: "
+        f"r={correlation} over {result['buckets']} {granularity}s; "
+        f"average {metric_a}={result['avg_a']:.2f}, average {metric_b}={result['avg_b']:.2f}"
+    )
+
+# Tool: Semantic search in ChromaDB
+@tool
+def chroma_semantic_search_tool(query: str) -> str:
+    """Search the user's personal logs by meaning and keywords, scoped to any period or topic named in the query."""
+    result = get_retriever().retrieve(query, user_id=os.getenv("USER_UUID"), k=SEMANTIC_SEARCH_RESULTS)
+    if not result["hits"]:
+        return "No matching log entries found."
+    filters = ", ".join(f"{k}={v}" for k, v in result["filters"].items() if v and k != "user_id")
+    lines = [f"Log entries matching the query{f' ({filters})' if filters else ''}:"]
+    for hit in result["hits"]:
+        lines.append(f"{hit['metadata'].get('date', 'undated')}: {hit['document']}")
+    return fit_lines(lines)
+
+# Words that name a digest domain (see src/db/rollups.py)
+DIGEST_DOMAIN_KEYWORDS = [
+    (("bjj", "jiu", "jitsu", "roll", "grappl"), "bjj"),
+    (("gym", "lift", "train", "workout", "squat", "bench", "deadlift"), "gym"),
+    (("sleep", "mood", "energy", "stress", "feel"), "sleep_mood"),
+    (("spend", "spent", "money", "expense", "budget"), "spend"),
+]
+# Look-back when a question names no period, per period type
+DIGEST_DEFAULT_WINDOW_DAYS = {"day": 7, "week": 28, "month": 90}
+
+def _search_digests(query, user_id, period_type, date_from, date_to):
+    """Digests of the periods overlapping the range, ranked by similarity to the question."""
+    starts = period_starts(datetime.strptime(date_from, "%Y-%m-%d").date(),
+                           datetime.strptime(date_to, "%Y-%m-%d").date(), period_type)
+    results = get_vector_store(DIGEST_COLLECTION).query_collection(
+        query_texts=[query],
+        n_results=DIGEST_MAX_PERIODS,
+        where={"$and": [{"user_id": user_id}, {"period_type": period_type}, {"date": {"$in": starts}}]},
+        include=["documents", "metadatas"],
+    )
+    if not results["documents"]:
+        return []
+    return [{"domain": metadata["domain"], "period_start": metadata["period_start"], "digest": document}
+            for document, metadata in zip(results["documents"][0], results["metadatas"][0])]
+
+# Tool: Precomputed period digests
+@tool
+def query_digests_tool(query: str) -> str:
+    """Read precomputed daily, weekly and monthly summaries of gym training, BJJ, sleep/mood and spending.
+    Use first for retrospective questions about a period, e.g. "how did I train this month"."""
+    user_id = os.getenv("USER_UUID")
+    if not user_id:
+        return EmptyResult("[Digests] USER_UUID not set in environment.")
+    text = query.lower()
+    domains = [domain for keywords, domain in DIGEST_DOMAIN_KEYWORDS if any(k in text for k in keywords)]
+    date_from, date_to = extract_date_range(query)
+    if "month" in text or "year" in text:
+        period_type = "month"
+    elif "week" in text:
+        period_type = "week"
+    elif re.search(r"\b(?:today|yesterday|days?)\b", text):
+        period_type = "day"
+    elif date_from:
+        span_days = (datetime.strptime(date_to, "%Y-%m-%d") - datetime.strptime(date_from, "%Y-%m-%d")).days
+        period_type = "day" if span_days <= 3 else "week" if span_days <= 31 else "month"
+    else:
+        period_type = "week"
+    today = datetime.utcnow().date()
+    date_from = date_from or (today - timedelta(days=DIGEST_DEFAULT_WINDOW_DAYS[period_type])).isoformat()
+    date_to = date_to or today.isoformat()
+    if not domains:
+        # A free-text question ("when was I most run down last month") names no domain;
+        # rank the period's digests by meaning instead of returning all of them
+        rows = _search_digests(query, user_id, period_type, date_from, date_to)
+        if rows:
+            rows.sort(key=lambda r: (r["period_start"], r["domain"]))
+            return fit_lines([f"Precomputed {period_type} digests from {date_from} to {date_to} closest to the question:"]
+                             + [r["digest"] for r in rows])
+    filters = {"user_id": user_id, "period_type": period_type}
+    if len(domains) == 1:
+        filters["domain"] = domains[0]
+    # Periods that overlap the range, newest first
+    response = get_supabase_manager().select_data(
+        table_name="period_rollups",
+        columns="domain,period_start,digest",
+        filters=filters,
+        gte={"period_end": date_from},
+        lte={"period_start": date_to},
+        order_by="period_start",
+        descending=True,
+        limit=DIGEST_MAX_PERIODS * len(DIGEST_DOMAIN_KEYWORDS),
+    )
+    rows = [r for r in (response.data or []) if not domains or r["domain"] in domains]
+    if not rows:
+        return EmptyResult(f"No {period_type} digests between {date_from} and {date_to}.")
+    rows.sort(key=lambda r: (r["period_start"], r["domain"]))
+    return fit_lines([f"Precomputed {period_type} digests from {date_from} to {date_to}:"] + [r["digest"] for r in rows])
+
+# Tool: Web search using DuckDuckGo
+@tool
+def web_search_tool(query: str) -> str:
+    """Search the web for up-to-date information using DuckDuckGo."""
+    # Imported here so the search client is only loaded when the web is searched
+    from langchain_community.tools import DuckDuckGoSearchRun
+    search = DuckDuckGoSearchRun()
+    return truncate_to_budget(search.run(query))
+
+# The agent's tools by the names the router and planner use
+TOOLS = {
+    "query_daily_logs": query_daily_logs_tool,
+    "query_gym_logs": query_gym_logs_tool,
+    "query_financial_transactions": query_financial_transactions_tool,
+    "custom_sql": custom_sql_tool,
+    "analytics": analytics_query_tool,
+    "local_analytics": local_analytics_tool,
+    "chroma_semantic_search": chroma_semantic_search_tool,
+    "query_digests": query_digests_tool,
+    "web_search": web_search_tool
+}
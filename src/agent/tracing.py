@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import secrets
+import functools
+import threading
+import contextvars
+import logging
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from src.agent.formatting import count_tokens
+
+load_dotenv()
+
+# Finished spans are appended here as JSON lines, one OpenTelemetry-style span per line.
+# Set TRACE_FILE to an empty string to keep only the in-process summary.
+TRACE_FILE = os.getenv("TRACE_FILE", "./data/traces.jsonl")
+# Durations kept per span name for the p50/p95 summary
+TRACE_HISTOGRAM_WINDOW = int(os.getenv("TRACE_HISTOGRAM_WINDOW", "1000"))
+# Used to estimate LLM cost from token counts (USD per 1K tokens; defaults are gpt-4 list prices)
+LLM_PROMPT_COST_PER_1K = float(os.getenv("LLM_PROMPT_COST_PER_1K", "0.03"))
+LLM_COMPLETION_COST_PER_1K = float(os.getenv("LLM_COMPLETION_COST_PER_1K", "0.06"))
+
+# Span attributes that are summed across spans in the totals
+_SUMMED_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "cost_usd", "payload_bytes")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        """A timed operation; use Tracer.span() or Tracer.start_span() rather than creating one directly."""
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    def set(self, **attributes):
+        """Adds or overwrites attributes, e.g. span.set(cache_hit=True)."""
+        self.attributes.update(attributes)
+
+    def end(self, error=None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self.error = error
+        self.tracer._export(self)
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.start_ns + int(self.duration_ms * 1e6),
+            "durationMs": round(self.duration_ms, 3),
+            "status": {"code": "ERROR", "message": str(self.error)} if self.error else {"code": "OK"},
+            "attributes": self.attributes,
+        }
+
+class Tracer:
+    def __init__(self, path=TRACE_FILE, window=TRACE_HISTOGRAM_WINDOW):
+        """
+        Collects spans: appends each finished span to a JSONL file and keeps recent durations
+        and attribute totals per span name for an in-process summary.
+        Args:
+            path (str): JSONL file for finished spans; empty to disable the file sink.
+            window (int): Recent durations kept per span name.
+        """
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = defaultdict(lambda: deque(maxlen=self.window))
+        self._totals = defaultdict(float)
+        self._cache = defaultdict(lambda: [0, 0])  # span name -> [hits, lookups]
+        self._errors = defaultdict(int)
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def start_span(self, name, parent=None, **attributes):
+        """Starts a span under parent (default: the current span). The caller must end() it."""
+        return Span(self, name, parent or _current_span.get(), attributes)
+
+    @contextmanager
+    def activate(self, span):
+        """Makes span the parent of spans started in this context."""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Times the enclosed block as a child of the current span."""
+        span = self.start_span(name, **attributes)
+        with self.activate(span):
+            try:
+                yield span
+            except BaseException as e:
+                span.end(error=e)
+                raise
+        span.end()
+
+    def _export(self, span):
+        with self._lock:
+            self._durations[span.name].append(span.duration_ms)
+            for key in _SUMMED_ATTRIBUTES:
+                if key in span.attributes:
+                    self._totals[key] += span.attributes[key] or 0
+            if "cache_hit" in span.attributes:
+                self._cache[span.name][0] += bool(span.attributes["cache_hit"])
+                self._cache[span.name][1] += 1
+            if span.error:
+                self._errors[span.name] += 1
+            if self.path:
+                try:
+                    with open(self.path, "a") as f:
+                        f.write(json.dumps(span.to_dict(), default=str) + "\n")
+                except OSError as e:
+                    logging.warning(f"[Tracing] Could not write span: {e}")
+
+    def summary(self):
+        """
+        Returns:
+            dict: span name -> {"count", "p50_ms", "p95_ms", "max_ms", "errors"} over the recent window.
+        """
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+            errors = dict(self._errors)
+        result = {}
+        for name, values in sorted(durations.items()):
+            pick = lambda p: values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+            result[name] = {"count": len(values), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": values[-1], "errors": errors.get(name, 0)}
+        return result
+
+    def totals(self):
+        """Token, cost and payload totals, and cache hits/lookups per span name, since startup."""
+        with self._lock:
+            return {**{key: self._totals[key] for key in _SUMMED_ATTRIBUTES}, "cache": {k: tuple(v) for k, v in self._cache.items()}}
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._totals.clear()
+            self._cache.clear()
+            self._errors.clear()
+
+tracer = Tracer()
+
+def span(name, **attributes):
+    """Shortcut for tracer.span()."""
+    return tracer.span(name, **attributes)
+
+def current_span():
+    """The active span, or None."""
+    return _current_span.get()
+
+def traced(name):
+    """Decorator that records each call of the function as a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_llm_usage(span, prompt, completion, response=None):
+    """
+    Sets token counts, payload bytes and estimated cost on an LLM span. Uses the provider's
+    token usage when the response carries it (non-streaming calls), else counts locally.
+    A response shared with another caller (see LLMGateway) was paid for by that caller.
+    """
+    if span.attributes.get("coalesced"):
+        span.set(payload_bytes=len(prompt.encode("utf-8")), token_source="coalesced")
+        return
+    usage = ((getattr(response, "response_metadata", None) or {}).get("token_usage") or {}) if response is not None else {}
+    prompt_tokens = usage.get("prompt_tokens") or count_tokens(prompt)
+    completion_tokens = usage.get("completion_tokens") or count_tokens(completion)
+    span.set(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        payload_bytes=len(prompt.encode("utf-8")),
+        cost_usd=round(prompt_tokens / 1000 * LLM_PROMPT_COST_PER_1K + completion_tokens / 1000 * LLM_COMPLETION_COST_PER_1K, 6),
+        token_source="provider" if usage else "estimate",
+    )
@@ -1,30 +1,127 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 import os
-import uuid
-from src.db.vector_store import ChromaDBManager
+import sys
+import time
+import queue
+import base64
+import numbers
+from array import array
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from src.db.vector_store import get_vector_store, warm_up, make_document_id
+from src.api.write_queue import WriteBatcher, WriteQueueClosed
+from src.api.metrics import RequestMetrics
 
 app = Flask(__name__)
 
 # Use environment variable or default directory for ChromaDB
 CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+MAX_BATCH_RECORDS = int(os.getenv("MAX_BATCH_RECORDS", "1000"))
+# Request bodies larger than this are rejected with 413 before they are read
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(16 * 1024 * 1024)))
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
 
-# Initialize ChromaDBManager
-chroma = ChromaDBManager(persist_directory=CHROMA_PERSIST_DIRECTORY, collection_name="my_life_logs")
+# Shared vector store (VECTOR_BACKEND); open it and resolve the collection before the first request
+chroma = get_vector_store(collection_name="my_life_logs", persist_directory=CHROMA_PERSIST_DIRECTORY)
+warm_up(["my_life_logs"], persist_directory=CHROMA_PERSIST_DIRECTORY)
+# All writes go through one writer thread, which coalesces concurrent requests into batched upserts
+write_queue = WriteBatcher(chroma)
+metrics = RequestMetrics()
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    metrics.observe(request.endpoint or "unknown", response.status_code, time.perf_counter() - g.get("started", time.perf_counter()))
+    return response
+
+def _write(documents, ids, metadatas, embeddings):
+    """Writes through the queue; returns (counts, None) or (None, error response)."""
+    try:
+        return write_queue.submit(documents, ids, metadatas, embeddings), None
+    except queue.Full:
+        return None, (jsonify({"error": "Write queue is full, retry shortly"}), 503, {"Retry-After": "1"})
+    except WriteQueueClosed as e:
+        return None, (jsonify({"error": str(e)}), 503, {"Retry-After": "5"})
+    except FuturesTimeoutError:
+        return None, (jsonify({"error": "Write did not complete in time"}), 504)
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+    except Exception as e:
+        status = _chroma_error_status(e)
+        if status is None:
+            raise
+        # e.g. a dimension that does not match what the collection already holds
+        return None, (jsonify({"error": str(e)}), status)
+
+def _chroma_error_status(error):
+    """The HTTP status Chroma gives its own errors, or None for any other error."""
+    # Read from sys.modules so the Qdrant backend never loads chromadb; if Chroma
+    # was never imported, the error cannot be one of its own
+    errors = sys.modules.get("chromadb.errors")
+    if errors is None or not isinstance(error, errors.ChromaError):
+        return None
+    return error.code()
+
+def _check_embedding(embedding, dim):
+    """Returns an error message if the embedding is not a list of dim numbers, else None."""
+    if not isinstance(embedding, list) or not all(isinstance(v, numbers.Real) for v in embedding):
+        return "embedding must be a list of numbers"
+    if len(embedding) != dim:
+        return f"embedding has dimension {len(embedding)}, expected {dim}"
+    return None
+
+def _client_vectors_usable(model):
+    """
+    Client embeddings are stored only if they come from the store's embedding model, the one
+    that also embeds every query; vectors from another model (e.g. OpenAI's) or from an
+    unnamed one would not be comparable, so those texts are embedded here instead.
+    """
+    return model is not None and model == chroma.embedding_service.model
+
+def _decode_float32(payload, count, dim):
+    """
+    Decodes base64 little-endian float32 data into count embeddings of size dim.
+    Raises:
+        ValueError: If the payload is not valid base64 or has the wrong length.
+    """
+    raw = base64.b64decode(payload, validate=True)
+    if len(raw) != count * dim * 4:
+        raise ValueError(f"embeddings_f32 has {len(raw)} bytes, expected {count} x {dim} x 4")
+    values = array("f")
+    values.frombytes(raw)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return [values[i * dim:(i + 1) * dim].tolist() for i in range(count)]
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"Request body exceeds {MAX_REQUEST_BYTES} bytes"}), 413
 
 @app.route('/add_embedding', methods=['POST'])
 def add_embedding():
-    data = request.json
-    # Required fields: embedding (list of floats), user_id (str), log_id (str), text (str), date (str)
+    data = request.get_json(silent=True) or {}
+    # Required fields: user_id (str), text (str). Optional: log_id (str), date (str), and
+    # embedding (list of floats) with embedding_model (str), the model that produced it
     embedding = data.get('embedding')
     user_id = data.get('user_id')
-    log_id = data.get('log_id', str(uuid.uuid4()))  # Generate a UUID if not provided
     text = data.get('text', '')
+    # Without a log_id, derive the id from the content so retries don't create duplicates
+    log_id = data.get('log_id') or make_document_id(text, {"user_id": user_id})
     date = data.get('date', None)
 
-    if not embedding or not user_id or not text:
-        return jsonify({"error": "Missing required fields: embedding, user_id, text"}), 400
+    if not user_id or not text:
+        return jsonify({"error": "Missing required fields: user_id, text"}), 400
+    reembedded = embedding is not None and not _client_vectors_usable(data.get('embedding_model'))
+    if embedding is not None and not reembedded:
+        error = _check_embedding(embedding, chroma.embedding_service.dimension())
+        if error:
+            return jsonify({"error": error}), 400
+    if reembedded:
+        embedding = None
 
-    # Store the text as the document, embedding as metadata (ChromaDB stores embeddings internally)
+    # Store the text as the document with the client's embedding (if usable), so it is not embedded again
     meta = {
         "user_id": user_id,
         "log_id": log_id
@@ -32,16 +129,86 @@ def add_embedding():
     if date is not None:
         meta["date"] = date
 
-    chroma.add_documents(
-        documents=[text],
-        metadatas=[meta],
-        ids=[log_id]
-    )
-    return jsonify({"status": "ok", "log_id": log_id})
+    counts, error = _write([text], [log_id], [meta], [embedding])
+    if error:
+        return error
+    return jsonify({"status": "ok", "log_id": log_id, "skipped": counts["skipped"] == 1, "reembedded": reembedded})
+
+@app.route('/add_embeddings', methods=['POST'])
+def add_embeddings():
+    """
+    Batched ingest. Body:
+        {"records": [{"user_id", "text", "log_id"?, "date"?, "embedding"?}, ...],
+         "embeddings_f32": base64 float32 little-endian (optional), "dim": int (with embeddings_f32),
+         "embedding_model": str (the model that produced the embeddings)}
+    Embeddings come either per record as lists or as one packed float32 block in record order.
+    They are kept only if embedding_model is the store's model and they have its dimension;
+    records without usable embeddings are embedded here (counted as "reembedded").
+    All records are written in one queued upsert; records without a log_id get a
+    content-derived id, and unchanged records are skipped, so retries are idempotent.
+    """
+    data = request.get_json(silent=True) or {}
+    records = data.get('records')
+    if not isinstance(records, list) or not records:
+        return jsonify({"error": "records must be a non-empty list"}), 400
+    if len(records) > MAX_BATCH_RECORDS:
+        return jsonify({"error": f"At most {MAX_BATCH_RECORDS} records per request"}), 413
+
+    if not _client_vectors_usable(data.get('embedding_model')):
+        embeddings = [None] * len(records)
+    elif data.get('embeddings_f32') is not None:
+        dim = data.get('dim')
+        if dim != chroma.embedding_service.dimension():
+            return jsonify({"error": f"dim {dim} does not match the model's dimension {chroma.embedding_service.dimension()}"}), 400
+        try:
+            embeddings = _decode_float32(data['embeddings_f32'], len(records), dim)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    else:
+        embeddings = [r.get('embedding') if isinstance(r, dict) else None for r in records]
+        for i, embedding in enumerate(embeddings):
+            error = embedding is not None and _check_embedding(embedding, chroma.embedding_service.dimension())
+            if error:
+                return jsonify({"error": f"records[{i}]: {error}"}), 400
+    reembedded = sum(1 for embedding in embeddings if embedding is None)
+
+    documents, metadatas, ids = [], [], []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict) or not record.get('user_id') or not record.get('text'):
+            return jsonify({"error": f"records[{i}]: missing required fields: user_id, text"}), 400
+        log_id = record.get('log_id') or make_document_id(record['text'], {"user_id": record['user_id']})
+        meta = {"user_id": record['user_id'], "log_id": log_id}
+        if record.get('date') is not None:
+            meta["date"] = record['date']
+        documents.append(record['text'])
+        metadatas.append(meta)
+        ids.append(log_id)
+
+    counts, error = _write(documents, ids, metadatas, embeddings)
+    if error:
+        return error
+    counts.pop("status")
+    return jsonify({"status": "ok", "count": len(ids), "log_ids": ids, "reembedded": reembedded, **counts})
 
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "ok"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    stats = write_queue.stats()
+    extra = {
+        "write_queue_depth": ("gauge", stats["queued"]),
+        "write_batches_total": ("counter", stats["batches"]),
+        "write_requests_total": ("counter", stats["requests"]),
+        "write_failed_requests_total": ("counter", stats["failed_requests"]),
+        "write_records_total": ("counter", stats["records"]),
+        "write_records_written_total": ("counter", stats["written"]),
+        "write_records_skipped_total": ("counter", stats["skipped"]),
+        "write_records_metadata_updated_total": ("counter", stats["metadata_updated"]),
+    }
+    return metrics.render(extra), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True) 
\ No newline at end of file
+    # Development server only; use `python3 -m src.api.serve` in production
+    app.run(host='0.0.0.0', port=5001, debug=os.getenv("FLASK_DEBUG") == "1", use_reloader=False)
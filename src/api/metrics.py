@@ -0,0 +1,53 @@
+import time
+import threading
+from collections import defaultdict
+
+# Request latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class RequestMetrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Thread-safe request counters and latency histograms, rendered in the Prometheus text format."""
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)  # (endpoint, status) -> count
+        self._latency = {}  # endpoint -> [bucket counts..., sum, count]
+
+    def observe(self, endpoint, status, seconds):
+        with self._lock:
+            self._requests[(endpoint, status)] += 1
+            hist = self._latency.setdefault(endpoint, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    def render(self, extra=None):
+        """
+        Args:
+            extra (dict, optional): Other values to export, name -> (type, number),
+                e.g. {"write_queue_depth": ("gauge", 3)}.
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# TYPE api_uptime_seconds gauge",
+            f"api_uptime_seconds {time.time() - self.started_at:.0f}",
+            "# TYPE api_requests_total counter",
+        ]
+        with self._lock:
+            for (endpoint, status), count in sorted(self._requests.items()):
+                lines.append(f'api_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            lines.append("# TYPE api_request_duration_seconds histogram")
+            for endpoint, hist in sorted(self._latency.items()):
+                for bound, count in zip(self.buckets, hist):
+                    lines.append(f'api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {hist[-1]}')
+                lines.append(f'api_request_duration_seconds_sum{{endpoint="{endpoint}"}} {hist[-2]:.6f}')
+                lines.append(f'api_request_duration_seconds_count{{endpoint="{endpoint}"}} {hist[-1]}')
+        for name, (kind, value) in (extra or {}).items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,53 @@
+import os
+import sys
+import signal
+import logging
+from dotenv import load_dotenv
+from waitress import create_server
+
+load_dotenv()
+
+# Production server for the ingestion API. It runs one process with a pool of request
+# threads, because the embedded vector store must only be opened by one process; writes
+# from all threads are batched through the API's single writer thread.
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "5001"))
+API_THREADS = int(os.getenv("API_THREADS", "16"))
+# Idle keep-alive connections are closed after this many seconds
+API_KEEPALIVE_SECONDS = int(os.getenv("API_KEEPALIVE_SECONDS", "75"))
+API_CONNECTION_LIMIT = int(os.getenv("API_CONNECTION_LIMIT", "200"))
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    # Imported here so the store is opened after logging is configured
+    from src.api.chroma_api import app, write_queue, MAX_REQUEST_BYTES
+
+    server = create_server(
+        app,
+        host=API_HOST,
+        port=API_PORT,
+        threads=API_THREADS,
+        channel_timeout=API_KEEPALIVE_SECONDS,
+        connection_limit=API_CONNECTION_LIMIT,
+        max_request_body_size=MAX_REQUEST_BYTES,
+        ident="life-agent-api",
+    )
+
+    def shutdown(signum, frame):
+        # waitress stops accepting connections and finishes in-flight requests on SystemExit
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    logging.info(f"[API] Serving on http://{API_HOST}:{API_PORT} with {API_THREADS} threads")
+    try:
+        server.run()
+    finally:
+        server.close()
+        logging.info(f"[API] Shutting down, flushing {write_queue.stats()['queued']} queued writes")
+        write_queue.close()
+        logging.info(f"[API] Write queue closed: {write_queue.stats()}")
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
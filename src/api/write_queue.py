@@ -0,0 +1,139 @@
+import os
+import time
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pending write requests held before new ones are rejected with 503
+WRITE_QUEUE_MAX_REQUESTS = int(os.getenv("WRITE_QUEUE_MAX_REQUESTS", "2000"))
+# A batch is written once it holds this many records or its oldest request waited this long
+WRITE_BATCH_MAX_RECORDS = int(os.getenv("WRITE_BATCH_MAX_RECORDS", "500"))
+WRITE_BATCH_MAX_WAIT_MS = float(os.getenv("WRITE_BATCH_MAX_WAIT_MS", "20"))
+# How long a request waits for a queue slot, and for its write to complete
+WRITE_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("WRITE_ENQUEUE_TIMEOUT_SECONDS", "2"))
+WRITE_TIMEOUT_SECONDS = float(os.getenv("WRITE_TIMEOUT_SECONDS", "30"))
+
+class WriteQueueClosed(RuntimeError):
+    """Raised when a write is submitted after the queue started shutting down."""
+
+class WriteBatcher:
+    def __init__(self, store, max_requests=WRITE_QUEUE_MAX_REQUESTS, max_batch_records=WRITE_BATCH_MAX_RECORDS,
+                 max_wait_ms=WRITE_BATCH_MAX_WAIT_MS):
+        """
+        Funnels every write through one background thread, coalescing concurrent requests
+        into a single upsert per batch. Request threads block on their own result, so callers
+        see the outcome of their write; the store is only ever written by the writer thread.
+        Args:
+            store (VectorStore): The store to write to.
+            max_requests (int): Bound on queued requests; submit() fails beyond it.
+            max_batch_records (int): Records per upsert.
+            max_wait_ms (float): How long the writer waits for more requests before writing a batch.
+        """
+        self.store = store
+        self.max_batch_records = max_batch_records
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_requests)
+        self._closed = threading.Event()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "records": 0, "batches": 0, "failed_requests": 0, "written": 0, "metadata_updated": 0, "skipped": 0}
+        self._thread = threading.Thread(target=self._run, name="vector-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, documents, ids, metadatas, embeddings, enqueue_timeout=WRITE_ENQUEUE_TIMEOUT_SECONDS,
+               timeout=WRITE_TIMEOUT_SECONDS):
+        """
+        Queues records for writing and waits until they are written.
+        Returns:
+            dict: Counts for these records and "status" per id, as upsert_documents(return_status=True).
+        Raises:
+            queue.Full: If the queue stays full for enqueue_timeout seconds.
+            WriteQueueClosed: If the queue is shutting down.
+            concurrent.futures.TimeoutError: If the write does not finish within timeout seconds.
+            Exception: Whatever the store raised for these records (e.g. a dimension mismatch).
+        """
+        if self._closed.is_set():
+            raise WriteQueueClosed("The write queue is shutting down")
+        future = Future()
+        self._queue.put((documents, ids, metadatas, embeddings, future), timeout=enqueue_timeout)
+        return future.result(timeout=timeout)
+
+    def _next_batch(self):
+        """Blocks for the first request, then gathers more until the batch is full or max_wait passes."""
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch, records = [first], len(first[1])
+        deadline = time.monotonic() + self.max_wait
+        while records < self.max_batch_records:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            records += len(item[1])
+        return batch
+
+    def _write(self, batch):
+        result = self.store.upsert_documents(
+            documents=[doc for item in batch for doc in item[0]],
+            ids=[doc_id for item in batch for doc_id in item[1]],
+            metadatas=[meta for item in batch for meta in item[2]],
+            embeddings=[emb for item in batch for emb in item[3]],
+            return_status=True,
+        )
+        for documents, ids, metadatas, embeddings, future in batch:
+            status = {doc_id: result["status"][doc_id] for doc_id in ids}
+            counts = {key: sum(1 for s in status.values() if s == key) for key in ("written", "metadata_updated", "skipped")}
+            future.set_result({**counts, "status": status})
+
+    def _run(self):
+        while not (self._closed.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception:
+                # One bad request (e.g. a wrong embedding dimension) must not fail the others,
+                # so fall back to writing each request on its own
+                for item in batch:
+                    try:
+                        self._write([item])
+                    except Exception as e:
+                        logging.warning(f"[WriteQueue] Write of {len(item[1])} records failed: {e}")
+                        item[4].set_exception(e)
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                for item in batch:
+                    self._stats["requests"] += 1
+                    self._stats["records"] += len(item[1])
+                    if item[4].exception() is not None:
+                        self._stats["failed_requests"] += 1
+                        continue
+                    for key in ("written", "metadata_updated", "skipped"):
+                        self._stats[key] += item[4].result()[key]
+
+    def close(self, timeout=WRITE_TIMEOUT_SECONDS):
+        """Stops accepting writes, writes everything still queued and stops the writer thread."""
+        self._closed.set()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logging.warning(f"[WriteQueue] {self._queue.qsize()} requests still pending at shutdown")
+            return
+        # Requests that raced with shutdown after the writer stopped
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            item[4].set_exception(WriteQueueClosed("The write queue is shutting down"))
+
+    def stats(self):
+        with self._stats_lock:
+            return {**self._stats, "queued": self._queue.qsize(), "closed": self._closed.is_set()}
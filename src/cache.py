@@ -0,0 +1,123 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache settings. A TTL of 0 disables that cache.
+CACHE_DIR = os.getenv("CACHE_DIR", "./.cache")
+TOOL_CACHE_TTL_SECONDS = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "300"))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "300"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256"))
+
+# Invalidation is signalled through one small marker file per tag under CACHE_DIR, so a
+# write made by another process (the Chroma API, scripts) also invalidates this one.
+_GENERATIONS_DIR = os.path.join(CACHE_DIR, "generations")
+
+def _marker_path(tag):
+    return os.path.join(_GENERATIONS_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", tag))
+
+def generation(tag):
+    """Returns the current generation of a tag; it changes every time the tag is invalidated."""
+    try:
+        st = os.stat(_marker_path(tag))
+    except FileNotFoundError:
+        return (0, 0)
+    return (st.st_mtime_ns, st.st_size)
+
+def invalidate(*tags):
+    """
+    Invalidates every cache entry recorded under any of the given tags, in all processes
+    sharing CACHE_DIR. Tags are table names ("gym_logs"), "supabase" for any Supabase
+    write, or "chroma" for any vector store write.
+    """
+    os.makedirs(_GENERATIONS_DIR, exist_ok=True)
+    for tag in tags:
+        # Appending a byte bumps both size and mtime, so two writes in the same clock tick still differ
+        with open(_marker_path(tag), "ab") as f:
+            f.write(b".")
+
+def normalize_text(text):
+    """Lowercases, strips punctuation and collapses whitespace, so trivially different phrasings share a key."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+class TTLCache:
+    def __init__(self, name, ttl_seconds, max_entries):
+        """
+        A thread-safe LRU cache whose entries expire after a TTL or when one of their tags is invalidated.
+        Args:
+            name (str): Name reported in stats.
+            ttl_seconds (float): Lifetime of an entry. 0 disables the cache.
+            max_entries (int): Least recently used entries are evicted beyond this size.
+        """
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, {tag: generation}, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0
+
+    def snapshot(self, tags):
+        """Captures tag generations. Take it before computing a value, then pass it to set()."""
+        return {tag: generation(tag) for tag in tags}
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, generations, value = entry
+                if expires_at > time.monotonic() and all(generation(t) == g for t, g in generations.items()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, generations=None):
+        """
+        Stores a value.
+        Args:
+            generations (dict, optional): A snapshot() taken before the value was computed.
+                The entry is dropped once any of those tags is invalidated.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, generations or {}, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+# Tool results keyed by tool name + normalized arguments
+tool_cache = TTLCache("tools", TOOL_CACHE_TTL_SECONDS, TOOL_CACHE_MAX_ENTRIES)
+# Final answers keyed by the normalized query
+answer_cache = TTLCache("answers", ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES)
+
+def cache_stats():
+    return {cache.name: cache.stats() for cache in (tool_cache, answer_cache)}
@@ -0,0 +1,102 @@
+import re
+from datetime import date, datetime, timedelta
+
+# Named analytics queries backed by the Postgres functions in
+# supabase/migrations/20261017000000_analytics_functions.sql.
+# name -> (function, description, {param: type}); every query also takes p_user_id.
+ANALYTICS_QUERIES = {
+    "spend_summary": ("analytics_spend_summary", "Transaction count, total, average, min and max spend", {"since": date, "until": date}),
+    "spend_per_category": ("analytics_spend_per_category", "Spend per category", {"since": date, "until": date}),
+    "gym_weekly_volume": ("analytics_gym_weekly_volume", "Weekly sets, reps, volume and max weight per exercise", {"since": date, "until": date}),
+    "gym_summary": ("analytics_gym_summary", "Gym sessions, sets, reps, volume and average duration", {"since": date, "until": date}),
+    "wellbeing_rolling": ("analytics_wellbeing_rolling", "Daily mood and sleep with rolling averages", {"since": date, "until": date, "window": int}),
+    "daily_summary": ("analytics_daily_summary", "Average mood, energy, stress and sleep", {"since": date, "until": date}),
+    "jiujitsu_summary": ("analytics_jiujitsu_summary", "BJJ sessions, rolls and performance rating", {"since": date, "until": date}),
+    "nutrition_daily_totals": ("analytics_nutrition_daily_totals", "Calories and macros per day", {"since": date, "until": date}),
+    "career_weekly": ("analytics_career_weekly", "Work hours and productivity per week", {"since": date, "until": date}),
+    "investment_summary": ("analytics_investment_summary", "Investment activity per asset", {"since": date, "until": date}),
+}
+
+DEFAULT_WINDOW_DAYS = 7
+
+# Keywords -> query, checked in order; the first match wins. Keywords match whole words
+# (plus a plural "s"), so "roll" does not catch "rolling".
+_QUERY_KEYWORDS = [
+    (("bjj", "jiu", "jitsu", "jiujitsu", "roll", "rolled"), "jiujitsu_summary"),
+    (("per exercise", "volume", "weekly", "each exercise"), "gym_weekly_volume"),
+    (("gym", "lift", "lifting", "workout", "exercise", "sets", "reps"), "gym_summary"),
+    (("category", "categories"), "spend_per_category"),
+    (("spend", "spending", "spent", "transaction", "finance", "financial", "expense", "money", "cost"), "spend_summary"),
+    (("invest", "investment", "investing", "crypto", "stock", "portfolio"), "investment_summary"),
+    (("calorie", "protein", "nutrition", "macro", "food", "meal"), "nutrition_daily_totals"),
+    (("work", "worked", "working", "career", "productive", "productivity"), "career_weekly"),
+    (("rolling", "trend"), "wellbeing_rolling"),
+    (("sleep", "mood", "energy", "stress", "log", "logged"), "daily_summary"),
+]
+_QUERY_PATTERNS = [
+    (re.compile(r"\b(?:" + "|".join(map(re.escape, keywords)) + r")s?\b"), name)
+    for keywords, name in _QUERY_KEYWORDS
+]
+
+def _coerce(value, kind):
+    if kind is date:
+        if isinstance(value, date):
+            return value.isoformat()
+        return datetime.strptime(str(value), "%Y-%m-%d").date().isoformat()
+    return kind(value)
+
+def build_params(name, user_id, params=None):
+    """
+    Validates and converts parameters for a named analytics query.
+    Args:
+        name (str): A key of ANALYTICS_QUERIES.
+        user_id (str): The user the query is scoped to.
+        params (dict, optional): Query parameters without the p_ prefix, e.g. {"since": "2024-07-01"}.
+            "since"/"until" default to the last DEFAULT_WINDOW_DAYS days.
+    Returns:
+        tuple: (postgres function name, rpc parameter dict)
+    Raises:
+        ValueError: If the query name or a parameter is unknown or has the wrong type.
+    """
+    if name not in ANALYTICS_QUERIES:
+        raise ValueError(f"Unknown analytics query '{name}'. Available: {', '.join(ANALYTICS_QUERIES)}")
+    function, _, spec = ANALYTICS_QUERIES[name]
+    params = dict(params or {})
+    unknown = set(params) - set(spec)
+    if unknown:
+        raise ValueError(f"Unknown parameters for '{name}': {', '.join(sorted(unknown))}")
+    today = datetime.utcnow().date()
+    params.setdefault("until", today)
+    params.setdefault("since", today - timedelta(days=DEFAULT_WINDOW_DAYS))
+    rpc_params = {"p_user_id": user_id}
+    for key, value in params.items():
+        try:
+            rpc_params[f"p_{key}"] = _coerce(value, spec[key])
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid value for '{key}' in '{name}': {value!r} ({e})")
+    return function, rpc_params
+
+def window_days_from_text(text, default=DEFAULT_WINDOW_DAYS):
+    """Reads a look-back window like "last 3 weeks", "this month" or "past year" from a question."""
+    text = text.lower()
+    match = re.search(r"(?:last|past)\s+(\d+)\s+(day|week|month|year)s?", text)
+    if match:
+        return int(match.group(1)) * {"day": 1, "week": 7, "month": 30, "year": 365}[match.group(2)]
+    for word, days in (("year", 365), ("month", 30), ("week", 7), ("yesterday", 1), ("today", 0)):
+        if word in text:
+            return days
+    return default
+
+def query_for_text(text):
+    """
+    Picks the analytics query and date window that best match a natural-language question.
+    Returns:
+        tuple: (query name, params dict), or (None, None) if no query matches.
+    """
+    text_lower = text.lower()
+    for pattern, name in _QUERY_PATTERNS:
+        if pattern.search(text_lower):
+            today = datetime.utcnow().date()
+            since = today - timedelta(days=window_days_from_text(text_lower))
+            return name, {"since": since.isoformat(), "until": today.isoformat()}
+    return None, None
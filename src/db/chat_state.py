@@ -0,0 +1,153 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Per-chat conversation history for the Telegram bot, persisted so restarts keep context
+CHAT_STATE_PATH = os.getenv("CHAT_STATE_PATH", "./data/chat_state.sqlite3")
+# Messages kept per chat (a user message and a reply are two)
+CHAT_STATE_MAX_MESSAGES = int(os.getenv("CHAT_STATE_MAX_MESSAGES", "20"))
+# Chats held in memory; the least recently active are evicted beyond either limit and
+# reloaded from disk when they next send a message
+CHAT_STATE_MAX_CHATS = int(os.getenv("CHAT_STATE_MAX_CHATS", "500"))
+CHAT_STATE_MAX_BYTES = int(os.getenv("CHAT_STATE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+def _size(history):
+    return sum(len(role) + len(message.encode("utf-8")) for role, message in history)
+
+class ChatStateStore:
+    def __init__(self, path=CHAT_STATE_PATH, max_messages=CHAT_STATE_MAX_MESSAGES,
+                 max_chats=CHAT_STATE_MAX_CHATS, max_bytes=CHAT_STATE_MAX_BYTES):
+        """
+        Recent messages per chat: an in-memory LRU of active chats in front of a SQLite file.
+        Every message is written through to SQLite, so evicting a chat only drops the
+        in-memory copy, and a restarted bot picks conversations up where they were.
+        Args:
+            path (str): The SQLite database file. Use ":memory:" for a throwaway store.
+            max_messages (int): Messages kept per chat; older ones are deleted.
+            max_chats (int): Chats held in memory.
+            max_bytes (int): Approximate bound on the message text held in memory.
+        """
+        self.path = path
+        self.max_messages = max_messages
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._chats = OrderedDict()  # chat_id -> list of (role, message), oldest first
+        self._bytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            "chat_id TEXT NOT NULL, seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "role TEXT NOT NULL, message TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chat_messages_chat_id_seq_idx ON chat_messages (chat_id, seq)")
+
+    def _load(self, chat_id):
+        # Caller holds the lock
+        history = self._chats.get(chat_id)
+        if history is not None:
+            self._chats.move_to_end(chat_id)
+            self.hits += 1
+            return history
+        rows = self._conn.execute(
+            "SELECT role, message FROM chat_messages WHERE chat_id = ? ORDER BY seq DESC LIMIT ?",
+            (str(chat_id), self.max_messages),
+        ).fetchall()
+        history = [(role, message) for role, message in reversed(rows)]
+        self._chats[chat_id] = history
+        self._bytes += _size(history)
+        self.loads += 1
+        return history
+
+    def _evict(self):
+        # Never evicts the most recently used chat, so the caller's history stays in memory
+        while len(self._chats) > 1 and (len(self._chats) > self.max_chats or self._bytes > self.max_bytes):
+            _, history = self._chats.popitem(last=False)
+            self._bytes -= _size(history)
+            self.evictions += 1
+
+    def history(self, chat_id, limit=None):
+        """
+        Args:
+            chat_id: The Telegram chat id.
+            limit (int, optional): Return at most this many of the latest messages.
+        Returns:
+            list of (role, message): The chat's recent messages, oldest first.
+        """
+        with self._lock:
+            history = self._load(chat_id)
+            self._evict()
+            return list(history[-limit:] if limit else history)
+
+    def append(self, chat_id, *messages):
+        """
+        Adds messages to a chat and trims it to max_messages, in memory and on disk.
+        Args:
+            chat_id: The Telegram chat id.
+            *messages: (role, message) tuples, e.g. ("User", text), ("Bot", reply).
+        """
+        now = time.time()
+        with self._lock:
+            history = self._load(chat_id)
+            self._bytes -= _size(history)
+            history.extend(messages)
+            del history[:max(0, len(history) - self.max_messages)]
+            self._bytes += _size(history)
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO chat_messages (chat_id, role, message, created_at) VALUES (?, ?, ?, ?)",
+                        [(str(chat_id), role, message, now) for role, message in messages],
+                    )
+                    self._conn.execute(
+                        "DELETE FROM chat_messages WHERE chat_id = ? AND seq NOT IN "
+                        "(SELECT seq FROM chat_messages WHERE chat_id = ? ORDER BY seq DESC LIMIT ?)",
+                        (str(chat_id), str(chat_id), self.max_messages),
+                    )
+            except sqlite3.Error as e:
+                # The in-memory history still has the messages; only a restart would lose them
+                logging.warning(f"[ChatState] Could not persist messages for chat {chat_id}: {e}")
+            self._evict()
+
+    def clear(self, chat_id):
+        """Forgets a chat's history."""
+        with self._lock:
+            history = self._chats.pop(chat_id, None)
+            if history is not None:
+                self._bytes -= _size(history)
+            with self._conn:
+                self._conn.execute("DELETE FROM chat_messages WHERE chat_id = ?", (str(chat_id),))
+
+    def stats(self):
+        with self._lock:
+            return {"chats_in_memory": len(self._chats), "bytes_in_memory": self._bytes, "hits": self.hits,
+                    "loads": self.loads, "evictions": self.evictions}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+def get_chat_state_store():
+    """Returns the process-wide ChatStateStore for CHAT_STATE_PATH."""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                _shared_store = ChatStateStore()
+    return _shared_store
@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import fcntl
+import hashlib
+import threading
+import logging
+import numpy as np
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from src.cache import CACHE_DIR
+
+load_dotenv()
+
+# Embedding model: "default" is Chroma's bundled all-MiniLM-L6-v2 (ONNX, runs on CPU);
+# any other name is loaded as a sentence-transformers model. Changing the model changes
+# the vector dimension, so existing collections have to be re-indexed.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "default")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Vectors are cached on disk per model; 0 disables the cache
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(CACHE_DIR, "embeddings"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+
+def load_embedding_function(model=EMBEDDING_MODEL):
+    """
+    Returns a callable that embeds a list of texts.
+    Args:
+        model (str): "default" for Chroma's default model, or a sentence-transformers model name.
+    """
+    from chromadb.utils import embedding_functions
+    if model == "default":
+        return embedding_functions.DefaultEmbeddingFunction()
+    return embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model)
+
+class EmbeddingCache:
+    def __init__(self, directory, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        A fixed-size on-disk vector cache with LRU eviction. Vectors live in a float32 memmap,
+        next to a memmap of 16-byte text keys and one of last-use ticks, so the index can be
+        rebuilt on startup and only the rows that are read are paged in.
+        Several processes (the bot, the API) can share one directory: writes hold an exclusive
+        lock on a lock file and re-read the slots first, so two processes never claim the same slot.
+        Args:
+            directory (str): Where the cache files are kept (one directory per model).
+            max_entries (int): Number of vector slots; the least recently used slot is reused when full.
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index = {}  # key bytes -> slot
+        self._tick = 0
+        self._next_slot = 0
+        self._vectors = self._keys = self._ticks = None
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self._path("meta.json")):
+            with self._file_lock(fcntl.LOCK_SH):
+                self._open_existing()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self, operation):
+        # Serializes access across processes; the thread lock only covers this one
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path("lock"), "a") as f:
+            fcntl.flock(f, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _open_existing(self):
+        # Opens the files another run or process created; returns False if there are none usable
+        meta_path = self._path("meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("max_entries") != self.max_entries:
+            logging.info(f"[EmbeddingCache] Size changed, starting a new cache in {self.directory}")
+            return False
+        self._open(meta["dim"], mode="r+")
+        return True
+
+    def _open(self, dim, mode):
+        self.dim = dim
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode=mode, shape=(self.max_entries, dim))
+        self._keys = np.memmap(self._path("keys.bin"), dtype=np.uint8, mode=mode, shape=(self.max_entries, 16))
+        self._ticks = np.memmap(self._path("ticks.i64"), dtype=np.int64, mode=mode, shape=(self.max_entries,))
+        if mode != "w+":
+            self._reload()
+
+    def _reload(self):
+        # Rebuild the index from the slots that hold a key, oldest use first; the memmaps
+        # are shared, so this also picks up slots other processes have written
+        self._index = {}
+        used = np.flatnonzero(self._ticks)
+        for slot in used[np.argsort(self._ticks[used])]:
+            self._index[self._keys[slot].tobytes()] = int(slot)
+        self._tick = int(self._ticks.max()) if len(used) else 0
+        self._next_slot = int(used.max()) + 1 if len(used) else 0
+
+    def _create(self, dim):
+        self._open(dim, mode="w+")
+        with open(self._path("meta.json"), "w") as f:
+            json.dump({"dim": dim, "max_entries": self.max_entries}, f)
+
+    def get_many(self, keys):
+        """Returns {key: vector} for the keys that are cached, marking them as recently used."""
+        found = {}
+        with self._lock:
+            if self._vectors is not None:
+                with self._file_lock(fcntl.LOCK_SH):
+                    for key in keys:
+                        slot = self._index.get(key)
+                        # Another process may have reused the slot since the index was built
+                        if slot is None or self._keys[slot].tobytes() != key:
+                            self._index.pop(key, None)
+                            continue
+                        self._tick += 1
+                        self._ticks[slot] = self._tick
+                        found[key] = np.array(self._vectors[slot])
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Stores (key, vector) pairs, evicting least recently used entries when full."""
+        if not items:
+            return
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            if self._vectors is None:
+                # Another process may have created the files since this one started
+                if not self._open_existing():
+                    self._create(len(items[0][1]))
+            else:
+                self._reload()
+            for key, vector in items:
+                if len(vector) != self.dim:
+                    continue
+                slot = self._index.get(key)
+                if slot is None:
+                    if self._next_slot < self.max_entries:
+                        slot = self._next_slot
+                        self._next_slot += 1
+                    else:
+                        # Full: reuse the least recently used slot
+                        slot = int(np.argmin(self._ticks))
+                        self._index.pop(self._keys[slot].tobytes(), None)
+                    self._index[key] = slot
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._tick += 1
+                self._ticks[slot] = self._tick
+            self._vectors.flush()
+            self._keys.flush()
+            self._ticks.flush()
+
+    def stats(self):
+        return {"entries": len(self._index), "max_entries": self.max_entries, "dim": self.dim, "hits": self.hits, "misses": self.misses}
+
+class EmbeddingService:
+    def __init__(self, model=EMBEDDING_MODEL, embedding_function=None, batch_size=EMBEDDING_BATCH_SIZE,
+                 cache_dir=EMBEDDING_CACHE_DIR, cache_max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Embeds texts in batches, reusing vectors cached on disk from earlier runs.
+        Args:
+            model (str): The model name; also part of every cache key.
+            embedding_function (callable, optional): Embeds a list of texts. Defaults to load_embedding_function(model),
+                loaded on first use.
+            batch_size (int): Texts per model call.
+            cache_dir (str): Root directory of the on-disk cache.
+            cache_max_entries (int): Cached vectors per model. 0 disables the cache.
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self._embedding_function = embedding_function
+        self._function_lock = threading.Lock()
+        self._dimension = None
+        self.cache = None
+        if cache_max_entries > 0:
+            slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            self.cache = EmbeddingCache(os.path.join(cache_dir, slug), cache_max_entries)
+
+    @property
+    def embedding_function(self):
+        if self._embedding_function is None:
+            with self._function_lock:
+                if self._embedding_function is None:
+                    self._embedding_function = load_embedding_function(self.model)
+        return self._embedding_function
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\x00{text}".encode("utf-8")).digest()[:16]
+
+    def embed(self, texts):
+        """
+        Embeds texts, computing only the ones not already cached, in batches of batch_size.
+        Args:
+            texts (list of str): The texts to embed. Duplicates are embedded once.
+        Returns:
+            list of list of float: One vector per text, in order.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys))) if self.cache else {}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        missing_keys = list(missing)
+        computed = []
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch = [missing[key] for key in missing_keys[start:start + self.batch_size]]
+            for key, vector in zip(missing_keys[start:start + self.batch_size], self.embedding_function(batch)):
+                vector = np.asarray(vector, dtype=np.float32)
+                vectors[key] = vector
+                computed.append((key, vector))
+        if computed and self.cache:
+            self.cache.put_many(computed)
+        if missing_keys:
+            logging.info(f"[Embeddings] Computed {len(missing_keys)} of {len(texts)} embeddings with '{self.model}'")
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        """Embeds a single query text."""
+        return self.embed([text])[0]
+
+    def dimension(self):
+        """The model's vector size, found by embedding a probe text on first use."""
+        if self._dimension is None:
+            self._dimension = len(self.embed_query("dimension"))
+        return self._dimension
+
+    def stats(self):
+        return {"model": self.model, "cache": self.cache.stats() if self.cache else None}
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+def get_embedding_service():
+    """Returns the process-wide EmbeddingService for EMBEDDING_MODEL."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = EmbeddingService()
+    return _shared_service
+
+def set_embedding_service(service):
+    """Replaces the process-wide EmbeddingService, e.g. with an offline model for benchmarks."""
+    global _shared_service
+    with _shared_service_lock:
+        _shared_service = service
@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from src.cache import invalidate
+
+load_dotenv()
+
+# Local columnar copy of the Supabase tables, used for trend and correlation questions
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", "./data/life.duckdb")
+LOCAL_STORE_PAGE_SIZE = int(os.getenv("LOCAL_STORE_PAGE_SIZE", "1000"))
+# The agent tool runs an incremental sync first if the last one is older than this
+LOCAL_STORE_SYNC_INTERVAL_SECONDS = float(os.getenv("LOCAL_STORE_SYNC_INTERVAL_SECONDS", "900"))
+# Each sync re-reads rows written up to this long before the previous sync's watermark, since
+# a transaction that commits late can carry an earlier updated_at than rows already copied
+LOCAL_STORE_SYNC_OVERLAP_SECONDS = float(os.getenv("LOCAL_STORE_SYNC_OVERLAP_SECONDS", "300"))
+
+# Change cursor: Postgres sets updated_at on every insert and update
+# (supabase/migrations/20261019000000_updated_at_change_cursor.sql); id breaks ties
+SYNC_CURSOR_COLUMNS = ("updated_at", "id")
+
+# Column types for the tables in DATABASE_SCHEMA.md
+TABLE_SCHEMAS = {
+    "daily_logs": {
+        "id": "VARCHAR", "user_id": "VARCHAR", "date": "DATE", "free_text": "VARCHAR",
+        "mood_score": "INTEGER", "energy_level": "INTEGER", "stress_level": "INTEGER",
+        "sleep_hours": "DOUBLE", "sleep_quality": "INTEGER", "created_at": "TIMESTAMPTZ",
+    },
+    "gym_logs": {
+        "id": "VARCHAR", "user_id": "VARCHAR", "date": "DATE", "exercise_name": "VARCHAR",
+        "sets": "INTEGER", "reps": "INTEGER", "weight": "DOUBLE", "duration_minutes": "INTEGER",
+        "notes": "VARCHAR", "created_at": "TIMESTAMPTZ",
+    },
+    "jiujitsu_logs": {
+        "id": "VARCHAR", "user_id": "VARCHAR", "date": "DATE", "session_type": "VARCHAR",
+        "techniques_trained": "VARCHAR[]", "rolls_count": "INTEGER", "roll_partners": "VARCHAR[]",
+        "performance_rating": "INTEGER", "notes": "VARCHAR", "created_at": "TIMESTAMPTZ",
+    },
+    "nutrition_logs": {
+        "id": "VARCHAR", "user_id": "VARCHAR", "date": "DATE", "meal_type": "VARCHAR",
+        "meal_time": "TIME", "foods": "VARCHAR[]", "calories": "INTEGER", "protein_grams": "DOUBLE",
+        "carbs_grams": "DOUBLE", "fat_grams": "DOUBLE", "notes": "VARCHAR", "created_at": "TIMESTAMPTZ",
+    },
+    "career_logs": {
+        "id": "VARCHAR", "user_id": "VARCHAR", "date": "DATE", "work_hours": "DOUBLE",
+        "productivity_rating": "INTEGER", "tasks_completed": "VARCHAR[]", "achievements": "VARCHAR[]",
+        "challenges": "VARCHAR[]", "goals": "VARCHAR[]", "notes": "VARCHAR", "created_at": "TIMESTAMPTZ",
+    },
+    "financial_transactions": {
+        "id": "VARCHAR", "user_id": "VARCHAR", "date": "DATE", "amount": "DOUBLE", "currency": "VARCHAR",
+        "category": "VARCHAR", "description": "VARCHAR", "source": "VARCHAR", "transaction_type": "VARCHAR",
+        "created_at": "TIMESTAMPTZ", "balance_after": "DOUBLE", "monzo_transaction_id": "VARCHAR",
+    },
+    "investment_logs": {
+        "id": "VARCHAR", "user_id": "VARCHAR", "date": "DATE", "asset_name": "VARCHAR", "asset_type": "VARCHAR",
+        "transaction_type": "VARCHAR", "quantity": "DOUBLE", "price_per_unit": "DOUBLE", "total_amount": "DOUBLE",
+        "currency": "VARCHAR", "platform": "VARCHAR", "notes": "VARCHAR", "created_at": "TIMESTAMPTZ",
+    },
+}
+
+# Daily series that can be correlated: name -> SQL returning (user_id, date, value)
+METRICS = {
+    "sleep_hours": "SELECT user_id, date, avg(sleep_hours) AS value FROM daily_logs GROUP BY ALL",
+    "sleep_quality": "SELECT user_id, date, avg(sleep_quality) AS value FROM daily_logs GROUP BY ALL",
+    "mood": "SELECT user_id, date, avg(mood_score) AS value FROM daily_logs GROUP BY ALL",
+    "energy": "SELECT user_id, date, avg(energy_level) AS value FROM daily_logs GROUP BY ALL",
+    "stress": "SELECT user_id, date, avg(stress_level) AS value FROM daily_logs GROUP BY ALL",
+    "bjj_performance": "SELECT user_id, date, avg(performance_rating) AS value FROM jiujitsu_logs GROUP BY ALL",
+    "bjj_rolls": "SELECT user_id, date, sum(rolls_count) AS value FROM jiujitsu_logs GROUP BY ALL",
+    "training_volume": (
+        "SELECT user_id, date, sum(coalesce(sets, 0) * coalesce(reps, 0) * coalesce(weight, 0)) AS value "
+        "FROM gym_logs GROUP BY ALL"
+    ),
+    # Spending only, as in the spend rollups: credits (income, refunds, transfers in) are not spent money
+    "spend": (
+        "SELECT user_id, date, sum(abs(amount)) AS value FROM financial_transactions "
+        "WHERE amount < 0 OR transaction_type = 'debit' GROUP BY ALL"
+    ),
+    "calories": "SELECT user_id, date, sum(calories) AS value FROM nutrition_logs GROUP BY ALL",
+    "work_hours": "SELECT user_id, date, sum(work_hours) AS value FROM career_logs GROUP BY ALL",
+    "productivity": "SELECT user_id, date, avg(productivity_rating) AS value FROM career_logs GROUP BY ALL",
+}
+
+class LocalAnalyticsStore:
+    def __init__(self, path=LOCAL_STORE_PATH):
+        """
+        A DuckDB file holding a copy of the Supabase tables, kept current by incremental syncs.
+        Connections are opened per operation, so other processes (the sync script, the bot)
+        can use the same file between operations.
+        Args:
+            path (str): The DuckDB database file. Use ":memory:" for a throwaway store.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        # Imported here so duckdb is only loaded when a store is opened
+        import duckdb
+        self._memory_conn = duckdb.connect(":memory:") if path == ":memory:" else None
+        if self._memory_conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            for table, columns in TABLE_SCHEMAS.items():
+                column_sql = ", ".join(f"{name} {kind}" + (" PRIMARY KEY" if name == "id" else "") for name, kind in columns.items())
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({column_sql})")
+            columns = [row[0] for row in conn.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = '_sync_state'"
+            ).fetchall()]
+            if columns and "user_id" not in columns:
+                # State from before per-user watermarks; the next sync copies everything again
+                conn.execute("DROP TABLE _sync_state")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS _sync_state (table_name VARCHAR, user_id VARCHAR, watermark VARCHAR, "
+                "synced_at DOUBLE, PRIMARY KEY (table_name, user_id))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        with self._lock:
+            if self._memory_conn is not None:
+                yield self._memory_conn
+                return
+            import duckdb
+            conn = duckdb.connect(self.path)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+    def _upsert(self, conn, table, rows):
+        schema = TABLE_SCHEMAS[table]
+        payload = json.dumps([{column: row.get(column) for column in schema} for row in rows], default=str)
+        # The page goes in as one JSON parameter that DuckDB parses into typed rows; binding
+        # every value as its own parameter makes large pages very slow to convert.
+        # INSERT OR REPLACE keeps the sync idempotent by id
+        conn.execute(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(schema)}) "
+            "SELECT unnest(from_json(?::JSON, ?), recursive := true)",
+            [payload, json.dumps([schema])],
+        )
+
+    def sync_table(self, source, table, user_id=None, page_size=LOCAL_STORE_PAGE_SIZE):
+        """
+        Copies rows inserted or updated since the table's watermark for this user from the source.
+        Rows are paged by (updated_at, id), which Postgres fills on every write, so rows with
+        a NULL created_at and rows that share a timestamp are copied like any other.
+        Args:
+            source: A SupabaseManager, or any object with the same select_pages() method
+                (e.g. a fixture backed by a local Postgres or in-memory rows).
+            table (str): A table from TABLE_SCHEMAS.
+            user_id (str, optional): Only sync this user's rows. Each user, and the sync of
+                all users, keeps its own watermark.
+            page_size (int): Rows per request.
+        Returns:
+            int: The number of rows copied (including rows re-read from the overlap).
+        """
+        scope = user_id or ""
+        with self._connect() as conn:
+            state = conn.execute(
+                "SELECT watermark FROM _sync_state WHERE table_name = ? AND user_id = ?", [table, scope]
+            ).fetchone()
+        watermark = state[0] if state else None
+        since = None
+        if watermark is not None:
+            since = (datetime.fromisoformat(watermark) - timedelta(seconds=LOCAL_STORE_SYNC_OVERLAP_SECONDS)).isoformat()
+        copied = 0
+        pages = source.select_pages(
+            table,
+            columns=",".join(TABLE_SCHEMAS[table]),
+            filters={"user_id": user_id} if user_id else None,
+            gte={SYNC_CURSOR_COLUMNS[0]: since} if since else None,
+            cursor_columns=SYNC_CURSOR_COLUMNS,
+            page_size=page_size,
+        )
+        for page in pages:
+            latest = page[-1][SYNC_CURSOR_COLUMNS[0]]
+            if watermark is None or datetime.fromisoformat(latest) > datetime.fromisoformat(watermark):
+                watermark = latest
+            with self._connect() as conn:
+                self._upsert(conn, table, page)
+                conn.execute("INSERT OR REPLACE INTO _sync_state VALUES (?, ?, ?, ?)", [table, scope, watermark, time.time()])
+            copied += len(page)
+        if copied == 0:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO _sync_state VALUES (?, ?, ?, ?)", [table, scope, watermark, time.time()])
+        return copied
+
+    def sync(self, source, tables=None, user_id=None):
+        """
+        Incrementally syncs every table (or the given ones).
+        Returns:
+            dict: table -> rows copied.
+        """
+        copied = {table: self.sync_table(source, table, user_id) for table in (tables or TABLE_SCHEMAS)}
+        if any(copied.values()):
+            invalidate("local_store")
+        logging.info(f"[LocalStore] Synced {copied}")
+        return copied
+
+    def last_synced(self, user_id=None):
+        """Seconds since the least recently synced table was synced for the user (or for all users), or None if never synced."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT table_name, synced_at FROM _sync_state WHERE user_id = ?", [user_id or ""]).fetchall()
+        if len(rows) < len(TABLE_SCHEMAS):
+            return None
+        return time.time() - min(synced_at for _, synced_at in rows)
+
+    def query(self, sql, params=None):
+        """Runs a read query and returns a list of dicts."""
+        with self._connect() as conn:
+            cursor = conn.execute(sql, params or [])
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def correlate(self, metric_a, metric_b, user_id, since=None, granularity="day", lag=0):
+        """
+        Pearson correlation between two metrics, bucketed by day or week.
+        Args:
+            metric_a (str): A key of METRICS.
+            metric_b (str): A key of METRICS.
+            user_id (str): The user to analyse.
+            since (date, optional): Start of the period. Defaults to one year ago.
+            granularity (str): "day" or "week".
+            lag (int): Compare metric_a with metric_b this many buckets later
+                (e.g. intense training weeks vs the following week's spend).
+        Returns:
+            dict: correlation, number of paired buckets, and averages of both metrics.
+        """
+        if metric_a not in METRICS or metric_b not in METRICS:
+            raise ValueError(f"Unknown metric. Available: {', '.join(METRICS)}")
+        if granularity not in ("day", "week"):
+            raise ValueError("granularity must be 'day' or 'week'")
+        since = since or (datetime.utcnow().date() - timedelta(days=365))
+        step = "INTERVAL 1 DAY" if granularity == "day" else "INTERVAL 7 DAY"
+        sql = f"""
+            WITH a AS (
+                SELECT date_trunc('{granularity}', date) AS bucket, sum(value) AS value
+                FROM ({METRICS[metric_a]}) WHERE user_id = ? AND date >= ? GROUP BY 1
+            ), b AS (
+                SELECT date_trunc('{granularity}', date) AS bucket, sum(value) AS value
+                FROM ({METRICS[metric_b]}) WHERE user_id = ? AND date >= ? GROUP BY 1
+            )
+            SELECT corr(a.value, b.value) AS correlation, count(*) AS buckets,
+                   avg(a.value) AS avg_a, avg(b.value) AS avg_b
+            FROM a JOIN b ON b.bucket = a.bucket + {int(lag)} * {step}
+        """
+        row = self.query(sql, [user_id, since, user_id, since])[0]
+        return {
+            "metric_a": metric_a, "metric_b": metric_b, "granularity": granularity, "lag": lag,
+            "since": str(since), "correlation": row["correlation"], "buckets": row["buckets"],
+            "avg_a": row["avg_a"], "avg_b": row["avg_b"],
+        }
+
+_shared_store = None
+_shared_store_lock = threading.Lock()
+
+def get_local_store():
+    """Returns the process-wide LocalAnalyticsStore for LOCAL_STORE_PATH."""
+    global _shared_store
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                _shared_store = LocalAnalyticsStore()
+    return _shared_store
@@ -0,0 +1,304 @@
+import os
+import uuid
+import atexit
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import QdrantClient, models
+from src.cache import invalidate
+from src.db.vector_store import VectorStore, DELETE_BATCH_SIZE, DELETES_TAG
+
+load_dotenv()
+
+# Qdrant server URL; when unset, Qdrant runs embedded in this process and persists to QDRANT_PATH.
+# Embedded mode is a brute-force local store for development: HNSW, quantization and payload
+# indexes are only applied by a Qdrant server. An embedded store is locked by the process that
+# opens it, so the bot and the ingestion API (start-local-bot.sh) need QDRANT_URL to share one.
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_PATH = os.getenv("QDRANT_PATH", "./qdrant_db")
+# HNSW graph: m links per node and ef_construct candidates at build time; QDRANT_HNSW_EF at query time
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "64"))
+# int8 scalar quantization keeps a 4x smaller copy of the vectors in RAM for search, with the
+# float32 originals on disk for rescoring. Set QDRANT_QUANTIZATION=none to disable.
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "int8").lower()
+QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "true").lower() in ("1", "true", "yes")
+
+# Metadata fields the agent and the keyword index filter on
+PAYLOAD_INDEXES = {"user_id": models.PayloadSchemaType.KEYWORD, "date": models.PayloadSchemaType.KEYWORD, "source": models.PayloadSchemaType.KEYWORD,
+                   "indexed_at": models.PayloadSchemaType.FLOAT}
+# Payload keys holding the document itself rather than its metadata
+_DOC_ID_KEY = "doc_id"
+_DOCUMENT_KEY = "document"
+# Qdrant point ids must be integers or UUIDs, so string ids map to a deterministic UUID
+_ID_NAMESPACE = uuid.UUID("6f1d3c1e-3b0a-4c55-9a55-2f0d6b1f4a21")
+
+_clients = {}  # location -> client
+_stores = {}  # (location, collection name) -> QdrantStore
+_lock = threading.RLock()
+
+def get_qdrant_client(url=QDRANT_URL, path=QDRANT_PATH):
+    """Returns the shared QdrantClient for a server URL, or for an embedded store at path."""
+    location = url or os.path.abspath(path)
+    with _lock:
+        if location not in _clients:
+            try:
+                _clients[location] = QdrantClient(url=url, api_key=QDRANT_API_KEY) if url else QdrantClient(path=path)
+            except RuntimeError as e:
+                if url:
+                    raise
+                raise RuntimeError(
+                    f"The embedded Qdrant store at {location} is already open in another process (the bot and the "
+                    f"ingestion API cannot both open it). Run a Qdrant server and set QDRANT_URL to share it. ({e})"
+                ) from e
+            # Close before interpreter teardown so the embedded store is flushed and unlocked cleanly
+            atexit.register(_clients[location].close)
+        return _clients[location]
+
+def get_qdrant_store(collection_name="my_life_logs", url=QDRANT_URL, path=QDRANT_PATH):
+    """Returns the shared QdrantStore for a collection."""
+    key = (url or os.path.abspath(path), collection_name)
+    with _lock:
+        if key not in _stores:
+            _stores[key] = QdrantStore(collection_name=collection_name, url=url, path=path)
+        return _stores[key]
+
+def point_id(doc_id):
+    """The Qdrant point id for a document id."""
+    return str(uuid.uuid5(_ID_NAMESPACE, str(doc_id)))
+
+def _match(key, value):
+    if isinstance(value, (str, int)):
+        return models.FieldCondition(key=key, match=models.MatchValue(value=value))
+    # MatchValue only takes strings, integers and booleans
+    return models.FieldCondition(key=key, range=models.Range(gte=value, lte=value))
+
+def to_qdrant_filter(where=None, where_document=None):
+    """
+    Translates a Chroma `where` filter (and `where_document` $contains) into a Qdrant Filter.
+    Supports $and, $or, $eq, $ne, $in, $nin, $gt, $gte, $lt and $lte.
+    Raises:
+        ValueError: If the filter uses an unsupported operator.
+    """
+    must, should, must_not = [], [], []
+    for key, value in (where or {}).items():
+        if key == "$and":
+            must.extend(to_qdrant_filter(clause) for clause in value)
+        elif key == "$or":
+            should.extend(to_qdrant_filter(clause) for clause in value)
+        elif isinstance(value, dict):
+            for op, operand in value.items():
+                if op == "$eq":
+                    must.append(_match(key, operand))
+                elif op == "$ne":
+                    must_not.append(_match(key, operand))
+                elif op == "$in":
+                    must.append(models.FieldCondition(key=key, match=models.MatchAny(any=list(operand))))
+                elif op == "$nin":
+                    must_not.append(models.FieldCondition(key=key, match=models.MatchAny(any=list(operand))))
+                elif op in ("$gt", "$gte", "$lt", "$lte"):
+                    must.append(models.FieldCondition(key=key, range=models.Range(**{op[1:]: operand})))
+                else:
+                    raise ValueError(f"Unsupported filter operator '{op}'")
+        else:
+            must.append(_match(key, value))
+    for op, operand in (where_document or {}).items():
+        if op != "$contains":
+            raise ValueError(f"Unsupported document filter operator '{op}'")
+        must.append(models.FieldCondition(key=_DOCUMENT_KEY, match=models.MatchText(text=operand)))
+    if not (must or should or must_not):
+        return None
+    return models.Filter(must=must or None, should=should or None, must_not=must_not or None)
+
+def _metadata(payload):
+    return {k: v for k, v in (payload or {}).items() if k not in (_DOC_ID_KEY, _DOCUMENT_KEY)}
+
+class QdrantStore(VectorStore):
+    def __init__(self, collection_name="my_life_logs", url=QDRANT_URL, path=QDRANT_PATH, embedding_service=None):
+        """
+        VectorStore backed by Qdrant, with int8 scalar quantization, tunable HNSW and payload
+        indexes on user_id, date, source and indexed_at. Collections are created on the first write,
+        once the embedding dimension is known.
+        Args:
+            collection_name (str): The default collection.
+            url (str, optional): Qdrant server URL. When None, an embedded store at path is used.
+            path (str): Directory of the embedded store.
+            embedding_service (EmbeddingService, optional): Embeds documents and queries.
+        """
+        self.client = get_qdrant_client(url, path)
+        self.collection_name = collection_name
+        self._embedding_service = embedding_service
+        self._dims = {}  # collection name -> vector size, for collections known to exist
+        self._models = {}  # collection name -> embedding model recorded in its metadata (None if none)
+        self._collections_lock = threading.Lock()
+
+    def _exists(self, collection_name):
+        if collection_name in self._dims:
+            return True
+        if self.client.collection_exists(collection_name):
+            config = self.client.get_collection(collection_name).config
+            self._dims[collection_name] = config.params.vectors.size
+            self._models[collection_name] = (config.metadata or {}).get("embedding_model")
+            return True
+        return False
+
+    def _check_model(self, collection_name):
+        """
+        Checks that an existing collection's vectors come from this store's embedding model,
+        as ChromaDBManager does, and records the model on collections that predate the check.
+        Raises:
+            ValueError: If the collection records a different model.
+        """
+        model = self.embedding_service.model
+        recorded = self._models.get(collection_name)
+        if recorded is None:
+            self.client.update_collection(collection_name, metadata={"embedding_model": model})
+            self._models[collection_name] = model
+        elif recorded != model:
+            raise ValueError(f"Collection '{collection_name}' holds '{recorded}' embeddings but EMBEDDING_MODEL is "
+                             f"'{model}'; re-index it or set EMBEDDING_MODEL={recorded}")
+
+    def _ensure_collection(self, collection_name, dim):
+        with self._collections_lock:
+            if self._exists(collection_name):
+                self._check_model(collection_name)
+                if self._dims[collection_name] != dim:
+                    raise ValueError(f"Embedding has dimension {dim}, collection '{collection_name}' expects {self._dims[collection_name]}")
+                return
+            quantization = None
+            if QDRANT_QUANTIZATION == "int8":
+                quantization = models.ScalarQuantization(
+                    scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+                )
+            self.client.create_collection(
+                collection_name,
+                vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=QDRANT_ON_DISK),
+                hnsw_config=models.HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT),
+                quantization_config=quantization,
+                metadata={"embedding_model": self.embedding_service.model},
+            )
+            for field, schema in PAYLOAD_INDEXES.items():
+                self.client.create_payload_index(collection_name, field_name=field, field_schema=schema)
+            self._dims[collection_name] = dim
+            self._models[collection_name] = self.embedding_service.model
+            print(f"Created new Qdrant collection: '{collection_name}' (dim {dim})")
+
+    def _get_metadatas(self, collection_name, ids):
+        if not self._exists(collection_name):
+            return {}
+        points = self.client.retrieve(collection_name, ids=[point_id(i) for i in ids], with_payload=True)
+        return {p.payload[_DOC_ID_KEY]: _metadata(p.payload) for p in points}
+
+    def _write(self, collection_name, ids, documents, metadatas, embeddings):
+        vectors = [np.asarray(e, dtype=np.float32).tolist() for e in embeddings]
+        self._ensure_collection(collection_name, len(vectors[0]))
+        self.client.upsert(collection_name, points=[
+            models.PointStruct(id=point_id(doc_id), vector=vector, payload={**(meta or {}), _DOC_ID_KEY: doc_id, _DOCUMENT_KEY: doc})
+            for doc_id, doc, meta, vector in zip(ids, documents, metadatas, vectors)
+        ])
+
+    def _update_metadatas(self, collection_name, ids, documents, metadatas):
+        self.client.batch_update_points(collection_name, update_operations=[
+            models.OverwritePayloadOperation(overwrite_payload=models.SetPayload(
+                payload={**(meta or {}), _DOC_ID_KEY: doc_id, _DOCUMENT_KEY: doc}, points=[point_id(doc_id)]
+            ))
+            for doc_id, doc, meta in zip(ids, documents, metadatas)
+        ])
+
+    def _delete_ids(self, collection_name, ids):
+        self.client.delete(collection_name, points_selector=models.PointIdsList(points=[point_id(i) for i in ids]))
+
+    def query_collection(self, query_texts, n_results=5, query_embeddings=None, collection_name=None, where=None, where_document=None, include=["metadatas", "documents", "distances"]):
+        """
+        Queries a collection; same arguments and Chroma-style result as ChromaDBManager.query_collection.
+        Distances are cosine distances (1 - similarity).
+        """
+        target_collection_name = self._target(collection_name)
+        if query_embeddings is None and query_texts:
+            query_embeddings = self.embedding_service.embed(query_texts)
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        if not self._exists(target_collection_name):
+            for _ in query_embeddings:
+                for values in results.values():
+                    values.append([])
+            return results
+        with self._collections_lock:
+            self._check_model(target_collection_name)
+        query_filter = to_qdrant_filter(where, where_document)
+        search_params = models.SearchParams(
+            hnsw_ef=QDRANT_HNSW_EF,
+            quantization=models.QuantizationSearchParams(rescore=True) if QDRANT_QUANTIZATION == "int8" else None,
+        )
+        for embedding in query_embeddings:
+            points = self.client.query_points(
+                target_collection_name,
+                query=np.asarray(embedding, dtype=np.float32).tolist(),
+                query_filter=query_filter,
+                limit=n_results,
+                search_params=search_params,
+                with_payload=True,
+                with_vectors="embeddings" in include,
+            ).points
+            results["ids"].append([p.payload[_DOC_ID_KEY] for p in points])
+            results["documents"].append([p.payload.get(_DOCUMENT_KEY) for p in points])
+            results["metadatas"].append([_metadata(p.payload) for p in points])
+            results["distances"].append([1.0 - p.score for p in points])
+            results["embeddings"].append([p.vector for p in points])
+        return {k: (v if k == "ids" or k in include else None) for k, v in results.items()}
+
+    def iter_documents(self, where=None, batch_size=DELETE_BATCH_SIZE, collection_name=None, include=("documents", "metadatas")):
+        target_collection_name = self._target(collection_name)
+        if not self._exists(target_collection_name):
+            return
+        query_filter = to_qdrant_filter(where)
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                target_collection_name,
+                scroll_filter=query_filter,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors="embeddings" in include,
+            )
+            if points:
+                page = {"ids": [p.payload[_DOC_ID_KEY] for p in points]}
+                if "documents" in include:
+                    page["documents"] = [p.payload.get(_DOCUMENT_KEY) for p in points]
+                if "metadatas" in include:
+                    page["metadatas"] = [_metadata(p.payload) for p in points]
+                if "embeddings" in include:
+                    page["embeddings"] = [p.vector for p in points]
+                yield page
+            if offset is None:
+                return
+
+    def count(self, collection_name=None):
+        target_collection_name = self._target(collection_name)
+        if not self._exists(target_collection_name):
+            return 0
+        return self.client.count(target_collection_name, exact=True).count
+
+    def delete_collection(self, collection_name=None):
+        """
+        Deletes the specified Qdrant collection.
+        Args:
+            collection_name (str, optional): The name of the collection. Defaults to the instance's default collection.
+        """
+        target_collection_name = self._target(collection_name)
+        with self._collections_lock:
+            self.client.delete_collection(target_collection_name)
+            self._dims.pop(target_collection_name, None)
+            self._models.pop(target_collection_name, None)
+        invalidate("chroma", DELETES_TAG)
+        print(f"Collection '{target_collection_name}' deleted.")
+
+    def list_collections(self):
+        """
+        Lists all collections in the Qdrant instance.
+        Returns:
+            list of str: Collection names.
+        """
+        return [c.name for c in self.client.get_collections().collections]
@@ -0,0 +1,153 @@
+import uuid
+from datetime import date, datetime, timedelta
+
+# Per-period aggregates over the local analytics store, one query per domain.
+# {period} is "day", "week" or "month"; every query takes (user_id, since) and returns
+# one row per period with period_start plus the domain's metrics.
+ROLLUP_QUERIES = {
+    "gym": """
+        SELECT date_trunc('{period}', date)::DATE AS period_start, count(DISTINCT date) AS sessions,
+               count(DISTINCT exercise_name) AS exercises, sum(sets) AS sets, sum(sets * reps) AS reps,
+               sum(coalesce(sets, 0) * coalesce(reps, 0) * coalesce(weight, 0)) AS volume,
+               max(weight) AS max_weight, mode(exercise_name) AS top_exercise
+        FROM gym_logs WHERE user_id = ? AND date >= ? GROUP BY 1 ORDER BY 1
+    """,
+    "bjj": """
+        SELECT date_trunc('{period}', date)::DATE AS period_start, count(DISTINCT date) AS sessions,
+               sum(rolls_count) AS rolls, round(avg(performance_rating), 1) AS avg_performance,
+               mode(session_type) AS top_session_type
+        FROM jiujitsu_logs WHERE user_id = ? AND date >= ? GROUP BY 1 ORDER BY 1
+    """,
+    "sleep_mood": """
+        SELECT date_trunc('{period}', date)::DATE AS period_start, count(DISTINCT date) AS days_logged,
+               round(avg(sleep_hours), 1) AS avg_sleep_hours, round(avg(sleep_quality), 1) AS avg_sleep_quality,
+               round(avg(mood_score), 1) AS avg_mood, round(avg(energy_level), 1) AS avg_energy,
+               round(avg(stress_level), 1) AS avg_stress
+        FROM daily_logs WHERE user_id = ? AND date >= ? GROUP BY 1 ORDER BY 1
+    """,
+    "spend": """
+        SELECT date_trunc('{period}', date)::DATE AS period_start, count(*) AS transactions,
+               round(sum(abs(amount)), 2) AS total, round(max(abs(amount)), 2) AS largest,
+               mode(category) AS top_category
+        FROM financial_transactions
+        -- Spending only: credits (income, refunds, transfers in) are not spent money
+        WHERE user_id = ? AND date >= ? AND (amount < 0 OR transaction_type = 'debit') GROUP BY 1 ORDER BY 1
+    """,
+}
+# The source table of each domain
+ROLLUP_TABLES = {"gym": "gym_logs", "bjj": "jiujitsu_logs", "sleep_mood": "daily_logs", "spend": "financial_transactions"}
+# The metric each digest compares with the previous period
+HEADLINE_METRICS = {"gym": "volume", "bjj": "rolls", "sleep_mood": "avg_sleep_hours", "spend": "total"}
+PERIOD_TYPES = ("day", "week", "month")
+# Vector collection the digests are mirrored into, for ranking them against free-text questions
+DIGEST_COLLECTION = "digests"
+
+_ID_NAMESPACE = uuid.UUID("0b6f3c56-2f0e-4a7d-8d2c-5f1a9e3b7c40")
+
+def period_start(day, period_type):
+    """The first day of the period containing day (weeks start on Monday)."""
+    if period_type == "day":
+        return day
+    if period_type == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def period_end(start, period_type):
+    if period_type == "day":
+        return start
+    if period_type == "week":
+        return start + timedelta(days=6)
+    return date(start.year + (start.month == 12), start.month % 12 + 1, 1) - timedelta(days=1)
+
+def period_starts(date_from, date_to, period_type):
+    """The starts of the periods that overlap date_from..date_to, as ISO strings."""
+    start = period_start(date_from, period_type)
+    starts = []
+    while start <= date_to:
+        starts.append(start.isoformat())
+        start = period_end(start, period_type) + timedelta(days=1)
+    return starts
+
+def rollup_id(user_id, domain, period_type, start):
+    """Deterministic id, so recomputing a period overwrites its row."""
+    return str(uuid.uuid5(_ID_NAMESPACE, f"{user_id}:{domain}:{period_type}:{start}"))
+
+def _label(period_type, start):
+    if period_type == "day":
+        return start.strftime("%a %d %b %Y")
+    if period_type == "week":
+        return f"week of {start.strftime('%d %b %Y')}"
+    return start.strftime("%B %Y")
+
+def _change(current, previous):
+    if not previous or current is None:
+        return ""
+    return f" ({(current - previous) / previous:+.0%} vs previous)"
+
+def format_digest(domain, period_type, start, metrics, previous=None, partial=False):
+    """
+    A one-line summary of a domain's period, with the headline metric compared to the previous period.
+    Args:
+        metrics (dict): The period's rollup metrics.
+        previous (dict, optional): The previous period's metrics.
+        partial (bool): The period is still in progress.
+    """
+    headline = HEADLINE_METRICS[domain]
+    change = _change(metrics.get(headline), (previous or {}).get(headline))
+    label = _label(period_type, start) + (" (so far)" if partial else "")
+    m = {key: "n/a" if value is None else value for key, value in metrics.items()}
+    num = lambda key, spec: "n/a" if metrics.get(key) is None else format(metrics[key], spec)
+    if domain == "gym":
+        body = (f"{m['sessions']} gym sessions, {m['exercises']} exercises, {m['sets']} sets, {m['reps']} reps, "
+                f"volume {num('volume', ',.0f')} kg{change}; heaviest {num('max_weight', 'g')} kg; most trained {m['top_exercise']}")
+    elif domain == "bjj":
+        body = (f"{m['sessions']} BJJ sessions, {m['rolls']} rolls{change}, average performance {m['avg_performance']}/10; "
+                f"mostly {m['top_session_type']}")
+    elif domain == "sleep_mood":
+        body = (f"{m['days_logged']} days logged, sleep {m['avg_sleep_hours']} h{change} (quality {m['avg_sleep_quality']}/10), "
+                f"mood {m['avg_mood']}/10, energy {m['avg_energy']}/10, stress {m['avg_stress']}/10")
+    else:
+        body = (f"{m['transactions']} transactions, spent {num('total', ',.2f')}{change}; largest {num('largest', ',.2f')}; "
+                f"top category {m['top_category']}")
+    return f"{domain.replace('_', '/')} {label}: {body}."
+
+def compute_rollups(store, user_id, period_type, since, today=None):
+    """
+    Rollups and digests for every domain and period from since (rounded down to a period start) to today.
+    Args:
+        store (LocalAnalyticsStore): A synced local store.
+        user_id (str): The user.
+        period_type (str): "day", "week" or "month".
+        since (date): First day to cover.
+        today (date, optional): Defaults to today (UTC); the period containing it is marked partial.
+    Returns:
+        list of dict: Rows for the period_rollups table.
+    """
+    if period_type not in PERIOD_TYPES:
+        raise ValueError(f"period_type must be one of {', '.join(PERIOD_TYPES)}")
+    today = today or datetime.utcnow().date()
+    first = period_start(since, period_type)
+    # Read one extra period so the first digest has something to compare with
+    lookback = period_start(first - timedelta(days=1), period_type)
+    rows = []
+    for domain, sql in ROLLUP_QUERIES.items():
+        previous_start, previous = None, None
+        for result in store.query(sql.format(period=period_type), [user_id, lookback]):
+            start = result.pop("period_start")
+            metrics = {key: value for key, value in result.items() if value is not None}
+            if start >= first:
+                end = period_end(start, period_type)
+                # Only compare with the period right before; a gap means there is nothing to compare
+                adjacent = previous if previous_start == period_start(start - timedelta(days=1), period_type) else None
+                rows.append({
+                    "id": rollup_id(user_id, domain, period_type, start),
+                    "user_id": user_id,
+                    "domain": domain,
+                    "period_type": period_type,
+                    "period_start": start.isoformat(),
+                    "period_end": end.isoformat(),
+                    "metrics": metrics,
+                    "digest": format_digest(domain, period_type, start, result, adjacent, partial=end >= today),
+                })
+            previous_start, previous = start, result
+    return rows
@@ -1,33 +1,211 @@
 import os
-from supabase import create_client, Client
+import time
+import random
+import asyncio
+import threading
+import logging
 from dotenv import load_dotenv
+from src.cache import invalidate
 
 load_dotenv()
 
+# Connection pool and retry settings for the shared client
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "10"))
+SUPABASE_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "60"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "30"))
+SUPABASE_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "3"))
+SUPABASE_RETRY_BACKOFF_SECONDS = float(os.getenv("SUPABASE_RETRY_BACKOFF_SECONDS", "0.5"))
+
 class SupabaseManager:
-    def __init__(self):
+    def __init__(self, pool_size=SUPABASE_POOL_SIZE, max_retries=SUPABASE_MAX_RETRIES):
         url = os.environ.get("SUPABASE_URL")
         key = os.environ.get("SUPABASE_KEY")
-        self.supabase: Client = create_client(url, key)
+        # Imported here so the client libraries are only loaded when a manager is created
+        import httpx
+        from supabase import create_client, ClientOptions
+        # One pooled HTTP client with keep-alive, so repeated queries reuse open TLS connections
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=SUPABASE_KEEPALIVE_SECONDS,
+            ),
+            timeout=SUPABASE_TIMEOUT_SECONDS,
+        )
+        options = ClientOptions(httpx_client=self.http_client, postgrest_client_timeout=SUPABASE_TIMEOUT_SECONDS)
+        self.supabase = create_client(url, key, options=options)
+        self.max_retries = max_retries
 
-    def insert_data(self, table_name, data):
-        return self.supabase.table(table_name).insert(data).execute()
+    def _execute(self, query, idempotent=True):
+        """
+        Executes a query builder, retrying transient network errors with exponential backoff and jitter.
+        Args:
+            query: A postgrest request builder.
+            idempotent (bool): If False, only retry failures where the request never reached the server.
+        Returns:
+            The postgrest API response.
+        """
+        import httpx
+        retryable = httpx.TransportError if idempotent else (httpx.ConnectError, httpx.ConnectTimeout)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return query.execute()
+            except retryable as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = SUPABASE_RETRY_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logging.warning(f"[Supabase] Transient error ({e!r}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def insert_data(self, table_name, data, upsert=False):
+        """
+        Inserts one row (a dict) or many rows (a list of dicts) in a single request.
+        Args:
+            table_name (str): The table to write.
+            data (dict or list of dict): The rows.
+            upsert (bool): Update rows whose primary key already exists instead of failing.
+                With client-generated ids this makes the insert idempotent, so it is retried
+                on any transient error.
+        Returns:
+            The postgrest API response.
+        """
+        try:
+            if upsert:
+                return self._execute(self.supabase.table(table_name).upsert(data))
+            return self._execute(self.supabase.table(table_name).insert(data), idempotent=False)
+        finally:
+            invalidate(table_name, "supabase")
 
     def update_data(self, table_name, data, match_column, match_value):
-        return self.supabase.table(table_name).update(data).eq(match_column, match_value).execute()
+        try:
+            return self._execute(self.supabase.table(table_name).update(data).eq(match_column, match_value))
+        finally:
+            invalidate(table_name, "supabase")
 
-    def select_data(self, table_name, columns="*", filters=None):
+    def _build_select(self, table_name, columns="*", filters=None, gte=None, lte=None):
         query = self.supabase.table(table_name).select(columns)
         if filters:
             for column, value in filters.items():
                 query = query.eq(column, value)
-        return query.execute()
+        for op, bounds in (("gte", gte), ("lte", lte)):
+            if bounds:
+                for column, value in bounds.items():
+                    query = getattr(query, op)(column, str(value))
+        return query
+
+    def select_data(self, table_name, columns="*", filters=None, gte=None, lte=None,
+                    order_by=None, descending=False, limit=None, offset=None):
+        """
+        Selects rows with the filtering, ordering and paging done by Postgres.
+        Args:
+            table_name (str): The table to read.
+            columns (str): Comma-separated columns to return.
+            filters (dict, optional): Equality filters, column -> value.
+            gte (dict, optional): Inclusive lower bounds, column -> value (e.g. {"date": "2024-07-01"}).
+            lte (dict, optional): Inclusive upper bounds, column -> value.
+            order_by (str, optional): Column to sort by.
+            descending (bool): Sort order for order_by.
+            limit (int, optional): Maximum number of rows to return.
+            offset (int, optional): Number of rows to skip (requires limit).
+        Returns:
+            The postgrest API response.
+        """
+        query = self._build_select(table_name, columns, filters, gte, lte)
+        if order_by:
+            query = query.order(order_by, desc=descending)
+        if limit is not None and offset is not None:
+            query = query.range(offset, offset + limit - 1)
+        elif limit is not None:
+            query = query.limit(limit)
+        return self._execute(query)
+
+    def select_pages(self, table_name, columns="*", filters=None, gte=None, lte=None,
+                     cursor_columns=("updated_at", "id"), cursor=None, page_size=500):
+        """
+        Iterates over rows in pages using keyset (cursor) pagination, which stays fast on
+        large tables where offset paging would rescan skipped rows.
+        Args:
+            cursor_columns (tuple): A sortable, non-null column and a unique tiebreaker (the
+                primary key). Rows sharing a value of the first are ordered by the second, so
+                none are skipped at a page boundary. Both are always included in the selected columns.
+            cursor (tuple, optional): Start after this (value, tiebreaker) pair (exclusive).
+                None starts at the beginning.
+            page_size (int): Rows fetched per request.
+        Yields:
+            list of dict: One page of rows, ordered by cursor_columns.
+        """
+        column, tiebreaker = cursor_columns
+        if columns != "*":
+            selected = [c.strip() for c in columns.split(",")]
+            columns = ",".join(selected + [c for c in cursor_columns if c not in selected])
+        while True:
+            query = self._build_select(table_name, columns, filters, gte, lte)
+            if cursor is not None:
+                # Quoted, since timestamps contain characters PostgREST treats as syntax
+                value, key = (f'"{v}"' for v in cursor)
+                query = query.or_(f"{column}.gt.{value},and({column}.eq.{value},{tiebreaker}.gt.{key})")
+            query = query.order(column).order(tiebreaker).limit(page_size)
+            rows = self._execute(query).data or []
+            if not rows:
+                return
+            yield rows
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1][column], rows[-1][tiebreaker])
 
     def delete_data(self, table_name, match_column, match_value):
-        return self.supabase.table(table_name).delete().eq(match_column, match_value).execute()
+        try:
+            return self._execute(self.supabase.table(table_name).delete().eq(match_column, match_value))
+        finally:
+            invalidate(table_name, "supabase")
+
+    def call_function(self, function_name, params=None):
+        """
+        Calls a Postgres function through PostgREST RPC with typed, bound parameters.
+        Args:
+            function_name (str): The function name, e.g. "analytics_spend_summary".
+            params (dict, optional): Named arguments, e.g. {"p_user_id": "...", "p_since": "2024-07-01"}.
+        Returns:
+            The postgrest API response; .data holds the returned rows.
+        """
+        return self._execute(self.supabase.rpc(function_name, params or {}))
 
     def execute_sql(self, sql):
         """
         Execute a raw SQL query. Use with caution.
         """
-        return self.supabase.rpc('execute_sql', {'sql': sql}) 
\ No newline at end of file
+        return self._execute(self.supabase.rpc('execute_sql', {'sql': sql}))
+
+_shared_manager = None
+_shared_manager_lock = threading.Lock()
+
+def get_supabase_manager():
+    """
+    Returns the process-wide SupabaseManager, creating it on first use.
+    Safe to call from any thread; the client and its connection pool are shared.
+    """
+    global _shared_manager
+    if _shared_manager is None:
+        with _shared_manager_lock:
+            if _shared_manager is None:
+                _shared_manager = SupabaseManager()
+    return _shared_manager
+
+def set_supabase_manager(manager):
+    """
+    Replaces the process-wide manager, e.g. with an in-memory stand-in for offline benchmarks.
+    Args:
+        manager: A SupabaseManager or any object with the same methods; None resets to lazy creation.
+    """
+    global _shared_manager
+    with _shared_manager_lock:
+        _shared_manager = manager
+
+async def aget_supabase_manager():
+    """
+    Async variant of get_supabase_manager. The first construction runs in a worker
+    thread so it never blocks the event loop.
+    """
+    if _shared_manager is not None:
+        return _shared_manager
+    return await asyncio.to_thread(get_supabase_manager)
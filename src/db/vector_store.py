@@ -1,90 +1,401 @@
 # src/db/vector_store.py
-import chromadb
-# from chromadb.config import Settings # Settings is deprecated, pass persist_directory directly
 import os
+import time
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from src.cache import invalidate
+from src.db.embeddings import get_embedding_service
 
 load_dotenv()
 
 # Default path for ChromaDB persistence, can be overridden by environment variable
 CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+# Bounded batch size and date-list size for metadata-filtered deletes
+DELETE_BATCH_SIZE = int(os.getenv("CHROMA_DELETE_BATCH_SIZE", "500"))
+DATE_FILTER_CHUNK_DAYS = 31
+# Vector database used by the app: "chroma" (default) or "qdrant" (see src/db/qdrant_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# Collections opened at startup by warm_up()
+WARM_COLLECTIONS = [c for c in os.getenv("CHROMA_WARM_COLLECTIONS", "my_life_logs").split(",") if c]
+# Cache tag invalidated when documents are deleted (every write also invalidates "chroma"), so
+# readers that fold in new documents by their 'indexed_at' metadata know to start over
+DELETES_TAG = "chroma_deletes"
 
-class ChromaDBManager:
-    def __init__(self, persist_directory=CHROMA_PERSIST_DIRECTORY, collection_name="default_collection"):
+# Process-wide registry: one PersistentClient per persist directory and cached collection
+# handles, so opening the SQLite-backed store and resolving a collection happen once
+_registry_lock = threading.RLock()
+_clients = {}  # absolute persist directory -> client
+_collections = {}  # (absolute persist directory, collection name) -> collection
+_managers = {}  # (backend, location, collection name) -> VectorStore
+
+def get_chroma_client(persist_directory=CHROMA_PERSIST_DIRECTORY):
+    """Returns the shared PersistentClient for a persist directory, creating it on first use."""
+    key = os.path.abspath(persist_directory)
+    with _registry_lock:
+        if key not in _clients:
+            # Ensure the persist directory exists
+            if not os.path.exists(persist_directory):
+                os.makedirs(persist_directory)
+                print(f"Created ChromaDB persistence directory: {persist_directory}")
+            # Imported here so chromadb is only loaded when a Chroma collection is opened
+            import chromadb
+            _clients[key] = chromadb.PersistentClient(path=persist_directory)
+        return _clients[key]
+
+def get_cached_collection(persist_directory, collection_name, embedding_model=None):
+    """
+    Returns a cached collection handle, loading or creating the collection on first use.
+    A collection created here records embedding_model (when given) in its metadata.
+    """
+    key = (os.path.abspath(persist_directory), collection_name)
+    with _registry_lock:
+        if key not in _collections:
+            client = get_chroma_client(persist_directory)
+            try:
+                _collections[key] = client.get_collection(name=collection_name)
+                print(f"Loaded existing ChromaDB collection: '{collection_name}'")
+            except Exception:
+                # chromadb raises ValueError or NotFoundError depending on the version
+                metadata = {"embedding_model": embedding_model} if embedding_model else None
+                _collections[key] = client.create_collection(name=collection_name, metadata=metadata)
+                print(f"Created new ChromaDB collection: '{collection_name}'")
+        return _collections[key]
+
+def forget_collection(persist_directory, collection_name):
+    """Drops a cached collection handle, e.g. after the collection was deleted."""
+    with _registry_lock:
+        _collections.pop((os.path.abspath(persist_directory), collection_name), None)
+
+def get_chroma_manager(collection_name="my_life_logs", persist_directory=CHROMA_PERSIST_DIRECTORY):
+    """Returns the shared ChromaDBManager for a collection."""
+    key = ("chroma", os.path.abspath(persist_directory), collection_name)
+    with _registry_lock:
+        if key not in _managers:
+            _managers[key] = ChromaDBManager(persist_directory=persist_directory, collection_name=collection_name)
+        return _managers[key]
+
+def get_vector_store(collection_name="my_life_logs", backend=None, persist_directory=CHROMA_PERSIST_DIRECTORY):
+    """
+    Returns the shared VectorStore for a collection on the configured backend.
+    Args:
+        collection_name (str): The collection.
+        backend (str, optional): "chroma" or "qdrant". Defaults to VECTOR_BACKEND.
+        persist_directory (str): Chroma's persist directory (Qdrant uses QDRANT_URL / QDRANT_PATH).
+    """
+    backend = (backend or VECTOR_BACKEND).lower()
+    if backend == "chroma":
+        return get_chroma_manager(collection_name, persist_directory)
+    if backend == "qdrant":
+        # Imported here so qdrant-client is only needed when it is used
+        from src.db.qdrant_store import get_qdrant_store
+        return get_qdrant_store(collection_name)
+    raise ValueError(f"Unknown vector backend '{backend}'. Use 'chroma' or 'qdrant'.")
+
+def warm_up(collection_names=None, persist_directory=CHROMA_PERSIST_DIRECTORY):
+    """Opens the client and resolves the given collections (default WARM_COLLECTIONS) ahead of the first request."""
+    for name in collection_names or WARM_COLLECTIONS:
+        get_vector_store(name, persist_directory=persist_directory).count()
+
+def content_hash(text):
+    """SHA-256 of a document's text, stored in its metadata to detect unchanged re-ingests."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def make_document_id(text, metadata=None):
+    """
+    Deterministic document id: the log_id when the metadata carries one, otherwise a hash of
+    the user and text, so the same log always maps to the same id however often it is sent.
+    """
+    metadata = metadata or {}
+    if metadata.get("log_id"):
+        return str(metadata["log_id"])
+    digest = hashlib.sha256(f"{metadata.get('user_id', '')}\x00{text}".encode("utf-8")).hexdigest()
+    return f"doc_{digest[:32]}"
+
+class VectorStore(ABC):
+    """
+    A document store with embeddings, organised in named collections. Every backend takes
+    metadata filters in Chroma's `where` syntax (see build_where_clauses), so callers do not
+    depend on the backend. Subclasses implement the storage primitives below; idempotent
+    upserts and batched deletes are shared.
+    """
+    collection_name = None
+    _embedding_service = None
+
+    @property
+    def embedding_service(self):
+        return self._embedding_service or get_embedding_service()
+
+    def _target(self, collection_name):
+        return collection_name if collection_name else self.collection_name
+
+    @abstractmethod
+    def query_collection(self, query_texts, n_results=5, query_embeddings=None, collection_name=None, where=None, where_document=None, include=["metadatas", "documents", "distances"]):
+        """Nearest-neighbour search; returns a Chroma-style result dict with one list per query."""
+
+    @abstractmethod
+    def iter_documents(self, where=None, batch_size=DELETE_BATCH_SIZE, collection_name=None, include=("documents", "metadatas")):
+        """
+        Yields pages of documents matching a filter, as dicts with "ids" and the included fields
+        ("documents", "metadatas", "embeddings"). Each page holds at most batch_size documents.
+        """
+
+    @abstractmethod
+    def count(self, collection_name=None):
+        """Number of documents in a collection (0 if it does not exist)."""
+
+    @abstractmethod
+    def delete_collection(self, collection_name=None):
+        """Deletes a collection."""
+
+    @abstractmethod
+    def list_collections(self):
+        """Lists the collections in the store."""
+
+    @abstractmethod
+    def _get_metadatas(self, collection_name, ids):
+        """Returns {id: metadata} for the ids that exist."""
+
+    @abstractmethod
+    def _write(self, collection_name, ids, documents, metadatas, embeddings):
+        """Inserts or replaces documents with their embeddings."""
+
+    @abstractmethod
+    def _update_metadatas(self, collection_name, ids, documents, metadatas):
+        """Replaces the metadata of existing documents without touching their embeddings."""
+
+    @abstractmethod
+    def _delete_ids(self, collection_name, ids):
+        """Deletes documents by id."""
+
+    def add_documents(self, documents, metadatas=None, ids=None, collection_name=None, embeddings=None):
+        """
+        Adds documents to the specified collection. Writes are idempotent: ids default
+        to a hash of the content, and documents whose text is already stored are not embedded again.
+        Args:
+            documents (list of str): The documents to add.
+            metadatas (list of dict, optional): Metadata associated with each document.
+            ids (list of str, optional): Unique IDs for each document. Defaults to make_document_id().
+            collection_name (str, optional): The name of the collection. Defaults to the instance's default collection.
+            embeddings (list of list of float, optional): Precomputed embeddings, one per document.
+                When given, they are stored as-is instead of embedding the documents again.
+        Returns:
+            dict: Counts of documents "written", "metadata_updated" and "skipped" (unchanged).
+        """
+        if ids is None:
+            ids = [make_document_id(doc, meta) for doc, meta in zip(documents, metadatas or [None] * len(documents))]
+        return self.upsert_documents(documents, ids, metadatas=metadatas, embeddings=embeddings, collection_name=collection_name)
+
+    def upsert_documents(self, documents, ids, metadatas=None, embeddings=None, collection_name=None, return_status=False):
+        """
+        Inserts or replaces documents by ID in one write, skipping unchanged ones.
+        Each document's text hash is kept in its metadata as 'content_hash'. If an id already
+        holds the same text, nothing is written (or only its metadata is updated if that
+        changed), so retries and backfills cost no embedding work. Written and updated
+        documents get the time of the write as 'indexed_at' (epoch seconds) in their metadata.
+        Args:
+            documents (list of str): The documents to write.
+            ids (list of str): Unique IDs for each document; existing IDs are overwritten.
+            metadatas (list of dict, optional): Metadata associated with each document.
+            embeddings (list of list of float, optional): Precomputed embeddings, one per document.
+                A None entry is embedded here, like every document when embeddings is None.
+            collection_name (str, optional): The name of the collection. Defaults to the instance's default collection.
+            return_status (bool): Also return "status", mapping each id to "written",
+                "metadata_updated" or "skipped".
+        Returns:
+            dict: Counts of documents "written", "metadata_updated" and "skipped" (unchanged).
+        """
+        target_collection_name = self._target(collection_name)
+        # Collapse repeated ids within the batch; the last occurrence wins
+        latest = {doc_id: i for i, doc_id in enumerate(ids)}
+        order = sorted(latest.values())
+        metadatas = metadatas or [None] * len(documents)
+        incoming = [
+            (ids[i], documents[i], dict(metadatas[i] or {}, content_hash=content_hash(documents[i])),
+             embeddings[i] if embeddings is not None else None)
+            for i in order
+        ]
+        stored = self._get_metadatas(target_collection_name, [item[0] for item in incoming])
+        to_write, to_update = [], []
+        for item in incoming:
+            stored_meta = stored.get(item[0])
+            if stored_meta is None or stored_meta.get("content_hash") != item[2]["content_hash"]:
+                to_write.append(item)
+            elif {k: v for k, v in stored_meta.items() if k != "indexed_at"} != item[2]:
+                to_update.append(item)
+        indexed_at = time.time()
+        for item in to_write + to_update:
+            item[2]["indexed_at"] = indexed_at
+        if to_write:
+            # Only new or changed texts are embedded, in batches, through the embedding cache
+            missing = [i for i, item in enumerate(to_write) if item[3] is None]
+            written_embeddings = [item[3] for item in to_write]
+            if missing:
+                computed = self.embedding_service.embed([to_write[i][1] for i in missing])
+                for i, embedding in zip(missing, computed):
+                    written_embeddings[i] = embedding
+            self._write(
+                target_collection_name,
+                ids=[item[0] for item in to_write],
+                documents=[item[1] for item in to_write],
+                metadatas=[item[2] for item in to_write],
+                embeddings=written_embeddings
+            )
+        if to_update:
+            # Same text, new metadata: update in place without re-embedding
+            self._update_metadatas(
+                target_collection_name,
+                ids=[item[0] for item in to_update],
+                documents=[item[1] for item in to_update],
+                metadatas=[item[2] for item in to_update]
+            )
+        if to_write or to_update:
+            invalidate("chroma")
+        counts = {"written": len(to_write), "metadata_updated": len(to_update), "skipped": len(incoming) - len(to_write) - len(to_update)}
+        print(f"Upserted documents to collection '{target_collection_name}': {counts}")
+        if return_status:
+            status = {item[0]: "skipped" for item in incoming}
+            status.update({item[0]: "written" for item in to_write})
+            status.update({item[0]: "metadata_updated" for item in to_update})
+            counts["status"] = status
+        return counts
+
+    def delete_all_data(self):
+        """
+        Deletes all data in the current collection. The collection is re-created on next use.
+        """
+        self.delete_collection()
+        print(f"All data deleted from collection '{self.collection_name}'.")
+
+    def delete_data_by_date(self, date_str):
+        """
+        Deletes all documents in the collection for a specific date (metadata 'date').
+        Args:
+            date_str (str): The date string to match (e.g., '2024-06-19').
+        """
+        deleted = self.delete_by_metadata(date_from=date_str, date_to=date_str)
+        if not deleted:
+            print(f"No documents found for date {date_str}.")
+
+    def delete_by_metadata(self, date_from=None, date_to=None, user_id=None, source=None,
+                           batch_size=DELETE_BATCH_SIZE, dry_run=False, progress=None, collection_name=None):
+        """
+        Deletes documents matching metadata filters. Filters are evaluated by the backend
+        and ids are fetched and deleted in batches of batch_size, so memory stays bounded
+        no matter how large the collection is.
+        Args:
+            date_from (str, optional): First 'date' to delete, YYYY-MM-DD (inclusive).
+            date_to (str, optional): Last 'date' to delete, YYYY-MM-DD (inclusive). Required with date_from.
+            user_id (str, optional): Only delete this user's documents.
+            source (str, optional): Only delete documents with this 'source'.
+            batch_size (int): Ids fetched and deleted per round trip.
+            dry_run (bool): Count matching documents without deleting them.
+            progress (callable, optional): Called with the running count after each batch.
+            collection_name (str, optional): The name of the collection. Defaults to the instance's default collection.
+        Returns:
+            int: The number of documents deleted (or that would be deleted, with dry_run).
+        Raises:
+            ValueError: If no filter is given (use delete_all_data() to clear a collection), or only
+                one end of the date range.
+        """
+        wheres = build_where_clauses(date_from, date_to, user_id, source)
+        if not wheres:
+            raise ValueError("At least one filter is required; use delete_all_data() to clear the collection.")
+        target_collection_name = self._target(collection_name)
+        progress = progress or (lambda n: print(f"{'Matched' if dry_run else 'Deleted'} {n} documents so far..."))
+        total = 0
+        for where in wheres:
+            if dry_run:
+                for page in self.iter_documents(where, batch_size, target_collection_name, include=()):
+                    total += len(page["ids"])
+                    progress(total)
+                continue
+            while True:
+                # Deleted ids drop out of the filter, so always read the first page
+                page = next(self.iter_documents(where, batch_size, target_collection_name, include=()), None)
+                if not page:
+                    break
+                self._delete_ids(target_collection_name, page["ids"])
+                total += len(page["ids"])
+                progress(total)
+        if total and not dry_run:
+            invalidate("chroma", DELETES_TAG)
+        print(f"{'Would delete' if dry_run else 'Deleted'} {total} documents from '{target_collection_name}'.")
+        return total
+
+class ChromaDBManager(VectorStore):
+    def __init__(self, persist_directory=CHROMA_PERSIST_DIRECTORY, collection_name="default_collection", embedding_service=None):
         """
         Initializes the ChromaDB client.
         Args:
             persist_directory (str): The directory to persist ChromaDB data.
             collection_name (str): The default collection name to create or load.
+            embedding_service (EmbeddingService, optional): Embeds documents and queries.
+                Defaults to the shared service from get_embedding_service().
         """
-        # Ensure the persist directory exists
-        if not os.path.exists(persist_directory):
-            os.makedirs(persist_directory)
-            print(f"Created ChromaDB persistence directory: {persist_directory}")
-
-        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.persist_directory = persist_directory
+        self.client = get_chroma_client(persist_directory)
         self.collection_name = collection_name
-        self._collection = None  # Lazy load collection
+        self._embedding_service = embedding_service
 
     @property
     def collection(self):
-        if self._collection is None:
-            try:
-                self._collection = self.client.get_collection(name=self.collection_name)
-                print(f"Loaded existing ChromaDB collection: '{self.collection_name}'")
-            except:
-                self._collection = self.client.create_collection(name=self.collection_name)
-                print(f"Created new ChromaDB collection: '{self.collection_name}'")
-        return self._collection
+        return get_cached_collection(self.persist_directory, self.collection_name)
 
     def get_or_create_collection(self, collection_name):
         """
         Gets an existing collection or creates it if it doesn't exist.
+        Handles are cached process-wide, so repeated calls do not hit the store.
         Args:
             collection_name (str): The name of the collection.
         Returns:
             chromadb.api.models.Collection.Collection: The collection object.
         """
-        try:
-            collection = self.client.get_collection(name=collection_name)
-            print(f"Retrieved collection: {collection_name}")
-        except Exception as e:
-            # A more specific exception might be ValueError if using an older client
-            # or if the collection truly doesn't exist. chromadb.errors.CollectionNotFoundException for newer ones.
-            print(f"Collection '{collection_name}' not found, creating it. Original error: {e}")
-            collection = self.client.create_collection(name=collection_name)
-        return collection
+        return get_cached_collection(self.persist_directory, collection_name, self.embedding_service.model)
 
-    def add_documents(self, documents, metadatas=None, ids=None, collection_name=None):
+    def _embedding_collection(self, collection_name):
         """
-        Adds documents to the specified ChromaDB collection.
-        Args:
-            documents (list of str): The documents to add.
-            metadatas (list of dict, optional): Metadata associated with each document.
-            ids (list of str, optional): Unique IDs for each document.
-            collection_name (str, optional): The name of the collection. Defaults to the instance's default collection.
+        Returns a collection to write or search vectors in, after checking that its vectors
+        come from this store's embedding model; vectors from different models are not
+        comparable even when their dimensions match. A collection that predates the check
+        gets the model recorded now.
+        Raises:
+            ValueError: If the collection records a different model.
         """
-        target_collection_name = collection_name if collection_name else self.collection_name
-        current_collection = self.get_or_create_collection(target_collection_name)
-        
-        if ids is None:
-            # Generate simple sequential IDs if none are provided
-            # Consider a more robust ID generation strategy for production
-            start_id = current_collection.count() # Get current count to avoid collisions if possible
-            ids = [f"doc_{start_id + i}" for i in range(len(documents))]
-        
-        current_collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
-        print(f"Added {len(documents)} documents to collection '{target_collection_name}'.")
+        collection = self.get_or_create_collection(collection_name)
+        model = self.embedding_service.model
+        metadata = collection.metadata or {}
+        recorded = metadata.get("embedding_model")
+        if recorded is None:
+            # Chroma refuses to modify the hnsw:* settings, even to the same values
+            collection.modify(metadata={**{k: v for k, v in metadata.items() if not k.startswith("hnsw:")},
+                                        "embedding_model": model})
+        elif recorded != model:
+            raise ValueError(f"Collection '{collection_name}' holds '{recorded}' embeddings but EMBEDDING_MODEL is "
+                             f"'{model}'; re-index it or set EMBEDDING_MODEL={recorded}")
+        return collection
+
+    def _get_metadatas(self, collection_name, ids):
+        existing = self.get_or_create_collection(collection_name).get(ids=ids, include=["metadatas"])
+        return dict(zip(existing["ids"], existing["metadatas"] or []))
+
+    def _write(self, collection_name, ids, documents, metadatas, embeddings):
+        self._embedding_collection(collection_name).upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def _update_metadatas(self, collection_name, ids, documents, metadatas):
+        self.get_or_create_collection(collection_name).update(ids=ids, metadatas=metadatas)
+
+    def _delete_ids(self, collection_name, ids):
+        self.get_or_create_collection(collection_name).delete(ids=ids)
 
     def query_collection(self, query_texts, n_results=5, query_embeddings=None, collection_name=None, where=None, where_document=None, include=["metadatas", "documents", "distances"]):
         """
         Queries the specified ChromaDB collection.
         Args:
-            query_texts (list of str, optional): The query texts.
+            query_texts (list of str, optional): The query texts. Embedded through the embedding
+                service (and its cache) unless query_embeddings are given.
             n_results (int): The number of results to return.
             query_embeddings (list of list of float, optional): The query embeddings.
             collection_name (str, optional): The name of the collection. Defaults to the instance's default collection.
@@ -94,11 +405,11 @@ class ChromaDBManager:
         Returns:
             dict: The query results.
         """
-        target_collection_name = collection_name if collection_name else self.collection_name
-        current_collection = self.get_or_create_collection(target_collection_name)
-        
+        current_collection = self._embedding_collection(self._target(collection_name))
+        if query_embeddings is None and query_texts:
+            query_embeddings = self.embedding_service.embed(query_texts)
+
         results = current_collection.query(
-            query_texts=query_texts,
             query_embeddings=query_embeddings,
             n_results=n_results,
             where=where,
@@ -107,17 +418,31 @@ class ChromaDBManager:
         )
         return results
 
+    def iter_documents(self, where=None, batch_size=DELETE_BATCH_SIZE, collection_name=None, include=("documents", "metadatas")):
+        current_collection = self.get_or_create_collection(self._target(collection_name))
+        offset = 0
+        while True:
+            page = current_collection.get(where=where, limit=batch_size, offset=offset, include=list(include))
+            if page["ids"]:
+                yield page
+            if len(page["ids"]) < batch_size:
+                return
+            offset += len(page["ids"])
+
+    def count(self, collection_name=None):
+        return self.get_or_create_collection(self._target(collection_name)).count()
+
     def delete_collection(self, collection_name=None):
         """
         Deletes the specified ChromaDB collection.
         Args:
             collection_name (str, optional): The name of the collection. Defaults to the instance's default collection.
         """
-        target_collection_name = collection_name if collection_name else self.collection_name
+        target_collection_name = self._target(collection_name)
         self.client.delete_collection(name=target_collection_name)
+        forget_collection(self.persist_directory, target_collection_name)
+        invalidate("chroma", DELETES_TAG)
         print(f"Collection '{target_collection_name}' deleted.")
-        if target_collection_name == self.collection_name:
-            self._collection = None # Reset cached collection if it was the default one
 
     def list_collections(self):
         """
@@ -127,31 +452,42 @@ class ChromaDBManager:
         """
         return self.client.list_collections()
 
-    def delete_all_data(self):
-        """
-        Deletes all data in the current collection (shortcut for delete_collection and re-create).
-        """
-        self.delete_collection()
-        # Re-create the collection for further use
-        self._collection = self.client.create_collection(name=self.collection_name)
-        print(f"All data deleted and collection '{self.collection_name}' re-created.")
-
-    def delete_data_by_date(self, date_str):
-        """
-        Deletes all documents in the collection for a specific date (metadata 'date').
-        Args:
-            date_str (str): The date string to match (e.g., '2024-06-19').
-        """
-        results = self.collection.get(include=['metadatas', 'ids'])
-        ids_to_delete = [
-            doc_id for doc_id, meta in zip(results['ids'], results['metadatas'])
-            if meta.get('date') == date_str
-        ]
-        if ids_to_delete:
-            self.collection.delete(ids=ids_to_delete)
-            print(f"Deleted {len(ids_to_delete)} documents for date {date_str}.")
-        else:
-            print(f"No documents found for date {date_str}.")
+def build_where_clauses(date_from=None, date_to=None, user_id=None, source=None, chunk_days=DATE_FILTER_CHUNK_DAYS):
+    """
+    Builds Chroma `where` filters for the given metadata. Chroma only compares numbers with
+    $gte/$lte, and 'date' is stored as a string, so a date range becomes $in lists of
+    dates, split into chunks of at most chunk_days days (None for a single clause).
+    Returns:
+        list of dict: One where clause per date chunk; empty if no filter was given.
+    Raises:
+        ValueError: If only one of date_from and date_to is given, or the range is reversed.
+    """
+    conditions = []
+    if user_id:
+        conditions.append({"user_id": user_id})
+    if source:
+        conditions.append({"source": source})
+    date_chunks = [None]
+    if bool(date_from) != bool(date_to):
+        # An open-ended range has no finite $in list, and silently narrowing it to one day
+        # would make deletes remove far less (or retrieval search far less) than asked
+        raise ValueError("date_from and date_to must be given together")
+    if date_from:
+        start = datetime.strptime(date_from, "%Y-%m-%d").date()
+        end = datetime.strptime(date_to, "%Y-%m-%d").date()
+        if end < start:
+            raise ValueError(f"date_to {end} is before date_from {start}")
+        days = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        step = chunk_days or len(days)
+        date_chunks = [days[i:i + step] for i in range(0, len(days), step)]
+    wheres = []
+    for chunk in date_chunks:
+        clause = conditions + ([{"date": {"$in": chunk}}] if chunk else [])
+        if len(clause) == 1:
+            wheres.append(clause[0])
+        elif clause:
+            wheres.append({"$and": clause})
+    return wheres
 
 # Example Usage (optional - for testing this script directly)
 if __name__ == '__main__':
@@ -0,0 +1,2 @@
+# src/ingest/__init__.py
+# This file makes src/ingest a Python package
\ No newline at end of file
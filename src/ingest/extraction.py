@@ -0,0 +1,120 @@
+import re
+import json
+from datetime import date, time as dt_time
+from src.db.local_store import TABLE_SCHEMAS
+
+# Columns filled in by the pipeline rather than the model
+SYSTEM_COLUMNS = {"id", "user_id", "created_at"}
+# Non-nullable columns in DATABASE_SCHEMA.md besides the date; rows without them are dropped
+REQUIRED_COLUMNS = {
+    "gym_logs": ("exercise_name",),
+    "jiujitsu_logs": ("session_type",),
+    "nutrition_logs": ("meal_type",),
+    "financial_transactions": ("amount", "transaction_type"),
+    "investment_logs": ("asset_name", "asset_type", "transaction_type"),
+}
+# Vector store "source" for an entry, by the first table it produced rows for
+TABLE_SOURCES = {
+    "jiujitsu_logs": "jiujitsu_log",
+    "gym_logs": "gym_log",
+    "financial_transactions": "finance_log",
+    "investment_logs": "finance_log",
+    "nutrition_logs": "nutrition_log",
+    "career_logs": "career_log",
+    "daily_logs": "daily_log",
+}
+
+def _describe_tables():
+    lines = []
+    for table, columns in TABLE_SCHEMAS.items():
+        fields = ", ".join(f"{name} ({kind.lower()})" for name, kind in columns.items() if name not in SYSTEM_COLUMNS)
+        lines.append(f"- {table}: {fields}")
+    return "\n".join(lines)
+
+def build_prompt(entries):
+    """
+    One prompt for a batch of log entries.
+    Args:
+        entries (list of dict): {"text", "date"} per entry.
+    """
+    numbered = "\n".join(f"[{i}] ({entry['date']}) {entry['text']}" for i, entry in enumerate(entries))
+    return (
+        "You turn personal log entries into rows for these tables:\n"
+        f"{_describe_tables()}\n\n"
+        "For each entry, return the rows it describes. Always include one daily_logs row whose free_text is "
+        "the entry text, with any mood, energy, stress or sleep values it mentions. Use the entry's date unless "
+        "the text names another day. Leave out columns the entry does not mention; lists are JSON arrays of strings; "
+        "spending is a negative amount.\n"
+        "Return only a JSON array with one object per entry, in order: "
+        '[{"entry": 0, "tables": {"daily_logs": [{...}], "gym_logs": [{...}, ...]}}, ...]\n\n'
+        f"Entries:\n{numbered}"
+    )
+
+def _coerce(kind, value):
+    """Converts a model-provided value to the column type, or returns None if it does not fit."""
+    if value is None:
+        return None
+    try:
+        if kind == "INTEGER":
+            return int(round(float(value)))
+        if kind == "DOUBLE":
+            return float(value)
+        if kind == "DATE":
+            return date.fromisoformat(str(value)[:10]).isoformat()
+        if kind == "TIME":
+            return dt_time.fromisoformat(str(value)).isoformat()
+        if kind == "VARCHAR[]":
+            values = value if isinstance(value, list) else [value]
+            return [str(v) for v in values if v is not None]
+        return str(value)
+    except (TypeError, ValueError):
+        return None
+
+def clean_rows(table, rows, entry):
+    """
+    Keeps only the table's columns, coerced to their types, with the entry's date as the default.
+    Every row gets every column (None when not mentioned), so a table's rows can go in one bulk insert.
+    """
+    columns = TABLE_SCHEMAS[table]
+    cleaned = []
+    for row in rows if isinstance(rows, list) else []:
+        if not isinstance(row, dict):
+            continue
+        values = {name: _coerce(kind, row.get(name)) for name, kind in columns.items() if name not in SYSTEM_COLUMNS}
+        values["date"] = values.get("date") or entry["date"]
+        if any(values[name] is None for name in REQUIRED_COLUMNS.get(table, ())):
+            continue
+        if any(value is not None for name, value in values.items() if name != "date"):
+            cleaned.append(values)
+    return cleaned
+
+def parse_extraction(content, entries):
+    """
+    Parses the model's answer for a batch.
+    Returns:
+        list of dict: table -> list of row dicts, one per entry, in order.
+    Raises:
+        ValueError: If the answer is not a JSON array with one object per entry.
+    """
+    match = re.search(r"\[.*\]", content, re.DOTALL)
+    if not match:
+        raise ValueError("Extraction returned no JSON array")
+    parsed = json.loads(match.group(0))
+    by_entry = {item.get("entry"): item.get("tables") or {} for item in parsed if isinstance(item, dict)}
+    if set(by_entry) != set(range(len(entries))):
+        raise ValueError(f"Extraction returned {len(by_entry)} entries for {len(entries)}")
+    results = []
+    for i, entry in enumerate(entries):
+        tables = {table: clean_rows(table, rows, entry) for table, rows in by_entry[i].items() if table in TABLE_SCHEMAS}
+        tables = {table: rows for table, rows in tables.items() if rows}
+        if not tables.get("daily_logs"):
+            tables["daily_logs"] = clean_rows("daily_logs", [{"free_text": entry["text"]}], entry)
+        results.append(tables)
+    return results
+
+def source_for(tables):
+    """The vector store source label for an entry's extracted tables."""
+    for table, source in TABLE_SOURCES.items():
+        if tables.get(table):
+            return source
+    return "daily_log"
@@ -0,0 +1,208 @@
+import os
+import time
+import json
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Durable queue of log entries waiting to be structured and stored
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", "./data/ingest_queue.sqlite3")
+# A claimed job that is not completed within this time (e.g. the worker crashed) is claimed again
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "300"))
+# Failed jobs are retried with exponential backoff and moved to the dead-letter state after the last attempt
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+INGEST_RETRY_BACKOFF_SECONDS = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", "10"))
+
+PENDING, PROCESSING, DONE, DEAD = "pending", "processing", "done", "dead"
+
+class IngestQueue:
+    def __init__(self, path=INGEST_QUEUE_PATH, lease_seconds=INGEST_LEASE_SECONDS,
+                 max_attempts=INGEST_MAX_ATTEMPTS, backoff_seconds=INGEST_RETRY_BACKOFF_SECONDS):
+        """
+        A job queue in a SQLite file (WAL mode). Every job has an idempotency key, so
+        re-submitting the same message (e.g. a redelivered Telegram update) adds nothing.
+        Jobs are claimed with a lease, so a job held by a crashed worker is picked up again.
+        Args:
+            path (str): The SQLite database file. Use ":memory:" for a throwaway queue.
+            lease_seconds (float): How long a claimed job stays invisible to other claims.
+            max_attempts (int): Attempts before a job is dead-lettered.
+            backoff_seconds (float): Delay before the first retry; doubles with each attempt.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+            "payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "available_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "extraction TEXT)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(ingest_jobs)").fetchall()]
+        if "extraction" not in columns:
+            # Queue files from before extractions were kept with their jobs
+            self._conn.execute("ALTER TABLE ingest_jobs ADD COLUMN extraction TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ingest_jobs_status_available_idx ON ingest_jobs (status, available_at)")
+        self._conn.commit()
+
+    def enqueue(self, idempotency_key, payload):
+        """
+        Adds a job unless one with the same key exists. The job is durable once this returns.
+        Args:
+            idempotency_key (str): Identifies the source message, e.g. "telegram:<chat>:<message>".
+            payload (dict): JSON-serialisable job data.
+        Returns:
+            tuple: (job id, True if the job was added or False if the key was already queued)
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO ingest_jobs (idempotency_key, payload, status, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (idempotency_key, json.dumps(payload), PENDING, now, now, now),
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            row = self._conn.execute("SELECT id FROM ingest_jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            return row[0], False
+
+    def claim(self, limit):
+        """
+        Leases up to limit jobs that are due: pending ones and ones whose lease expired.
+        An expired lease counts as a failed attempt (the worker holding it most likely
+        crashed), so a job that keeps crashing the worker is dead-lettered too.
+        Returns:
+            list of dict: {"id", "key", "payload", "attempts", "created_at", "extraction"} per job,
+            oldest first; "extraction" is what save_extraction() stored, or None.
+        """
+        now = time.time()
+        claimed, last_id = [], 0
+        with self._lock, self._conn:
+            while len(claimed) < limit:
+                # Paging by id skips the jobs just leased or dead-lettered in this call
+                rows = self._conn.execute(
+                    "SELECT id, idempotency_key, payload, status, attempts, created_at, extraction FROM ingest_jobs "
+                    "WHERE status IN (?, ?) AND available_at <= ? AND id > ? ORDER BY id LIMIT ?",
+                    (PENDING, PROCESSING, now, last_id, limit - len(claimed)),
+                ).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                for id_, key, payload, status, attempts, created_at, extraction in rows:
+                    if status == PROCESSING:
+                        attempts += 1
+                        if attempts >= self.max_attempts:
+                            self._conn.execute(
+                                "UPDATE ingest_jobs SET status = ?, attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                                (DEAD, attempts, "Lease expired", now, id_),
+                            )
+                            continue
+                    self._conn.execute(
+                        "UPDATE ingest_jobs SET status = ?, attempts = ?, available_at = ?, updated_at = ? WHERE id = ?",
+                        (PROCESSING, attempts, now + self.lease_seconds, now, id_),
+                    )
+                    claimed.append({"id": id_, "key": key, "payload": json.loads(payload), "attempts": attempts,
+                                    "created_at": created_at, "extraction": json.loads(extraction) if extraction else None})
+        return claimed
+
+    def save_extraction(self, job_id, extraction):
+        """
+        Keeps a job's structured rows, so a retry writes exactly the same rows instead of
+        asking the model again (which could return different tables or row counts).
+        Args:
+            job_id (int): The job.
+            extraction (dict): table -> list of row dicts, as parsed for the job's entry.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE ingest_jobs SET extraction = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(extraction), time.time(), job_id),
+            )
+
+    def complete(self, job_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE ingest_jobs SET status = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                [(DONE, time.time(), job_id) for job_id in job_ids],
+            )
+
+    def fail(self, job_ids, error):
+        """
+        Records a failed attempt: the job is retried after a backoff, or dead-lettered
+        once it has used max_attempts.
+        Returns:
+            int: How many of the jobs were dead-lettered.
+        """
+        now = time.time()
+        dead = 0
+        with self._lock, self._conn:
+            for job_id in job_ids:
+                row = self._conn.execute("SELECT attempts FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                if attempts >= self.max_attempts:
+                    status, available_at = DEAD, now
+                    dead += 1
+                else:
+                    status, available_at = PENDING, now + self.backoff_seconds * 2 ** (attempts - 1)
+                self._conn.execute(
+                    "UPDATE ingest_jobs SET status = ?, attempts = ?, available_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                    (status, attempts, available_at, str(error)[:1000], now, job_id),
+                )
+        return dead
+
+    def dead_letters(self, limit=50):
+        """The most recent dead-lettered jobs: {"id", "key", "payload", "attempts", "last_error"}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, idempotency_key, payload, attempts, last_error FROM ingest_jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+                (DEAD, limit),
+            ).fetchall()
+        return [{"id": id_, "key": key, "payload": json.loads(payload), "attempts": attempts, "last_error": error}
+                for id_, key, payload, attempts, error in rows]
+
+    def retry_dead(self):
+        """Moves every dead-lettered job back to pending with a fresh attempt count. Returns the number moved."""
+        now = time.time()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE ingest_jobs SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE status = ?",
+                (PENDING, now, now, DEAD),
+            ).rowcount
+
+    def purge_done(self, older_than_seconds=7 * 24 * 3600):
+        """Deletes completed jobs older than the given age; their keys can then be enqueued again."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM ingest_jobs WHERE status = ? AND updated_at < ?", (DONE, time.time() - older_than_seconds)
+            ).rowcount
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, count(*) FROM ingest_jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, PROCESSING, DONE, DEAD)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_shared_queue = None
+_shared_queue_lock = threading.Lock()
+
+def get_ingest_queue():
+    """Returns the process-wide IngestQueue for INGEST_QUEUE_PATH."""
+    global _shared_queue
+    if _shared_queue is None:
+        with _shared_queue_lock:
+            if _shared_queue is None:
+                _shared_queue = IngestQueue()
+    return _shared_queue
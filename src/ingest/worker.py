@@ -0,0 +1,185 @@
+import os
+import uuid
+import threading
+import logging
+from dotenv import load_dotenv
+from src.db.supabase_client import get_supabase_manager
+from src.db.vector_store import get_vector_store
+from src.ingest.queue import get_ingest_queue
+from src.ingest.extraction import build_prompt, parse_extraction, source_for
+from src.agent.tracing import span, record_llm_usage
+from src.agent.llm_gateway import LLMGateway, BACKGROUND
+
+load_dotenv()
+
+# Log entries structured by one LLM call, and written with one insert per table
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "10"))
+# How often an idle worker checks the queue
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))
+INGEST_MODEL = os.getenv("INGEST_MODEL", "gpt-4")
+
+# Row and document ids are derived from a job's idempotency key, so a retried job
+# overwrites what an earlier attempt wrote instead of adding duplicates
+_ID_NAMESPACE = uuid.UUID("5d7c4f0e-9a4b-4c57-9a0e-6b1f3f1c2a11")
+
+def row_id(idempotency_key, table, index):
+    return str(uuid.uuid5(_ID_NAMESPACE, f"{idempotency_key}:{table}:{index}"))
+
+class IngestWorker:
+    def __init__(self, queue=None, llm=None, supabase=None, vector_store=None,
+                 batch_size=INGEST_BATCH_SIZE, poll_seconds=INGEST_POLL_SECONDS):
+        """
+        Drains the ingest queue in the background: each batch of log entries is structured
+        by one LLM call (saved with the jobs, so retries write the same rows), inserted into
+        the Supabase tables with one upsert per table, and its text upserted into the vector
+        store in one call. A failing batch is retried one
+        job at a time, so a single bad entry only delays itself; failed jobs go back on the
+        queue with backoff and end up in its dead-letter state after the last attempt.
+        Args:
+            queue (IngestQueue, optional): Defaults to the shared queue.
+            llm (optional): Chat model with invoke(); defaults to ChatOpenAI with INGEST_MODEL.
+                Calls go through an LLMGateway at BACKGROUND priority.
+            supabase (optional): Defaults to get_supabase_manager().
+            vector_store (VectorStore, optional): Defaults to the "my_life_logs" collection.
+            batch_size (int): Jobs per batch.
+            poll_seconds (float): Sleep between checks when the queue is empty.
+        """
+        self._queue = queue
+        self._llm = llm
+        self._gateway = None
+        self._supabase = supabase
+        self._vector_store = vector_store
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def queue(self):
+        return self._queue or get_ingest_queue()
+
+    @property
+    def llm(self):
+        # Background priority, so extraction waits behind interactive queries when rate limited
+        if self._gateway is None:
+            llm = self._llm
+            if llm is None:
+                from langchain_community.chat_models import ChatOpenAI
+                llm = ChatOpenAI(temperature=0, model_name=INGEST_MODEL, max_retries=0)
+            self._gateway = LLMGateway(llm, priority=BACKGROUND)
+        return self._gateway
+
+    @property
+    def supabase(self):
+        return self._supabase or get_supabase_manager()
+
+    @property
+    def vector_store(self):
+        return self._vector_store or get_vector_store("my_life_logs")
+
+    def _extract(self, entries):
+        prompt = build_prompt(entries)
+        with span("llm.extract", entries=len(entries)) as s:
+            response = self.llm.invoke(prompt)
+            content = response.content if hasattr(response, "content") else str(response)
+            record_llm_usage(s, prompt, content, response)
+        return parse_extraction(content, entries)
+
+    def _extractions(self, jobs):
+        """
+        The structured rows for each job: the ones saved by an earlier attempt, and one LLM
+        call for the rest, saved before anything is written so every retry reuses them.
+        """
+        missing = [job for job in jobs if job.get("extraction") is None]
+        if missing:
+            for job, tables in zip(missing, self._extract([job["payload"] for job in missing])):
+                self.queue.save_extraction(job["id"], tables)
+                job["extraction"] = tables
+        return [job["extraction"] for job in jobs]
+
+    def _write(self, jobs):
+        """Structures and stores a batch of jobs. Raises if any step fails; every step is idempotent."""
+        entries = [job["payload"] for job in jobs]
+        extracted = self._extractions(jobs)
+        rows = {}
+        documents, ids, metadatas = [], [], []
+        for job, entry, tables in zip(jobs, entries, extracted):
+            for table, table_rows in tables.items():
+                for i, row in enumerate(table_rows):
+                    # created_at and updated_at are left to Postgres, so they record when the
+                    # row was written and the local store's sync sees it
+                    rows.setdefault(table, []).append({**row, "id": row_id(job["key"], table, i), "user_id": entry["user_id"]})
+            doc_id = row_id(job["key"], "document", 0)
+            documents.append(entry["text"])
+            ids.append(doc_id)
+            metadatas.append({"user_id": entry["user_id"], "date": entry["date"], "source": source_for(tables), "log_id": doc_id})
+        for table, table_rows in rows.items():
+            self.supabase.insert_data(table, table_rows, upsert=True)
+        self.vector_store.upsert_documents(documents=documents, ids=ids, metadatas=metadatas)
+
+    def _fail(self, job, error, result):
+        logging.warning(f"[Ingest] Job {job['key']} failed: {error}")
+        result["failed"] += 1
+        if self.queue.fail([job["id"]], error):
+            result["dead"] += 1
+            logging.error(f"[Ingest] Job {job['key']} moved to the dead-letter queue after {job['attempts'] + 1} attempts")
+
+    def run_once(self):
+        """
+        Processes one batch of due jobs.
+        Returns:
+            dict: {"claimed", "done", "failed", "dead"} for this batch.
+        """
+        jobs = self.queue.claim(self.batch_size)
+        result = {"claimed": len(jobs), "done": 0, "failed": 0, "dead": 0}
+        if not jobs:
+            return result
+        with span("ingest.batch", jobs=len(jobs)):
+            try:
+                self._write(jobs)
+                self.queue.complete([job["id"] for job in jobs])
+                result["done"] = len(jobs)
+                return result
+            except Exception as e:
+                if len(jobs) == 1:
+                    self._fail(jobs[0], e, result)
+                    return result
+                logging.warning(f"[Ingest] Batch of {len(jobs)} failed ({e}), retrying jobs one at a time")
+            for job in jobs:
+                try:
+                    self._write([job])
+                    self.queue.complete([job["id"]])
+                    result["done"] += 1
+                except Exception as e:
+                    self._fail(job, e, result)
+        return result
+
+    def wake(self):
+        """Starts the next batch now instead of after the poll interval, e.g. right after an enqueue."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.run_once()["claimed"]
+            except Exception as e:
+                # e.g. the queue file is briefly locked; the jobs stay queued
+                logging.error(f"[Ingest] Worker error: {e}")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ingest-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=30):
+        """Finishes the batch in progress and stops. Queued jobs stay on disk for the next start."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
@@ -1,27 +1,119 @@
 import os
+import time
+import asyncio
+import threading
 from dotenv import load_dotenv
 from telegram import Update, ForceReply
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
-from src.agent.core import PersonalAIAgent
+from src.agent.core import PersonalAIAgent, get_graph
+from src.db.vector_store import warm_up
+from src.db.chat_state import get_chat_state_store
+from src.ingest.queue import get_ingest_queue
+from src.ingest.worker import IngestWorker
+from src.agent.tracing import tracer
 
 load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+USER_UUID = os.getenv("USER_UUID")
 
-# Maintain a dictionary for per-chat memory and agent
-chat_agents = {}
-chat_histories = {}  # chat_id -> list of (role, message)
-
+# Messages from the chat's history included as context with each question
 MAX_HISTORY = 10
+MAX_REPLY_WORDS = 300
+MAX_MESSAGE_CHARS = 4096  # Telegram's limit for one message
+
+# Streamed replies are edited in place at most once per interval, within Telegram's edit rate limits
+STREAM_EDIT_INTERVAL_SECONDS = float(os.getenv("BOT_STREAM_EDIT_INTERVAL_SECONDS", "1.0"))
+TOOL_LABELS = {
+    "query_daily_logs": "daily logs",
+    "query_gym_logs": "gym logs",
+    "query_financial_transactions": "transactions",
+    "analytics": "stats",
+    "local_analytics": "long-term trends",
+    "query_digests": "summaries",
+    "custom_sql": "database",
+    "chroma_semantic_search": "memories",
+    "web_search": "the web",
+}
+
+# Concurrency limits: how many agent pipelines run at once, and how many messages
+# may wait (in total and per chat) before new ones are turned away
+MAX_CONCURRENT_QUERIES = int(os.getenv("BOT_MAX_CONCURRENT_QUERIES", "4"))
+MAX_PENDING_QUERIES = int(os.getenv("BOT_MAX_PENDING_QUERIES", "20"))
+MAX_PENDING_PER_CHAT = int(os.getenv("BOT_MAX_PENDING_PER_CHAT", "3"))
+BUSY_MESSAGE = "I'm handling a lot of messages right now. Please try again in a minute."
+
+query_slots = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+chat_locks = {}  # chat_id -> asyncio.Lock, keeps each chat's messages in order
+chat_pending = {}  # chat_id -> number of messages queued or running for that chat
+
+# Chats in log mode: their messages are queued as log entries instead of answered
+log_mode_chats = set()
+ingest_worker = IngestWorker()
+
+_agent = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    """
+    Returns the bot's PersonalAIAgent, creating it on first use. The agent keeps no per-chat
+    state (history is passed in the prompt), so all chats share one LLM client and graph.
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = PersonalAIAgent()
+    return _agent
+
+def warm_start():
+    """Opens the vector store and builds the shared agent and its graph, so the first message doesn't pay for them."""
+    warm_up()
+    get_agent()
+    get_graph()
+
+def get_lock_for_chat(chat_id):
+    if chat_id not in chat_locks:
+        chat_locks[chat_id] = asyncio.Lock()
+    return chat_locks[chat_id]
+
+class StreamingReply:
+    """A Telegram message that is edited in place as the answer streams in, throttled to the edit interval."""
+
+    def __init__(self, message):
+        self.message = message
+        self.shown = message.text
+        self.next_edit_at = 0.0
 
-def get_agent_for_chat(chat_id):
-    if chat_id not in chat_agents:
-        chat_agents[chat_id] = PersonalAIAgent()
-    return chat_agents[chat_id]
+    async def show(self, text, force=False):
+        text = text[:MAX_MESSAGE_CHARS]
+        if not text.strip() or text == self.shown:
+            return
+        if not force and time.monotonic() < self.next_edit_at:
+            return
+        if force and time.monotonic() < self.next_edit_at:
+            await asyncio.sleep(self.next_edit_at - time.monotonic())
+        try:
+            await self.message.edit_text(text)
+            self.shown = text
+            self.next_edit_at = time.monotonic() + STREAM_EDIT_INTERVAL_SECONDS
+        except RetryAfter as e:
+            # Flood control: back off for as long as Telegram asks
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self.next_edit_at = time.monotonic() + retry_after
+            if force:
+                await self.show(text, force=True)
+        except BadRequest:
+            # Most often "message is not modified"; the next edit will catch up
+            pass
 
-def get_history_for_chat(chat_id):
-    if chat_id not in chat_histories:
-        chat_histories[chat_id] = []
-    return chat_histories[chat_id]
+def describe_event(event):
+    if event["type"] == "stage" and event["stage"] == "tools":
+        labels = sorted({TOOL_LABELS.get(t, t) for t in event["tools"]})
+        return f"Looking up {', '.join(labels)}..."
+    if event["type"] == "stage" and event["stage"] == "synthesis":
+        return "Writing the answer..."
+    return None
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
@@ -30,40 +122,137 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         reply_markup=ForceReply(selective=True),
     )
 
+def format_stats():
+    """Renders the tracer's latency summary and totals for the /stats command."""
+    summary = tracer.summary()
+    if not summary:
+        return "No queries traced yet."
+    lines = ["Latency by stage (recent):"]
+    for name, stats in summary.items():
+        errors = f", {stats['errors']} errors" if stats["errors"] else ""
+        lines.append(f"{name}: n={stats['count']} p50={stats['p50_ms']:.0f}ms p95={stats['p95_ms']:.0f}ms{errors}")
+    totals = tracer.totals()
+    lines.append("")
+    lines.append(
+        f"LLM tokens: {totals['prompt_tokens']:.0f} prompt, {totals['completion_tokens']:.0f} completion "
+        f"(~${totals['cost_usd']:.2f})"
+    )
+    for name, (hits, lookups) in sorted(totals["cache"].items()):
+        lines.append(f"{name} cache hits: {hits}/{lookups}")
+    llm = get_agent().llm.stats()
+    lines.append(
+        f"LLM requests: {llm['requests']} sent, {llm['coalesced']} shared, {llm['retries']} retried after rate limits, "
+        f"{llm['waits']} queued ({llm['wait_seconds']:.0f}s)"
+    )
+    chats = get_chat_state_store().stats()
+    queue = get_ingest_queue().stats()
+    lines.append(f"Log queue: {queue['pending']} pending, {queue['processing']} in progress, {queue['dead']} failed")
+    lines.append(f"Chats in memory: {chats['chats_in_memory']} ({chats['bytes_in_memory'] / 1024:.0f} KB), {chats['evictions']} evicted")
+    return "\n".join(lines)
+
+def enqueue_log(message, text):
+    """
+    Queues a log entry for the background ingest worker. Keyed by the Telegram message,
+    so a redelivered update is not logged twice.
+    Returns:
+        bool: False if this message was already queued.
+    """
+    key = f"telegram:{message.chat_id}:{message.message_id}"
+    payload = {"user_id": USER_UUID, "text": text, "date": message.date.date().isoformat()}
+    _, added = get_ingest_queue().enqueue(key, payload)
+    ingest_worker.wake()
+    return added
+
+async def log(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/log <entry> queues one entry; /log on its own switches the chat to log mode."""
+    if not USER_UUID:
+        await update.message.reply_text("USER_UUID is not set, so entries can't be logged.")
+        return
+    text = update.message.text.partition(" ")[2].strip()
+    if text:
+        enqueue_log(update.message, text)
+        await update.message.reply_text("Logged.")
+        return
+    log_mode_chats.add(update.effective_chat.id)
+    await update.message.reply_text("Log mode: every message is saved as a log entry. Send /ask to ask questions again.")
+
+async def ask(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    log_mode_chats.discard(update.effective_chat.id)
+    await update.message.reply_text("Back to answering questions.")
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_text(format_stats()[:MAX_MESSAGE_CHARS])
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_message = update.message.text
     chat_id = update.effective_chat.id
+    if chat_id in log_mode_chats:
+        # Acknowledge at once; structuring and storing happen in the ingest worker
+        enqueue_log(update.message, user_message)
+        await update.message.reply_text("Logged.")
+        return
+    if sum(chat_pending.values()) >= MAX_PENDING_QUERIES or chat_pending.get(chat_id, 0) >= MAX_PENDING_PER_CHAT:
+        await update.message.reply_text(BUSY_MESSAGE)
+        return
+    chat_pending[chat_id] = chat_pending.get(chat_id, 0) + 1
+    try:
+        # asyncio.Lock wakes waiters in FIFO order, so a chat's messages are answered in sequence
+        async with get_lock_for_chat(chat_id):
+            await answer_message(update, chat_id, user_message)
+    finally:
+        chat_pending[chat_id] -= 1
+        if chat_pending[chat_id] == 0:
+            del chat_pending[chat_id]
+            del chat_locks[chat_id]
+
+async def answer_message(update: Update, chat_id, user_message) -> None:
     await update.message.chat.send_action(action="typing")
-    agent = get_agent_for_chat(chat_id)
-    history = get_history_for_chat(chat_id)
-    # Build context from last 10 messages
-    context_str = "\n".join([
-        f"{role}: {msg}" for role, msg in history[-MAX_HISTORY:]
-    ])
+    chat_state = get_chat_state_store()
+    # Build context from the last MAX_HISTORY messages; the store may read SQLite, so keep it off the event loop
+    history = await asyncio.to_thread(chat_state.history, chat_id, limit=MAX_HISTORY)
+    context_str = "\n".join([f"{role}: {msg}" for role, msg in history])
     # Compose the prompt with context
     prompt = f"Context from previous messages (last {MAX_HISTORY}):\n{context_str}\nUser: {user_message}"
+    reply = StreamingReply(await update.message.reply_text("Thinking..."))
+    response = ""
     try:
-        response = agent.process_query(prompt)
-        # Truncate to 300 words
-        words = response.split()
-        if len(words) > 300:
-            response = " ".join(words[:300]) + "..."
+        async with query_slots:
+            streamed = ""
+            # The agent stops generating at MAX_REPLY_WORDS, so the cap holds while streaming
+            async for event in get_agent().astream_query(prompt, max_words=MAX_REPLY_WORDS):
+                if event["type"] == "token":
+                    streamed += event["text"]
+                    await reply.show(streamed)
+                elif event["type"] == "done":
+                    response = event["output"]
+                else:
+                    status = describe_event(event)
+                    if status and not streamed:
+                        await reply.show(status)
     except Exception as e:
         response = f"Sorry, there was an error: {e}"
-    # Update history
-    history.append(("User", user_message))
-    history.append(("Bot", response))
-    # Keep only the last MAX_HISTORY*2 messages (user+bot)
-    if len(history) > MAX_HISTORY * 2:
-        del history[:len(history) - MAX_HISTORY * 2]
-    await update.message.reply_text(response)
+    # Saved to disk and trimmed to CHAT_STATE_MAX_MESSAGES, in a worker thread like the read
+    await asyncio.to_thread(chat_state.append, chat_id, ("User", user_message), ("Bot", response))
+    await reply.show(response, force=True)
 
 if __name__ == "__main__":
     if not TELEGRAM_BOT_TOKEN:
         print("Error: TELEGRAM_BOT_TOKEN not set in .env")
         exit(1)
-    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+    # Warm up in the background so polling starts right away; a message that arrives
+    # first just builds what it needs itself
+    threading.Thread(target=warm_start, name="warm-start", daemon=True).start()
+    # Handle updates concurrently; ordering within a chat is kept by the per-chat locks
+    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(True).build()
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("log", log))
+    app.add_handler(CommandHandler("ask", ask))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    # Entries queued before a restart are picked up here
+    ingest_worker.start()
     print("Bot is running. Press Ctrl+C to stop.")
-    app.run_polling() 
\ No newline at end of file
+    try:
+        app.run_polling()
+    finally:
+        ingest_worker.stop() 
\ No newline at end of file
@@ -6,9 +6,17 @@
 # Set PYTHONPATH to project root
 export PYTHONPATH=$(pwd)
 
-# Start the Flask API for ChromaDB (background)
-echo "Starting Flask API (ChromaDB) on port 5001..."
-nohup python3 src/api/chroma_api.py > flask_api.log 2>&1 &
+# The API and the bot are separate processes, and an embedded Qdrant store (QDRANT_PATH) can only
+# be opened by one process at a time, so the Qdrant backend needs a server both can reach.
+if ! python3 -c "import os, sys; from dotenv import load_dotenv; load_dotenv(); sys.exit(os.getenv('VECTOR_BACKEND', 'chroma').lower() == 'qdrant' and not os.getenv('QDRANT_URL'))"; then
+    echo "VECTOR_BACKEND=qdrant needs QDRANT_URL (e.g. http://localhost:6333) when the API and the bot run together." >&2
+    exit 1
+fi
+
+# Start the ingestion API (ChromaDB) with the production server (background).
+# Stop it with SIGTERM (kill <pid>) so queued writes are flushed before exit.
+echo "Starting ingestion API (ChromaDB) on port 5001..."
+nohup python3 -m src.api.serve > flask_api.log 2>&1 &
 
 # Start the Telegram bot agent (background)
 echo "Starting Telegram bot agent..."
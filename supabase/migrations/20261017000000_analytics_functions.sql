@@ -0,0 +1,135 @@
+-- Parameterized analytics queries called by the agent through supabase.rpc(name, params).
+-- SQL functions are planned once per session and reused, and every query is bounded by
+-- (user_id, date), which the indexes below serve directly.
+
+create index if not exists daily_logs_user_id_date_idx on daily_logs (user_id, date);
+create index if not exists gym_logs_user_id_date_idx on gym_logs (user_id, date);
+create index if not exists jiujitsu_logs_user_id_date_idx on jiujitsu_logs (user_id, date);
+create index if not exists nutrition_logs_user_id_date_idx on nutrition_logs (user_id, date);
+create index if not exists career_logs_user_id_date_idx on career_logs (user_id, date);
+create index if not exists financial_transactions_user_id_date_idx on financial_transactions (user_id, date);
+create index if not exists investment_logs_user_id_date_idx on investment_logs (user_id, date);
+
+-- Spend totals over a date range
+create or replace function analytics_spend_summary(p_user_id uuid, p_since date, p_until date)
+returns table (transactions bigint, total numeric, average numeric, smallest numeric, largest numeric)
+language sql stable
+as $$
+    select count(*), sum(amount), round(avg(amount), 2), min(amount), max(amount)
+    from financial_transactions
+    where user_id = p_user_id and date between p_since and p_until;
+$$;
+
+-- Spend per category, largest first
+create or replace function analytics_spend_per_category(p_user_id uuid, p_since date, p_until date)
+returns table (category text, transactions bigint, total numeric, average numeric)
+language sql stable
+as $$
+    select coalesce(category, 'uncategorised'), count(*), sum(amount), round(avg(amount), 2)
+    from financial_transactions
+    where user_id = p_user_id and date between p_since and p_until
+    group by 1
+    order by abs(sum(amount)) desc;
+$$;
+
+-- Weekly training volume (sets x reps x weight) per exercise
+create or replace function analytics_gym_weekly_volume(p_user_id uuid, p_since date, p_until date)
+returns table (week_start date, exercise_name text, sessions bigint, total_sets bigint, total_reps bigint, volume numeric, max_weight numeric)
+language sql stable
+as $$
+    select date_trunc('week', date)::date, exercise_name, count(distinct date),
+           sum(sets), sum(sets * reps), sum(coalesce(sets, 0) * coalesce(reps, 0) * coalesce(weight, 0)), max(weight)
+    from gym_logs
+    where user_id = p_user_id and date between p_since and p_until
+    group by 1, 2
+    order by 1, 2;
+$$;
+
+-- Gym totals over a date range
+create or replace function analytics_gym_summary(p_user_id uuid, p_since date, p_until date)
+returns table (sessions bigint, exercises bigint, total_sets bigint, total_reps bigint, total_volume numeric, average_duration_minutes numeric)
+language sql stable
+as $$
+    select count(distinct date), count(distinct exercise_name), sum(sets), sum(sets * reps),
+           sum(coalesce(sets, 0) * coalesce(reps, 0) * coalesce(weight, 0)), round(avg(duration_minutes), 1)
+    from gym_logs
+    where user_id = p_user_id and date between p_since and p_until;
+$$;
+
+-- Daily mood and sleep with rolling averages over the previous p_window days
+create or replace function analytics_wellbeing_rolling(p_user_id uuid, p_since date, p_until date, p_window integer default 7)
+returns table (date date, mood_score integer, sleep_hours numeric, sleep_quality integer, mood_avg numeric, sleep_hours_avg numeric, sleep_quality_avg numeric)
+language sql stable
+as $$
+    with windowed as (
+        select d.date, d.mood_score, d.sleep_hours, d.sleep_quality,
+               avg(d.mood_score) over w as mood_avg,
+               avg(d.sleep_hours) over w as sleep_hours_avg,
+               avg(d.sleep_quality) over w as sleep_quality_avg
+        from daily_logs d
+        where d.user_id = p_user_id and d.date between p_since - (p_window - 1) and p_until
+        window w as (order by d.date range between (p_window - 1) * interval '1 day' preceding and current row)
+    )
+    select windowed.date, mood_score, sleep_hours, sleep_quality,
+           round(mood_avg, 2), round(sleep_hours_avg, 2), round(sleep_quality_avg, 2)
+    from windowed
+    where windowed.date between p_since and p_until
+    order by windowed.date;
+$$;
+
+-- Daily log averages over a date range
+create or replace function analytics_daily_summary(p_user_id uuid, p_since date, p_until date)
+returns table (days bigint, mood_avg numeric, energy_avg numeric, stress_avg numeric, sleep_hours_avg numeric, sleep_quality_avg numeric, sleep_hours_min numeric, sleep_hours_max numeric)
+language sql stable
+as $$
+    select count(*), round(avg(mood_score), 2), round(avg(energy_level), 2), round(avg(stress_level), 2),
+           round(avg(sleep_hours), 2), round(avg(sleep_quality), 2), min(sleep_hours), max(sleep_hours)
+    from daily_logs
+    where user_id = p_user_id and date between p_since and p_until;
+$$;
+
+-- Jiu-jitsu sessions, rolls and performance over a date range
+create or replace function analytics_jiujitsu_summary(p_user_id uuid, p_since date, p_until date)
+returns table (sessions bigint, total_rolls bigint, performance_avg numeric, performance_min integer, performance_max integer)
+language sql stable
+as $$
+    select count(*), sum(rolls_count), round(avg(performance_rating), 2), min(performance_rating), max(performance_rating)
+    from jiujitsu_logs
+    where user_id = p_user_id and date between p_since and p_until;
+$$;
+
+-- Calories and macros per day
+create or replace function analytics_nutrition_daily_totals(p_user_id uuid, p_since date, p_until date)
+returns table (date date, meals bigint, calories bigint, protein_grams numeric, carbs_grams numeric, fat_grams numeric)
+language sql stable
+as $$
+    select n.date, count(*), sum(n.calories), sum(n.protein_grams), sum(n.carbs_grams), sum(n.fat_grams)
+    from nutrition_logs n
+    where n.user_id = p_user_id and n.date between p_since and p_until
+    group by n.date
+    order by n.date;
+$$;
+
+-- Work hours and productivity per week
+create or replace function analytics_career_weekly(p_user_id uuid, p_since date, p_until date)
+returns table (week_start date, days_logged bigint, work_hours numeric, productivity_avg numeric)
+language sql stable
+as $$
+    select date_trunc('week', date)::date, count(*), sum(work_hours), round(avg(productivity_rating), 2)
+    from career_logs
+    where user_id = p_user_id and date between p_since and p_until
+    group by 1
+    order by 1;
+$$;
+
+-- Investment activity per asset and transaction type
+create or replace function analytics_investment_summary(p_user_id uuid, p_since date, p_until date)
+returns table (asset_name text, asset_type text, transaction_type text, transactions bigint, quantity numeric, total_amount numeric)
+language sql stable
+as $$
+    select asset_name, asset_type, transaction_type, count(*), sum(quantity), sum(total_amount)
+    from investment_logs
+    where user_id = p_user_id and date between p_since and p_until
+    group by 1, 2, 3
+    order by sum(total_amount) desc nulls last;
+$$;
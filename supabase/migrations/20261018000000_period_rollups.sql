@@ -0,0 +1,18 @@
+-- Precomputed per-period rollups and digests, written nightly by scripts/build_digests.py
+-- and read first by the agent's query_digests tool. Ids are derived from
+-- (user_id, domain, period_type, period_start), so recomputing a period upserts its row.
+
+create table if not exists period_rollups (
+    id uuid primary key,
+    user_id uuid not null,
+    domain text not null,
+    period_type text not null check (period_type in ('day', 'week', 'month')),
+    period_start date not null,
+    period_end date not null,
+    metrics jsonb not null default '{}'::jsonb,
+    digest text not null,
+    created_at timestamp with time zone default now(),
+    unique (user_id, domain, period_type, period_start)
+);
+
+create index if not exists period_rollups_user_id_type_start_idx on period_rollups (user_id, period_type, period_start);
@@ -0,0 +1,27 @@
+-- Change cursor for the incremental sync into the local analytics store (src/db/local_store.py).
+-- Every row carries the time it was last written, set by Postgres on insert and on update,
+-- so the sync picks up new rows, upserts and edits, whatever their created_at.
+
+create or replace function set_updated_at() returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['daily_logs', 'gym_logs', 'jiujitsu_logs', 'nutrition_logs', 'career_logs',
+                             'financial_transactions', 'investment_logs'] loop
+        execute format('alter table %I add column if not exists updated_at timestamp with time zone not null default now()', t);
+        -- Serves the sync's keyset pagination: where user_id = ? order by updated_at, id
+        execute format('create index if not exists %I on %I (user_id, updated_at, id)', t || '_user_id_updated_at_idx', t);
+        execute format('drop trigger if exists set_updated_at on %I', t);
+        execute format('create trigger set_updated_at before update on %I for each row execute function set_updated_at()', t);
+    end loop;
+end;
+$$;
@@ -0,0 +1,24 @@
+-- Spend analytics count spending only, as the spend rollups and the local store's spend metric do:
+-- credits (income, refunds, transfers in) are not spent money. Amounts are reported as positive spend.
+
+create or replace function analytics_spend_summary(p_user_id uuid, p_since date, p_until date)
+returns table (transactions bigint, total numeric, average numeric, smallest numeric, largest numeric)
+language sql stable
+as $$
+    select count(*), sum(abs(amount)), round(avg(abs(amount)), 2), min(abs(amount)), max(abs(amount))
+    from financial_transactions
+    where user_id = p_user_id and date between p_since and p_until
+      and (amount < 0 or transaction_type = 'debit');
+$$;
+
+create or replace function analytics_spend_per_category(p_user_id uuid, p_since date, p_until date)
+returns table (category text, transactions bigint, total numeric, average numeric)
+language sql stable
+as $$
+    select coalesce(category, 'uncategorised'), count(*), sum(abs(amount)), round(avg(abs(amount)), 2)
+    from financial_transactions
+    where user_id = p_user_id and date between p_since and p_until
+      and (amount < 0 or transaction_type = 'debit')
+    group by 1
+    order by 3 desc;
+$$;
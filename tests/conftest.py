@@ -0,0 +1,15 @@
+import sys
+import os
+import tempfile
+# Ensure the project root is in sys.path so 'src' and 'benchmarks' are importable
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Keep caches, stores and traces out of the working tree; set before any src module reads them
+_workdir = tempfile.mkdtemp(prefix="life_agent_tests_")
+os.environ.update({
+    "CACHE_DIR": os.path.join(_workdir, "cache"),
+    "CHROMA_PERSIST_DIRECTORY": os.path.join(_workdir, "chroma"),
+    "LOCAL_STORE_PATH": os.path.join(_workdir, "life.duckdb"),
+    "TRACE_FILE": "",
+    "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "test"),
+})
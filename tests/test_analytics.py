@@ -0,0 +1,18 @@
+import pytest
+from src.db.analytics import query_for_text
+
+@pytest.mark.parametrize("question, expected", [
+    ("what's my rolling average mood", "wellbeing_rolling"),
+    ("how many rolls did I do at bjj this month", "jiujitsu_summary"),
+    ("did I roll on tuesday", "jiujitsu_summary"),
+    ("how much did I spend last week", "spend_summary"),
+    ("spending per category this month", "spend_per_category"),
+    ("how are my investments doing", "investment_summary"),
+    ("how productive was I this week", "career_weekly"),
+    ("how did I sleep", "daily_summary"),
+])
+def test_questions_route_to_the_matching_query(question, expected):
+    assert query_for_text(question)[0] == expected
+
+def test_unmatched_question_returns_none():
+    assert query_for_text("tell me a joke") == (None, None)
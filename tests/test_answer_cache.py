@@ -0,0 +1,67 @@
+import pytest
+from src.agent.core import PersonalAIAgent
+from src.cache import answer_cache
+
+def prompt(history, message):
+    context = "\n".join(f"{role}: {text}" for role, text in history)
+    return f"Context from previous messages (last 10):\n{context}\nUser: {message}"
+
+class CountingGraph:
+    def __init__(self):
+        self.calls = 0
+
+    def invoke(self, inputs, config=None):
+        self.calls += 1
+        return {"output": f"answer {self.calls}", "tool_results": ["rows"]}
+
+class GraphAgent(PersonalAIAgent):
+    graph = None
+
+@pytest.fixture
+def agent():
+    answer_cache.clear()
+    agent = GraphAgent(llm=object())
+    agent.graph = CountingGraph()
+    return agent
+
+def test_routed_question_hits_regardless_of_history(agent):
+    first = agent.process_query(prompt([("User", "hi"), ("Bot", "hello")], "how did I sleep this week"))
+    second = agent.process_query(prompt([("User", "what did I spend"), ("Bot", "40 GBP")], "How did I sleep this week?"))
+    assert first == second == "answer 1"
+    assert agent.graph.calls == 1
+
+def test_follow_up_is_keyed_on_its_context(agent):
+    about_gym = prompt([("User", "what did I lift on monday"), ("Bot", "squats")], "and the week before?")
+    about_spend = prompt([("User", "what did I spend on monday"), ("Bot", "40 GBP")], "and the week before?")
+    assert agent.process_query(about_gym) == "answer 1"
+    assert agent.process_query(about_spend) == "answer 2"
+    assert agent.process_query(about_gym) == "answer 1"
+    assert agent.graph.calls == 2
+
+def test_answers_with_failed_tools_are_not_cached(agent):
+    agent.graph.invoke = lambda inputs, config=None: {"output": "partial", "tool_results": ["[Timeout] gym"]}
+    agent.process_query("how did I sleep this week")
+    assert agent._cached_answer("how did I sleep this week")[1] is None
+
+class RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return "answer"
+
+def synthesize(history, message, route):
+    llm = RecordingLLM()
+    agent = GraphAgent(llm=llm)
+    agent._synthesis_node({"input": prompt(history, message), "tool_results": ["7.5 hours"], "route": route})
+    return llm.prompts[0]
+
+def test_routed_answer_is_synthesized_without_the_chat_history():
+    first = synthesize([("User", "hi"), ("Bot", "hello")], "how did I sleep this week", "rule")
+    second = synthesize([("User", "my dog is called Rex"), ("Bot", "noted")], "how did I sleep this week", "rule")
+    assert first == second
+    assert "Rex" not in second
+
+def test_planned_answer_is_synthesized_with_the_chat_history():
+    assert "Rex" in synthesize([("User", "my dog is called Rex"), ("Bot", "noted")], "and the week before?", "llm")
@@ -0,0 +1,81 @@
+import os
+import sys
+import subprocess
+import base64
+from array import array
+import pytest
+from benchmarks.retrieval_benchmark import hashing_embedding
+from src.db.embeddings import EmbeddingService, set_embedding_service
+from src.db.vector_store import ChromaDBManager
+
+USER = "00000000-0000-0000-0000-000000000001"
+MODEL = "hashing"
+
+# The API opens its store at import, so the offline model has to be in place first
+set_embedding_service(EmbeddingService(model=MODEL, embedding_function=hashing_embedding, cache_max_entries=0))
+from src.api.chroma_api import app, chroma
+
+DIM = chroma.embedding_service.dimension()
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+def stored_embedding(log_id):
+    return chroma.collection.get(ids=[log_id], include=["embeddings"])["embeddings"][0].tolist()
+
+def test_vectors_from_the_store_model_are_kept(client):
+    vector = [0.5] * DIM
+    response = client.post("/add_embedding", json={"user_id": USER, "text": "kept", "log_id": "kept",
+                                                   "embedding": vector, "embedding_model": MODEL})
+    assert response.get_json()["reembedded"] is False
+    assert stored_embedding("kept") == pytest.approx(vector)
+
+def test_vectors_from_another_or_unnamed_model_are_reembedded(client):
+    for log_id, model in (("openai", "text-embedding-3-small"), ("unnamed", None)):
+        response = client.post("/add_embedding", json={"user_id": USER, "text": f"from {log_id}", "log_id": log_id,
+                                                       "embedding": [0.1] * 1536, "embedding_model": model})
+        assert response.status_code == 200
+        assert response.get_json()["reembedded"] is True
+        assert stored_embedding(log_id) == pytest.approx(chroma.embedding_service.embed_query(f"from {log_id}"))
+
+def test_wrong_dimension_from_the_store_model_is_rejected(client):
+    response = client.post("/add_embedding", json={"user_id": USER, "text": "short", "embedding": [0.1] * (DIM - 1),
+                                                   "embedding_model": MODEL})
+    assert response.status_code == 400
+    response = client.post("/add_embeddings", json={"records": [{"user_id": USER, "text": "short"}],
+                                                    "embeddings_f32": "", "dim": DIM - 1, "embedding_model": MODEL})
+    assert response.status_code == 400
+
+def test_batch_mixes_kept_and_reembedded_records(client):
+    packed = array("f", [0.25] * DIM * 2)
+    response = client.post("/add_embeddings", json={
+        "records": [{"user_id": USER, "text": "batch one", "log_id": "b1"}, {"user_id": USER, "text": "batch two", "log_id": "b2"}],
+        "embeddings_f32": base64.b64encode(packed.tobytes()).decode(), "dim": DIM, "embedding_model": MODEL})
+    assert response.get_json()["reembedded"] == 0
+    assert stored_embedding("b2") == pytest.approx([0.25] * DIM)
+    response = client.post("/add_embeddings", json={"records": [
+        {"user_id": USER, "text": "batch three", "log_id": "b3", "embedding": [0.75] * DIM},
+        {"user_id": USER, "text": "batch four", "log_id": "b4"},
+    ], "embedding_model": MODEL})
+    assert response.get_json()["reembedded"] == 1
+    assert stored_embedding("b3") == pytest.approx([0.75] * DIM)
+
+def test_collections_record_their_model_and_refuse_another(tmp_path):
+    store = ChromaDBManager(persist_directory=str(tmp_path), collection_name="model_check",
+                            embedding_service=EmbeddingService(model=MODEL, embedding_function=hashing_embedding, cache_max_entries=0))
+    store.add_documents(["slept well"], metadatas=[{"user_id": USER}])
+    assert store.collection.metadata["embedding_model"] == MODEL
+    other = ChromaDBManager(persist_directory=str(tmp_path), collection_name="model_check",
+                            embedding_service=EmbeddingService(model="other", embedding_function=hashing_embedding, cache_max_entries=0))
+    with pytest.raises(ValueError, match="holds 'hashing' embeddings"):
+        other.query_collection(["sleep"])
+    with pytest.raises(ValueError):
+        other.add_documents(["gym"], metadatas=[{"user_id": USER}])
+
+def test_chroma_api_import_does_not_load_chromadb_for_qdrant(tmp_path):
+    env = {**os.environ, "VECTOR_BACKEND": "qdrant", "QDRANT_URL": "", "QDRANT_PATH": str(tmp_path / "qdrant")}
+    code = "import sys, src.api.chroma_api; print('chromadb' in sys.modules)"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
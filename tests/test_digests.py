@@ -0,0 +1,70 @@
+from datetime import date
+import pytest
+from benchmarks.fakes import InMemorySupabase
+from benchmarks.retrieval_benchmark import hashing_embedding
+from src.db.embeddings import EmbeddingService
+from src.db.vector_store import ChromaDBManager
+from src.db.local_store import LocalAnalyticsStore, TABLE_SCHEMAS
+from src.db.rollups import compute_rollups
+from src.agent.core import PersonalAIAgent
+from src.agent.formatting import EmptyResult
+from src.agent import tools
+
+USER = "00000000-0000-0000-0000-000000000001"
+
+def transaction(id_, amount, transaction_type):
+    row = {column: None for column in TABLE_SCHEMAS["financial_transactions"]}
+    row.update({"id": id_, "user_id": USER, "date": "2026-10-05", "amount": amount, "currency": "GBP",
+                "category": "groceries" if amount < 0 else "income", "transaction_type": transaction_type,
+                "created_at": "2026-10-05T08:00:00+00:00", "updated_at": "2026-10-05T08:00:00+00:00"})
+    return row
+
+def test_spend_rollup_counts_debits_only():
+    store = LocalAnalyticsStore(":memory:")
+    store.sync(InMemorySupabase({"financial_transactions": [
+        transaction("t1", -20.0, "debit"), transaction("t2", -5.5, "debit"), transaction("t3", 2500.0, "credit"),
+    ]}, latency_ms=0), user_id=USER)
+    [spend] = [row for row in compute_rollups(store, USER, "month", date(2026, 10, 1), today=date(2026, 10, 17))
+               if row["domain"] == "spend"]
+    assert spend["metrics"] == {"transactions": 2, "total": 25.5, "largest": 20.0, "top_category": "groceries"}
+
+@pytest.fixture
+def agent():
+    agent = PersonalAIAgent(llm=object())
+    agent.tools = {"query_digests": None, "analytics": lambda subq: f"analytics for {subq}"}
+    return agent
+
+@pytest.mark.parametrize("digest_result", [EmptyResult("No week digests between 2026-09-19 and 2026-10-17."),
+                                           EmptyResult("[Digests] USER_UUID not set in environment.")])
+def test_empty_digests_fall_back_to_analytics(agent, digest_result):
+    agent.tools["query_digests"] = lambda subq: digest_result
+    subq = f"how did I train, {digest_result}"
+    assert agent._call_tool("query_digests", subq) == f"analytics for {subq}"
+
+def test_digests_that_start_with_no_are_kept(agent):
+    agent.tools["query_digests"] = lambda subq: "No-gi BJJ week of 05 Oct 2026: 3 sessions."
+    assert agent._call_tool("query_digests", "how was no-gi this week") == "No-gi BJJ week of 05 Oct 2026: 3 sessions."
+
+@pytest.fixture
+def digests(tmp_path, monkeypatch):
+    service = EmbeddingService(model="hashing", embedding_function=hashing_embedding, cache_max_entries=0)
+    store = ChromaDBManager(persist_directory=str(tmp_path), collection_name="digests", embedding_service=service)
+    monkeypatch.setattr(tools, "get_vector_store", lambda collection_name: store)
+    return store
+
+def add_digest(store, user_id, domain, start, end, text):
+    store.upsert_documents(documents=[text], ids=[f"{user_id}:{domain}:{start}"], metadatas=[{
+        "user_id": user_id, "domain": domain, "period_type": "month", "period_start": start,
+        "period_end": end, "date": start, "source": "digest",
+    }])
+
+def test_free_text_digest_search_is_scoped_to_the_user_and_period(digests):
+    add_digest(digests, USER, "sleep_mood", "2026-10-01", "2026-10-31", "October 2026: slept 6.1h, mood 5.2, stress 7.8")
+    add_digest(digests, USER, "gym", "2026-10-01", "2026-10-31", "October 2026: 9 gym sessions")
+    add_digest(digests, USER, "sleep_mood", "2026-09-01", "2026-09-30", "September 2026: slept 7.4h, mood 7.0")
+    add_digest(digests, "someone-else", "sleep_mood", "2026-10-01", "2026-10-31", "October 2026: slept 8h")
+    rows = tools._search_digests("when was I most stressed", USER, "month", "2026-10-05", "2026-10-17")
+    assert sorted(r["digest"] for r in rows) == ["October 2026: 9 gym sessions", "October 2026: slept 6.1h, mood 5.2, stress 7.8"]
+
+def test_digest_search_of_an_empty_collection_finds_nothing(digests):
+    assert tools._search_digests("anything notable", USER, "week", "2026-10-05", "2026-10-17") == []
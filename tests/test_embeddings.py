@@ -0,0 +1,33 @@
+import numpy as np
+from src.db.embeddings import EmbeddingCache
+
+def key(n):
+    return n.to_bytes(16, "big")
+
+def vector(n):
+    return np.full(4, n, dtype=np.float32)
+
+def test_caches_sharing_a_directory_do_not_claim_the_same_slot(tmp_path):
+    # Two processes open the cache before either has written
+    bot = EmbeddingCache(str(tmp_path), max_entries=8)
+    api = EmbeddingCache(str(tmp_path), max_entries=8)
+    bot.put_many([(key(1), vector(1))])
+    api.put_many([(key(2), vector(2))])
+    bot.put_many([(key(3), vector(3))])
+    reopened = EmbeddingCache(str(tmp_path), max_entries=8)
+    found = reopened.get_many([key(1), key(2), key(3)])
+    assert {k: v.tolist() for k, v in found.items()} == {key(n): vector(n).tolist() for n in (1, 2, 3)}
+
+def test_writes_from_another_cache_are_read_after_its_next_write(tmp_path):
+    bot = EmbeddingCache(str(tmp_path), max_entries=8)
+    api = EmbeddingCache(str(tmp_path), max_entries=8)
+    api.put_many([(key(1), vector(1))])
+    bot.put_many([(key(2), vector(2))])
+    assert bot.get_many([key(1)])[key(1)].tolist() == vector(1).tolist()
+
+def test_least_recently_used_entry_is_evicted_when_full(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    cache.put_many([(key(1), vector(1)), (key(2), vector(2))])
+    cache.get_many([key(1)])
+    cache.put_many([(key(3), vector(3))])
+    assert set(cache.get_many([key(1), key(2), key(3)])) == {key(1), key(3)}
@@ -0,0 +1,15 @@
+import os
+import pytest
+from benchmarks.import_time import BUDGETS, DEFERRED, measure
+
+# Multiplier for every budget on slower machines, as benchmarks/import_time.py --scale
+SCALE = float(os.getenv("IMPORT_TIME_BUDGET_SCALE", "1.0"))
+RUNS = 3
+
+@pytest.mark.parametrize("module", list(BUDGETS))
+def test_import_stays_within_budget_and_defers_heavy_libraries(module):
+    runs = [measure(module) for _ in range(RUNS)]
+    loaded = sorted(set(DEFERRED) & set().union(*(packages for _, packages in runs)))
+    assert not loaded, f"import {module} loads {', '.join(loaded)}"
+    best = min(total for total, _ in runs)
+    assert best <= BUDGETS[module] * SCALE, f"import {module} took {best:.1f} ms, budget {BUDGETS[module] * SCALE:.0f} ms"
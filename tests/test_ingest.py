@@ -0,0 +1,131 @@
+import json
+from types import SimpleNamespace
+import pytest
+from benchmarks.fakes import InMemorySupabase
+from src.ingest.queue import IngestQueue, PENDING, DONE, DEAD
+from src.ingest.worker import IngestWorker
+
+USER = "00000000-0000-0000-0000-000000000001"
+
+def entry(text, date="2026-10-17"):
+    return {"text": text, "date": date, "user_id": USER}
+
+@pytest.fixture
+def queue():
+    return IngestQueue(":memory:", lease_seconds=60, max_attempts=3, backoff_seconds=0)
+
+class ScriptedModel:
+    """Answers extraction prompts from a queue of table dicts, one list per call."""
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        tables = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        count = prompt.count("\n[")
+        return SimpleNamespace(content=json.dumps([{"entry": i, "tables": tables} for i in range(count)]),
+                               response_metadata={})
+
+class RecordingVectorStore:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.documents = {}
+
+    def upsert_documents(self, documents, ids, metadatas=None):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("vector store unavailable")
+        self.documents.update(zip(ids, documents))
+
+def test_enqueue_is_idempotent_by_key(queue):
+    first = queue.enqueue("telegram:1:1", entry("a"))
+    assert first[1] is True
+    assert queue.enqueue("telegram:1:1", entry("a")) == (first[0], False)
+    assert queue.stats()[PENDING] == 1
+
+def test_failed_jobs_back_off_then_dead_letter(queue):
+    job_id, _ = queue.enqueue("k", entry("a"))
+    for attempt in range(3):
+        assert [job["id"] for job in queue.claim(10)] == [job_id]
+        dead = queue.fail([job_id], "boom")
+    assert dead == 1
+    assert queue.stats()[DEAD] == 1
+    assert queue.dead_letters()[0]["last_error"] == "boom"
+    assert queue.retry_dead() == 1
+    assert queue.claim(10)[0]["attempts"] == 0
+
+def test_expired_leases_count_as_attempts(queue):
+    queue.lease_seconds = 0
+    job_id, _ = queue.enqueue("k", entry("a"))
+    attempts = [queue.claim(10)[0]["attempts"] for _ in range(3)]
+    assert attempts == [0, 1, 2]
+    # The third lease expiry uses the last attempt
+    assert queue.claim(10) == []
+    assert queue.stats()[DEAD] == 1
+
+def test_saved_extraction_comes_back_with_the_job(queue):
+    job_id, _ = queue.enqueue("k", entry("a"))
+    queue.claim(10)
+    queue.save_extraction(job_id, {"daily_logs": [{"free_text": "a"}]})
+    queue.fail([job_id], "boom")
+    assert queue.claim(10)[0]["extraction"] == {"daily_logs": [{"free_text": "a"}]}
+
+def worker(queue, model, supabase=None, vector_store=None):
+    return IngestWorker(queue=queue, llm=model, supabase=supabase or InMemorySupabase({}, latency_ms=0),
+                        vector_store=vector_store or RecordingVectorStore(), batch_size=10)
+
+def test_worker_writes_a_batch_with_one_model_call(queue):
+    for i in range(3):
+        queue.enqueue(f"k{i}", entry(f"slept 7 hours, entry {i}"))
+    model = ScriptedModel({"daily_logs": [{"sleep_hours": 7}]})
+    w = worker(queue, model)
+    assert w.run_once() == {"claimed": 3, "done": 3, "failed": 0, "dead": 0}
+    assert model.calls == 1
+    rows = w.supabase.tables["daily_logs"]
+    assert len(rows) == 3
+    # Postgres-managed timestamps are set at write time, not copied from the queue
+    assert all(row["created_at"] == row["updated_at"] for row in rows)
+    assert queue.stats()[DONE] == 3
+
+def test_retry_reuses_the_saved_extraction(queue):
+    queue.enqueue("k", entry("gym then bjj"))
+    # The second answer would produce different tables if the model were asked again
+    model = ScriptedModel({"gym_logs": [{"exercise_name": "squat"}, {"exercise_name": "bench"}]},
+                          {"jiujitsu_logs": [{"session_type": "gi"}]})
+    w = worker(queue, model, vector_store=RecordingVectorStore(fail=1))
+    assert w.run_once()["failed"] == 1
+    assert w.run_once()["done"] == 1
+    assert model.calls == 1
+    assert "jiujitsu_logs" not in w.supabase.tables
+    assert len(w.supabase.tables["gym_logs"]) == 2
+
+def test_rewriting_a_job_does_not_duplicate_rows(queue):
+    queue.enqueue("k", entry("squat day"))
+    model = ScriptedModel({"gym_logs": [{"exercise_name": "squat"}]})
+    w = worker(queue, model)
+    w.run_once()
+    # A worker that wrote the rows but died before complete() writes them again
+    queue._conn.execute("UPDATE ingest_jobs SET status = 'pending'")
+    w.run_once()
+    assert model.calls == 1
+    assert len(w.supabase.tables["gym_logs"]) == 1
+
+def test_poison_job_is_dead_lettered_without_blocking_the_batch(queue):
+    queue.enqueue("good", entry("fine"))
+    queue.enqueue("bad", entry("poison"))
+
+    class PickyModel(ScriptedModel):
+        def invoke(self, prompt):
+            if "poison" in prompt:
+                self.calls += 1
+                return SimpleNamespace(content="not json", response_metadata={})
+            return super().invoke(prompt)
+
+    w = worker(queue, PickyModel({"daily_logs": [{"free_text": "fine"}]}))
+    result = w.run_once()
+    assert (result["done"], result["failed"]) == (1, 1)
+    for _ in range(2):
+        queue._conn.execute("UPDATE ingest_jobs SET available_at = 0")
+        w.run_once()
+    assert queue.stats()[DEAD] == 1
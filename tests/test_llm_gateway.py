@@ -0,0 +1,94 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from src.agent.llm_gateway import LLMGateway, RateLimiter, INTERACTIVE, BACKGROUND
+from src.agent.formatting import count_tokens
+
+class RateLimitError(Exception):
+    status_code = 429
+
+class FakeModel:
+    def __init__(self, delay=0.0, failures=0, usage=None):
+        self.delay = delay
+        self.failures = failures
+        self.usage = usage
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise RateLimitError("rate limited")
+        metadata = {"token_usage": {"total_tokens": self.usage}} if self.usage else {}
+        return SimpleNamespace(content=f"answer to {prompt}", response_metadata=metadata)
+
+    def stream(self, prompt):
+        self.calls += 1
+        for word in ["one ", "two ", "three"]:
+            yield SimpleNamespace(content=word)
+
+def gateway(model, limiter=None, **kwargs):
+    return LLMGateway(model, limiter=limiter or RateLimiter(rpm=0, tpm=0), backoff_seconds=0.01, **kwargs)
+
+def test_identical_prompts_in_flight_share_one_request():
+    model = FakeModel(delay=0.2)
+    llm = gateway(model)
+    results = [None] * 4
+    def ask(i):
+        results[i] = llm.invoke("same prompt").content
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["answer to same prompt"] * 4
+    assert model.calls == 1
+    assert llm.stats()["coalesced"] == 3
+
+def test_rate_limited_requests_are_retried():
+    model = FakeModel(failures=2)
+    llm = gateway(model)
+    assert llm.invoke("prompt").content == "answer to prompt"
+    assert (model.calls, llm.stats()["retries"], llm.stats()["rate_limited"]) == (3, 2, 2)
+
+def test_retries_stop_after_max_retries():
+    llm = gateway(FakeModel(failures=5), max_retries=1)
+    with pytest.raises(RateLimitError):
+        llm.invoke("prompt")
+
+def test_interactive_requests_go_before_queued_background_work():
+    limiter = RateLimiter(rpm=0, tpm=0)
+    limiter.pause(0.3)
+    order = []
+    def acquire(name, priority):
+        limiter.acquire(1, priority)
+        order.append(name)
+    background = threading.Thread(target=acquire, args=("background", BACKGROUND))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=acquire, args=("interactive", INTERACTIVE))
+    interactive.start()
+    background.join()
+    interactive.join()
+    assert order == ["interactive", "background"]
+
+def test_invoke_settles_the_reservation_with_reported_usage():
+    limiter = RateLimiter(rpm=0, tpm=100000)
+    gateway(FakeModel(usage=40), limiter=limiter).invoke("prompt")
+    assert limiter._tokens.level == pytest.approx(100000 - 40, abs=5)
+
+def test_stream_settles_the_reservation_with_counted_tokens():
+    limiter = RateLimiter(rpm=0, tpm=100000)
+    chunks = list(gateway(FakeModel(), limiter=limiter).stream("prompt"))
+    assert "".join(chunk.content for chunk in chunks) == "one two three"
+    used = count_tokens("prompt") + count_tokens("one two three")
+    assert limiter._tokens.level == pytest.approx(100000 - used, abs=5)
+
+def test_stream_stopped_early_is_settled_too():
+    limiter = RateLimiter(rpm=0, tpm=100000)
+    stream = gateway(FakeModel(), limiter=limiter).stream("prompt")
+    next(stream)
+    stream.close()
+    assert limiter._tokens.level == pytest.approx(100000 - count_tokens("prompt") - count_tokens("one "), abs=5)
@@ -0,0 +1,90 @@
+from datetime import date, datetime, timedelta, timezone
+import pytest
+from benchmarks.fakes import InMemorySupabase, generate_history
+from src.db.local_store import LocalAnalyticsStore, TABLE_SCHEMAS
+
+USER = "00000000-0000-0000-0000-000000000001"
+OTHER = "00000000-0000-0000-0000-000000000002"
+
+@pytest.fixture
+def store():
+    return LocalAnalyticsStore(":memory:")
+
+def count(store, table, user_id=USER):
+    return store.query(f"SELECT count(*) AS n FROM {table} WHERE user_id = ?", [user_id])[0]["n"]
+
+def transaction(id_, user_id=USER, amount=-10.0, stamp="2026-10-01T08:00:00+00:00", **values):
+    row = {column: None for column in TABLE_SCHEMAS["financial_transactions"]}
+    row.update({"id": id_, "user_id": user_id, "date": "2026-10-01", "amount": amount, "transaction_type": "debit",
+                "created_at": stamp, "updated_at": stamp, **values})
+    return row
+
+def test_full_sync_copies_every_row(store):
+    tables = generate_history(USER, 30, today=date(2026, 10, 17))
+    store.sync(InMemorySupabase(tables, latency_ms=0), user_id=USER)
+    for table, rows in tables.items():
+        assert count(store, table) == len(rows)
+
+def test_rows_sharing_a_timestamp_across_pages_are_not_skipped(store):
+    source = InMemorySupabase({"financial_transactions": [transaction(f"t{i}") for i in range(5)]}, latency_ms=0)
+    assert store.sync_table(source, "financial_transactions", user_id=USER, page_size=2) == 5
+    assert count(store, "financial_transactions") == 5
+
+def test_null_created_at_rows_are_copied(store):
+    source = InMemorySupabase({"financial_transactions": [transaction("t1", created_at=None)]}, latency_ms=0)
+    store.sync_table(source, "financial_transactions", user_id=USER)
+    assert count(store, "financial_transactions") == 1
+
+def test_updates_and_new_rows_propagate(store):
+    source = InMemorySupabase({"financial_transactions": [transaction("t1")]}, latency_ms=0)
+    store.sync_table(source, "financial_transactions", user_id=USER)
+    # A back-dated insert and an upsert of an existing row both get a fresh updated_at
+    source.insert_data("financial_transactions", transaction("t2", stamp="2020-01-01T00:00:00+00:00"))
+    source.insert_data("financial_transactions", {**transaction("t1"), "amount": -99.0}, upsert=True)
+    store.sync_table(source, "financial_transactions", user_id=USER)
+    rows = store.query("SELECT id, amount FROM financial_transactions ORDER BY id")
+    assert rows == [{"id": "t1", "amount": -99.0}, {"id": "t2", "amount": -10.0}]
+
+def test_late_commit_within_the_overlap_is_picked_up(store):
+    now = datetime.now(timezone.utc)
+    source = InMemorySupabase({"financial_transactions": [transaction("t1", stamp=now.isoformat())]}, latency_ms=0)
+    store.sync_table(source, "financial_transactions", user_id=USER)
+    # Committed after the sync, but stamped just before the watermark
+    source.tables["financial_transactions"].append(transaction("t0", stamp=(now - timedelta(seconds=5)).isoformat()))
+    store.sync_table(source, "financial_transactions", user_id=USER)
+    assert count(store, "financial_transactions") == 2
+
+def test_watermarks_are_kept_per_user(store):
+    source = InMemorySupabase({"financial_transactions": [
+        transaction("a1", stamp="2026-10-02T08:00:00+00:00"),
+        transaction("b1", user_id=OTHER, stamp="2026-10-01T08:00:00+00:00"),
+    ]}, latency_ms=0)
+    store.sync_table(source, "financial_transactions", user_id=USER)
+    assert store.sync_table(source, "financial_transactions", user_id=OTHER) == 1
+    assert count(store, "financial_transactions", OTHER) == 1
+
+def test_last_synced_is_per_user(store):
+    source = InMemorySupabase(generate_history(USER, 3), latency_ms=0)
+    store.sync(source, user_id=USER)
+    assert store.last_synced(USER) is not None
+    assert store.last_synced(OTHER) is None
+
+def test_spend_metric_ignores_credits(store):
+    source = InMemorySupabase({
+        "financial_transactions": [
+            transaction("t1", amount=-10.0),
+            transaction("t2", amount=2500.0, transaction_type="credit"),
+            transaction("t3", date="2026-10-02", amount=-30.0),
+        ],
+        "daily_logs": [
+            {column: None for column in TABLE_SCHEMAS["daily_logs"]} | {
+                "id": f"d{day}", "user_id": USER, "date": f"2026-10-0{day}", "mood_score": day,
+                "created_at": "2026-10-01T08:00:00+00:00",
+            }
+            for day in (1, 2)
+        ],
+    }, latency_ms=0)
+    store.sync(source, user_id=USER)
+    result = store.correlate("spend", "mood", USER, since=date(2026, 1, 1))
+    assert result["buckets"] == 2
+    assert result["avg_a"] == 20.0
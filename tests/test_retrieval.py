@@ -0,0 +1,57 @@
+import pytest
+from benchmarks.retrieval_benchmark import hashing_embedding
+from src.db.embeddings import EmbeddingService
+from src.db.vector_store import ChromaDBManager
+from src.agent.retrieval import BM25Index, HybridRetriever
+
+USER = "00000000-0000-0000-0000-000000000001"
+
+def test_bm25_upsert_replaces_documents_by_id():
+    index = BM25Index([("a", "squat and bench day", {}), ("b", "rest day, long walk", {})])
+    index.upsert([("a", "deadlift day", {})])
+    assert len(index) == 2
+    assert index.search("squat", 5) == []
+    assert [hit[1] for hit in index.search("deadlift", 5)] == ["a"]
+    assert index.doc_freq["day"] == 2
+
+class CountingStore(ChromaDBManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read = 0
+
+    def iter_documents(self, *args, **kwargs):
+        for page in super().iter_documents(*args, **kwargs):
+            self.read += len(page["ids"])
+            yield page
+
+@pytest.fixture
+def store(tmp_path):
+    service = EmbeddingService(model="hashing", embedding_function=hashing_embedding, cache_max_entries=0)
+    store = CountingStore(persist_directory=str(tmp_path), collection_name="keyword_logs", embedding_service=service)
+    store.add_documents([f"gym session {i}" for i in range(20)],
+                        metadatas=[{"user_id": USER, "date": f"2026-10-{i + 1:02d}"} for i in range(20)])
+    return store
+
+def test_keyword_index_reads_only_new_documents_after_a_write(store, monkeypatch):
+    monkeypatch.setattr("src.agent.retrieval.KEYWORD_INDEX_OVERLAP_SECONDS", 0)
+    retriever = HybridRetriever(store, reranker=False)
+    assert len(retriever.keyword_index(USER)) == 20
+    assert store.read == 20
+    store.add_documents(["bjj open mat"], metadatas=[{"user_id": USER, "date": "2026-10-21"}], ids=["bjj"])
+    store.read = 0
+    index = retriever.keyword_index(USER)
+    assert len(index) == 21
+    assert [hit[1] for hit in index.search("open mat", 5)] == ["bjj"]
+    assert store.read == 1
+    assert retriever.keyword_index(USER) is index
+
+def test_keyword_index_is_rebuilt_after_a_delete(store):
+    retriever = HybridRetriever(store, reranker=False)
+    retriever.keyword_index(USER)
+    store.delete_by_metadata(date_from="2026-10-01", date_to="2026-10-05")
+    assert len(retriever.keyword_index(USER)) == 15
+
+def test_unchanged_documents_are_still_skipped(store):
+    result = store.add_documents(["gym session 0"], metadatas=[{"user_id": USER, "date": "2026-10-01"}])
+    assert result["skipped"] == 1
+    assert "indexed_at" in store.collection.get(limit=1, include=["metadatas"])["metadatas"][0]
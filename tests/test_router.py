@@ -0,0 +1,34 @@
+import pytest
+from src.agent.router import QueryRouter, TfidfIntentRouter, latest_user_message
+
+@pytest.fixture(scope="module")
+def router():
+    return TfidfIntentRouter()
+
+def test_routes_a_clear_single_intent_question(router):
+    decision = router.route("how did I sleep this week")
+    assert decision["tool"] == "query_daily_logs"
+    assert decision["path"] == "rule"
+
+def test_ambiguous_or_mixed_questions_go_to_the_planner(router):
+    assert router.route("hello there") is None
+    assert router.route("how did I sleep this week, and how much did I spend on groceries?") is None
+
+@pytest.mark.parametrize("question", ["relationship between sleep and mood", "does my sleep correlate with mood and energy"])
+def test_and_inside_one_question_does_not_split_it(router, question):
+    assert router.route(question)["tool"] == "local_analytics"
+
+def test_and_before_a_new_question_splits_it(router):
+    assert router.route("how did I sleep this week and what did I spend") is None
+
+def test_routes_on_the_latest_user_message_only():
+    assert latest_user_message("User: how much did I spend\nBot: 40 GBP\nUser: how did I sleep") == "how did I sleep"
+
+def test_single_intent_router_uses_its_score_as_the_margin():
+    router = TfidfIntentRouter({"query_gym_logs": ["what did I lift at the gym", "gym workout"]})
+    assert router.route("what did I lift at the gym")["tool"] == "query_gym_logs"
+    assert router.route("weather in london") is None
+
+def test_query_router_is_abstract():
+    with pytest.raises(TypeError):
+        QueryRouter()
@@ -0,0 +1,19 @@
+import threading
+from src.agent.core import PersonalAIAgent
+
+def test_hung_tool_does_not_starve_later_queries():
+    release = threading.Event()
+    agent = PersonalAIAgent(tool_concurrency=1, tool_timeout=0.2, llm=object())
+    agent.tools = {"hangs": lambda subq: release.wait(5) and "late", "answers": lambda subq: f"rows for {subq}"}
+    try:
+        [hung] = agent._run_tool_calls(["first chat"], ["hangs"])
+        assert hung.startswith("[Timeout calling hangs]")
+        # The only worker of the first executor is still stuck in the hung tool
+        assert agent._run_tool_calls(["second chat"], ["answers"]) == ["rows for second chat"]
+    finally:
+        release.set()
+
+def test_calls_from_one_query_are_returned_in_order():
+    agent = PersonalAIAgent(tool_concurrency=2, llm=object())
+    agent.tools = {"echo": lambda subq: subq}
+    assert agent._run_tool_calls(["a", "b", "c"], ["echo"] * 3) == ["a", "b", "c"]
@@ -0,0 +1,29 @@
+import pytest
+from src.db.vector_store import build_where_clauses
+
+def test_date_range_covers_every_day_in_chunks():
+    wheres = build_where_clauses("2026-01-30", "2026-02-02", user_id="u1", chunk_days=3)
+    assert wheres == [
+        {"$and": [{"user_id": "u1"}, {"date": {"$in": ["2026-01-30", "2026-01-31", "2026-02-01"]}}]},
+        {"$and": [{"user_id": "u1"}, {"date": {"$in": ["2026-02-02"]}}]},
+    ]
+
+@pytest.mark.parametrize("date_from,date_to", [("2026-01-01", None), (None, "2026-01-01")])
+def test_half_open_date_range_is_rejected(date_from, date_to):
+    with pytest.raises(ValueError, match="together"):
+        build_where_clauses(date_from, date_to, user_id="u1")
+
+def test_reversed_date_range_is_rejected():
+    with pytest.raises(ValueError, match="before"):
+        build_where_clauses("2026-01-02", "2026-01-01")
+
+def test_embedded_qdrant_open_elsewhere_fails_with_a_clear_error(tmp_path):
+    from qdrant_client import QdrantClient
+    from src.db.qdrant_store import get_qdrant_client
+    # Stands in for the other process (the bot or the API) holding the embedded store
+    holder = QdrantClient(path=str(tmp_path))
+    try:
+        with pytest.raises(RuntimeError, match="QDRANT_URL"):
+            get_qdrant_client(url=None, path=str(tmp_path))
+    finally:
+        holder.close()